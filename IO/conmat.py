@@ -1,3 +1,4 @@
+import sys
 import csv
 import random
 
@@ -19,13 +20,25 @@ class NeuralConnectionParameters:
 
 class ConnectivityMatrixIO:
   def load_matrix(self, connectivity_matrix_file_name, brain, progress_bar):
+    neuron_groups, neural_connections, error_messages = self.read_matrix(connectivity_matrix_file_name, brain, progress_bar)
+    # Add the neurons and connections to the brain and the data container
+    brain.add_neurons(neuron_groups, progress_bar)
+    brain.add_neural_connections(neural_connections, progress_bar)
+    return error_messages
+
+
+  def read_matrix(self, connectivity_matrix_file_name, brain, progress_bar):
+    """Loads the matrix and creates the neurons and neural connections it defines without adding them to
+    'brain' (see Brain.build_neurons()), so this can run in a worker thread. Returns a tuple (neuron groups,
+    neural connections, error messages)."""
     # Load the neuron and neural connection parameters from file
     neuron_params, conn_params, load_errors = self.__load_csv_file(connectivity_matrix_file_name)
-    # Add them to the brain and the data container
-    neuron_errors = brain.create_neurons(neuron_params, progress_bar)
-    nc_errors = brain.create_neural_connections(conn_params)
+    # Create the neurons and the connections between them
+    neuron_groups, neuron_errors = brain.build_neurons(neuron_params, progress_bar)
+    neurons = [neuron for neuron_group in neuron_groups for neuron in neuron_group]
+    neural_connections = brain.build_neural_connections(conn_params, progress_bar, neurons)
     # Return all the error messages
-    return load_errors + neuron_errors + nc_errors
+    return (neuron_groups, neural_connections, load_errors + neuron_errors)
 
 
   def __load_csv_file(self, file_name):
@@ -178,6 +191,8 @@ class ConnectivityMatrixIO:
     neurons = list()
     neural_connections = list()
     index = 0
+    # The names of the left and right copies of each neuron (computed once, not once per matrix cell)
+    sided_neuron_names = self.__create_sided_neuron_names(neuron_names)
 
     for row in csv_reader:
       try:
@@ -192,7 +207,7 @@ class ConnectivityMatrixIO:
       if neuron:
         neuron.brain_side = "mirror"
         neurons.append(neuron)
-        neural_connections.extend(self.__create_symmetric_neural_connections(neuron_names, row))
+        neural_connections.extend(self.__create_symmetric_neural_connections(sided_neuron_names, row))
 
       index += 1
       if index >= len(neuron_names) // 2:
@@ -216,31 +231,37 @@ class ConnectivityMatrixIO:
     return neuron_names
 
 
-  def __create_symmetric_neural_connections(self, target_neuron_names, row):
+  def __create_sided_neuron_names(self, neuron_names):
+    """Returns a list of (left name, right name) tuples, one per neuron name. The names are interned, so all
+    connection parameters share the same string objects."""
+    return [(sys.intern(name + "_L"), sys.intern(name + "_R")) for name in neuron_names]
+
+
+  def __create_symmetric_neural_connections(self, sided_target_neuron_names, row):
     try:
-      src_neuron_name = row[0]
+      src_neuron_name_l, src_neuron_name_r = self.__create_sided_neuron_names([row[0]])[0]
     except IndexError:
       return []
 
-    end = len(target_neuron_names) // 2
+    end = len(sided_target_neuron_names) // 2
     neural_connections = list()
 
     # The first half of the table (the ipsilateral connections)
-    for cell, tar_neuron_name in zip(row[1:], target_neuron_names[0:end]):
+    for cell, (tar_neuron_name_l, tar_neuron_name_r) in zip(row[1:], sided_target_neuron_names[0:end]):
       try:
         weight = float(cell)
       except ValueError:
         continue
-      neural_connections.append(NeuralConnectionParameters(src_neuron_name + "_L", tar_neuron_name + "_L", weight))
-      neural_connections.append(NeuralConnectionParameters(src_neuron_name + "_R", tar_neuron_name + "_R", weight))
+      neural_connections.append(NeuralConnectionParameters(src_neuron_name_l, tar_neuron_name_l, weight))
+      neural_connections.append(NeuralConnectionParameters(src_neuron_name_r, tar_neuron_name_r, weight))
 
     # The second half of the table (the contralateral connections)
-    for cell, tar_neuron_name in zip(row[end+1:], target_neuron_names[end:2*end]):
+    for cell, (tar_neuron_name_l, tar_neuron_name_r) in zip(row[end+1:], sided_target_neuron_names[end:2*end]):
       try:
         weight = float(cell)
       except ValueError:
         continue
-      neural_connections.append(NeuralConnectionParameters(src_neuron_name + "_L", tar_neuron_name + "_R", weight))
-      neural_connections.append(NeuralConnectionParameters(src_neuron_name + "_R", tar_neuron_name + "_L", weight))
+      neural_connections.append(NeuralConnectionParameters(src_neuron_name_l, tar_neuron_name_r, weight))
+      neural_connections.append(NeuralConnectionParameters(src_neuron_name_r, tar_neuron_name_l, weight))
 
     return neural_connections
@@ -7,7 +7,6 @@ from bio.brainregion import BrainRegion
 from bio.neuron import Neuron
 from bio.neuralconnection import NeuralConnection
 from vis.visbrainregion import VisBrainRegion
-from gui.vtkwidget import VtkWidget
 from IO.vtkio import VtkIO
 
 class CameraParameters:
@@ -33,6 +32,7 @@ class NeuronParameters:
     self.name = "neuron"
     self.position = (0, 0, 0)
     self.threshold = 0.0
+    self.brain_region_name = None
 
 
 class ConnectionParameters:
@@ -43,6 +43,17 @@ class ConnectionParameters:
     self.weight = -1
 
 
+class Project:
+  """This is what ProjectIO.read_project() returns: everything which is needed to show a project."""
+  def __init__(self, file_name):
+    self.file_name = file_name
+    self.camera_parameters = CameraParameters()
+    self.brain_regions = list()
+    self.neuron_groups = list()
+    self.neural_connections = list()
+    self.error_messages = list()
+
+
 class ProjectIO:
   def __init__(self, progress_bar):
     if not isinstance(progress_bar, ProgressBar):
@@ -65,17 +76,25 @@ class ProjectIO:
 
 
   def load_files(self, file_names, data_container, vtk_widget):
+    self.show_files(self.read_files(file_names), data_container, vtk_widget)
+
+
+  def read_files(self, file_names, progress_bar = None):
+    """Loads the files and returns the brain regions without adding them to a data container (see show_files()),
+    so this can run in a worker thread. 'progress_bar' is used instead of the one of this object if provided."""
+    if not progress_bar:
+      progress_bar = self.__progress_bar
     vtk_io = VtkIO()
     brain_regions = list()
 
     # Let the user know we are doing something    
-    self.__progress_bar.init(1, len(file_names), "Loading files: ")
+    progress_bar.init(1, len(file_names), "Loading files: ")
     counter = 0
 
     for file_name in file_names:
       # Update the progress bar
       counter += 1
-      self.__progress_bar.set_progress(counter)
+      progress_bar.set_progress(counter)
 
       # Load the file
       vtk_poly_data = vtk_io.load(file_name)
@@ -87,49 +106,106 @@ class ProjectIO:
         brain_regions.append(self.__create_brain_region(vtk_poly_data, BrainRegionParameters(self.__extract_name(file_name), file_name)))
 
     # We are done with loading
-    self.__progress_bar.done()
-    # Now, add the brain regions to the data container
+    progress_bar.done()
+    return brain_regions
+
+
+  def show_files(self, brain_regions, data_container, vtk_widget):
+    """Adds the brain regions returned by read_files() to the data container."""
     data_container.add_data(brain_regions)
     # Make sure all models are visible
     vtk_widget.reset_view()
 
 
   def open_project(self, default_brain_region_folder, project_file_name, data_container, brain, vtk_widget):
-    if not isinstance(data_container, DataContainer):
-      raise TypeError("input has to be of type DataContainer")
-    # This is the new project file name
-    self.__project_file_name = project_file_name
+    project = self.read_project(default_brain_region_folder, project_file_name, brain)
+    return self.show_project(project, data_container, brain, vtk_widget)
 
-    # Remove everything from the data container
-    data_container.clear()
 
-    error_messages = list()
-    camera_parameters = CameraParameters()
+  def read_project(self, default_brain_region_folder, project_file_name, brain, progress_bar = None, on_brain_regions_loaded = None):
+    """Parses the project file, loads the brain regions and creates the neurons and neural connections.
+    Nothing is added to 'brain' or to a data container (see show_project()), so this can run in a worker
+    thread. 'progress_bar' is used instead of the one of this object if provided. Returns a Project.
+    'on_brain_regions_loaded' gets called (in the thread running this method) with the Project as soon as
+    the brain regions are loaded, i.e., before the neurons are generated, such that the caller can show
+    them right away (see show_brain_regions()). It gets called even if parsing the file failed."""
+    if not progress_bar:
+      progress_bar = self.__progress_bar
+
+    project = Project(project_file_name)
     brain_region_parameters = list()
     neuron_parameters = list()
     connection_parameters = list()
 
     # Parse the XML project file and return the info in our own format
     try:
-      self.__parse_xml_project_file(project_file_name, camera_parameters, brain_region_parameters, neuron_parameters, connection_parameters)
+      self.__parse_xml_project_file(project_file_name, project.camera_parameters, brain_region_parameters, neuron_parameters, connection_parameters)
     except Exception as error:
-      error_messages.append(str(error))
-      return error_messages
+      project.camera_parameters = None
+      project.error_messages.append(str(error))
+      if on_brain_regions_loaded:
+        on_brain_regions_loaded(project)
+      return project
 
     # Load the brain regions (i.e., the meshes from disk)
-    self.__load_brain_regions(default_brain_region_folder, brain_region_parameters, data_container, error_messages)
+    project.brain_regions = self.__load_brain_regions(default_brain_region_folder, project_file_name, brain_region_parameters,
+      project.error_messages, progress_bar)
+    if on_brain_regions_loaded:
+      on_brain_regions_loaded(project)
     # Create the neurons (note that the visual representation is not loaded but generated on the fly)
-    brain.create_neurons(neuron_parameters)
+    project.neuron_groups = brain.build_neurons(neuron_parameters, progress_bar, project.brain_regions)[0]
     # Create the connections (note that the visual representation is not loaded but generated on the fly)
-    brain.create_neural_connections(connection_parameters)
+    neurons = [neuron for neuron_group in project.neuron_groups for neuron in neuron_group]
+    project.neural_connections = brain.build_neural_connections(connection_parameters, progress_bar, neurons)
+
+    return project
 
-    # Setup the VTK widget based on what we parsed
-    vtk_widget.set_camera_position(camera_parameters.position)
-    vtk_widget.set_camera_look_at(camera_parameters.look_at)
-    vtk_widget.set_camera_view_up(camera_parameters.view_up)
-    vtk_widget.reset_clipping_range()
 
-    return error_messages
+  def show_project(self, project, data_container, brain, vtk_widget):
+    """Replaces everything in the data container by the project returned by read_project(). Returns the error
+    messages collected while reading the project. This is show_brain_regions() followed by all steps of
+    show_neural_network_in_steps()."""
+    self.show_brain_regions(project, data_container, vtk_widget)
+    for step in self.show_neural_network_in_steps(project, brain, vtk_widget):
+      pass
+    return project.error_messages
+
+
+  def show_brain_regions(self, project, data_container, vtk_widget):
+    """Replaces everything in the data container by the brain regions of the project returned by read_project()
+    and sets up the camera. Has to be called in the GUI thread."""
+    if not isinstance(data_container, DataContainer):
+      raise TypeError("input has to be of type DataContainer")
+    # This is the new project file name
+    self.__project_file_name = project.file_name
+
+    # Remove everything from the data container
+    data_container.clear()
+
+    # Did we fail to parse the project file?
+    if not project.camera_parameters:
+      return
+
+    # Setup the VTK widget based on what we parsed. We do this first, since the scene is shown while it is
+    # being built: first the brain regions, then the neurons and finally the connections.
+    vtk_widget.set_camera_position(project.camera_parameters.position)
+    vtk_widget.set_camera_look_at(project.camera_parameters.look_at)
+    vtk_widget.set_camera_view_up(project.camera_parameters.view_up)
+
+    data_container.add_data(project.brain_regions)
+
+
+  def show_neural_network_in_steps(self, project, brain, vtk_widget):
+    """Returns an iterator which adds the neurons and the neural connections of the project to 'brain' chunk by
+    chunk, one chunk per call of next() (see Brain.add_neurons_in_steps()). Call show_brain_regions() first.
+    Has to be called in the GUI thread."""
+    if not project.camera_parameters:
+      return
+
+    yield from brain.add_neurons_in_steps(project.neuron_groups, self.__progress_bar)
+    yield from brain.add_neural_connections_in_steps(project.neural_connections, self.__progress_bar)
+
+    vtk_widget.reset_clipping_range()
 
 
   def __parse_xml_project_file(self, project_file_name, camera_parameters, brain_region_parameters, neuron_parameters, connection_parameters):
@@ -185,6 +261,7 @@ class ProjectIO:
         pos_string = element.text.split(" ")
         neuron_params.position = (float(pos_string[0]), float(pos_string[1]), float(pos_string[2]))
       elif element.tag == "threshold": neuron_params.threshold = float(element.text)
+      elif element.tag == "brain_region_name": neuron_params.brain_region_name = element.text
     # Return what we have parsed
     return neuron_params
 
@@ -202,25 +279,25 @@ class ProjectIO:
     return connection
 
 
-  def __load_brain_regions(self, default_brain_region_folder, brain_region_parameters, data_container, error_messages):
+  def __load_brain_regions(self, default_brain_region_folder, project_file_name, brain_region_parameters, error_messages, progress_bar):
     vtk_io = VtkIO()
     brain_regions = list()
 
     # Get the project folder (only used for the relative file paths below)
-    if self.__project_file_name:
-      project_folder = os.path.split(self.__project_file_name)[0]
+    if project_file_name:
+      project_folder = os.path.split(project_file_name)[0]
     else:
       project_folder = ""
 
     # Let the user know we are doing something    
-    self.__progress_bar.init(1, len(brain_region_parameters), "Loading files: ")
+    progress_bar.init(1, len(brain_region_parameters), "Loading files: ")
     counter = 0
 
     # Load the VTK files from disk and create the brain regions
     for parameters in brain_region_parameters:
       # Update the progress bar
       counter += 1
-      self.__progress_bar.set_progress(counter)
+      progress_bar.set_progress(counter)
 
       vtk_poly_data = None
 
@@ -249,9 +326,8 @@ class ProjectIO:
         brain_regions.append(self.__create_brain_region(vtk_poly_data, parameters))
 
     # We are done with loading
-    self.__progress_bar.done()
-    # Add the new data to the container
-    data_container.add_data(brain_regions)
+    progress_bar.done()
+    return brain_regions
 
 
   def __create_brain_region(self, vtk_poly_data, parameters):
@@ -276,8 +352,9 @@ class ProjectIO:
     if not isinstance(data_container, DataContainer):
       raise TypeError("the input data container has to be of type DataContainer")
 
-    if not isinstance(vtk_widget, VtkWidget):
-      raise TypeError("the input vtk widget has to be of type VtkWidget")
+    # This works with the VtkWidget of the GUI as well as with the OffscreenViewer
+    if not hasattr(vtk_widget, "get_camera_position"):
+      raise TypeError("the input vtk widget has to provide the camera parameters")
 
     if not self.has_file_name():
       raise Exception("Error in " + self.__class__.__name__ + ": file name not set")
@@ -292,13 +369,12 @@ class ProjectIO:
     self.__save_camera_parameters(vtk_widget, ET.SubElement(xml_project, "camera_parameters"))
 
     # Save the data of each model to the XML file
-    for model in data_container.get_models():
-      if isinstance(model, BrainRegion):
-        self.__save_brain_region(model, project_folder, ET.SubElement(xml_project, "brain_region"))
-      elif isinstance(model, Neuron):
-        self.__save_neuron(model, ET.SubElement(xml_project, "neuron"))
-      elif isinstance(model, NeuralConnection):
-        self.__save_neural_connection(model, ET.SubElement(xml_project, "neural_connection"))
+    for brain_region in data_container.get_models_of_type(BrainRegion):
+      self.__save_brain_region(brain_region, project_folder, ET.SubElement(xml_project, "brain_region"))
+    for neuron in data_container.get_models_of_type(Neuron):
+      self.__save_neuron(neuron, ET.SubElement(xml_project, "neuron"))
+    for neural_connection in data_container.get_models_of_type(NeuralConnection):
+      self.__save_neural_connection(neural_connection, ET.SubElement(xml_project, "neural_connection"))
 
     # Write the whole XML tree to file
     ET.ElementTree(xml_project).write(self.__project_file_name)
@@ -331,6 +407,8 @@ class ProjectIO:
     p = neuron.position
     ET.SubElement(xml_element, "position").text = str(p[0]) + " " + str(p[1]) + " " + str(p[2])
     ET.SubElement(xml_element, "threshold").text = str(neuron.threshold)
+    if neuron.brain_region_name:
+      ET.SubElement(xml_element, "brain_region_name").text = neuron.brain_region_name
 
 
   def __save_neural_connection(self, connection, xml_element):
@@ -3,6 +3,7 @@ import os
 import os.path
 from vis.vtkpoly import VtkPolyModel
 from vis.vtkvol import VtkVolumeModel
+from vis.volumesource import MemoryMappedVolume
 from IO.obj import OBJReader
 
 class VtkIO:
@@ -21,7 +22,8 @@ class VtkIO:
 
 
   def load(self, file_name):
-    """Loads the data from the file 'file_name' and returns it. Returns None if the file type is not supported."""
+    """Loads the data from the file 'file_name' and returns it. Returns None if the file type is not supported.
+    Volumes are not loaded by this method (see load_volume())."""
     # Make sure the file exists
     if not file_name or not os.path.isfile(file_name):
       return None
@@ -34,3 +36,12 @@ class VtkIO:
     data_reader.SetFileName(file_name)
     data_reader.Update()
     return data_reader.GetOutput()
+
+
+  def load_volume(self, file_name, shape = None, dtype = None):
+    """Memory maps the volume in the file 'file_name' (see MemoryMappedVolume) and returns a VtkVolumeModel
+    which shows it. Returns None if the file does not exist."""
+    if not file_name or not os.path.isfile(file_name):
+      return None
+    name = os.path.splitext(os.path.split(file_name)[1])[0]
+    return VtkVolumeModel(MemoryMappedVolume(file_name, shape, dtype), name)
@@ -0,0 +1,130 @@
+import os
+import sys
+import argparse
+import traceback
+import multiprocessing
+from bio.brain import Brain
+from core.datacontainer import DataContainer
+from core.controller import Controller
+from core.progress import SilentProgressBar
+from IO.project import ProjectIO
+from IO.conmat import ConnectivityMatrixIO
+from vis.offscreenviewer import OffscreenViewer
+
+class BatchJob:
+  """Everything needed to render a single image. 'matrix_file_name' is optional (None if the image shows the
+  project and/or the meshes only)."""
+  def __init__(self, project_file_name, mesh_file_names, matrix_file_name, output_file_name, camera, image_size):
+    self.project_file_name = project_file_name
+    self.mesh_file_names = mesh_file_names
+    self.matrix_file_name = matrix_file_name
+    self.output_file_name = output_file_name
+    self.camera = camera
+    self.image_size = image_size
+
+
+def render_job(job):
+  """Builds the scene described by 'job' (in its own data container, brain and offscreen viewer), renders it
+  and saves the image. Returns a tuple (job, error messages, error). 'error' is None if the image was saved.
+  Otherwise, it is the traceback of the exception which stopped the job (a string, since the exception may
+  not survive the trip from a worker process), such that one failing job does not stop the others."""
+  try:
+    return (job, _render_job(job), None)
+  except Exception:
+    return (job, [], traceback.format_exc())
+
+
+def _render_job(job):
+  data_container = DataContainer()
+  brain = Brain(data_container)
+  controller = Controller(data_container, brain)
+  viewer3d = OffscreenViewer(job.image_size[0], job.image_size[1])
+  controller.set_viewer3d(viewer3d)
+  project_io = ProjectIO(SilentProgressBar())
+  error_messages = list()
+
+  # Load the project and/or the meshes
+  if job.project_file_name:
+    project_folder = os.path.split(job.project_file_name)[0]
+    error_messages.extend(project_io.open_project(project_folder, job.project_file_name, data_container, brain, viewer3d))
+  if job.mesh_file_names:
+    project_io.load_files(job.mesh_file_names, data_container, viewer3d)
+
+  # Create the neural network
+  if job.matrix_file_name:
+    error_messages.extend(ConnectivityMatrixIO().load_matrix(job.matrix_file_name, brain, SilentProgressBar()))
+
+  # Setup the camera: either the one provided by the user or the one from the project
+  position, look_at, view_up = job.camera
+  if position or look_at or view_up:
+    if position: viewer3d.set_camera_position(position)
+    if look_at: viewer3d.set_camera_look_at(look_at)
+    if view_up: viewer3d.set_camera_view_up(view_up)
+  elif not job.project_file_name:
+    viewer3d.reset_view()
+
+  viewer3d.save_screenshot(job.output_file_name)
+  return error_messages
+
+
+def create_jobs(args):
+  """Creates one job per connectivity matrix or a single one if there are no matrices."""
+  camera = (args.camera_position, args.camera_look_at, args.camera_view_up)
+  image_size = tuple(args.size)
+  if not args.matrix:
+    name = args.project if args.project else args.meshes[0]
+    output_file_name = os.path.join(args.output_dir, os.path.splitext(os.path.split(name)[1])[0] + ".png")
+    return [BatchJob(args.project, args.meshes, None, output_file_name, camera, image_size)]
+
+  jobs = list()
+  for matrix_file_name in args.matrix:
+    output_file_name = os.path.join(args.output_dir, os.path.splitext(os.path.split(matrix_file_name)[1])[0] + ".png")
+    jobs.append(BatchJob(args.project, args.meshes, matrix_file_name, output_file_name, camera, image_size))
+  return jobs
+
+
+def parse_arguments(argv):
+  parser = argparse.ArgumentParser(description = "Renders BrainVisPy scenes to PNG files without GUI. Each connectivity "
+    "matrix results in one image which shows the project/meshes together with the neural network defined by the matrix.")
+  parser.add_argument("--project", help = "BrainVisPy project file (XML)")
+  parser.add_argument("--meshes", nargs = "+", default = [], help = "mesh files to load (brain regions)")
+  parser.add_argument("--matrix", nargs = "+", default = [], help = "connectivity matrices (CSV), one image per matrix")
+  parser.add_argument("--output-dir", default = ".", help = "the folder for the images (named after the matrices)")
+  parser.add_argument("--size", nargs = 2, type = int, default = [1920, 1080], metavar = ("WIDTH", "HEIGHT"))
+  parser.add_argument("--camera-position", nargs = 3, type = float, metavar = ("X", "Y", "Z"))
+  parser.add_argument("--camera-look-at", nargs = 3, type = float, metavar = ("X", "Y", "Z"))
+  parser.add_argument("--camera-view-up", nargs = 3, type = float, metavar = ("X", "Y", "Z"))
+  parser.add_argument("--processes", type = int, default = 1, help = "number of images rendered in parallel")
+  args = parser.parse_args(argv)
+  if not args.project and not args.meshes:
+    parser.error("provide a project and/or meshes")
+  return args
+
+
+if __name__ == "__main__":
+  args = parse_arguments(sys.argv[1:])
+  os.makedirs(args.output_dir, exist_ok = True)
+  jobs = create_jobs(args)
+
+  if args.processes > 1 and len(jobs) > 1:
+    # Each process has its own VTK pipeline and render window ("spawn" avoids sharing them by forking)
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+      results = list(pool.imap_unordered(render_job, jobs))
+  else:
+    results = [render_job(job) for job in jobs]
+
+  num_failed_jobs = 0
+  for job, error_messages, error in results:
+    if error:
+      num_failed_jobs += 1
+      print("FAILED: " + job.output_file_name, file = sys.stderr)
+      print(error, file = sys.stderr)
+    else:
+      print(job.output_file_name)
+    for error_message in error_messages:
+      print("  " + error_message.strip())
+
+  # The images of the other jobs are saved anyway, but the caller (e.g., a script) should know that some are missing
+  if num_failed_jobs:
+    print(str(num_failed_jobs) + " of " + str(len(jobs)) + " images failed", file = sys.stderr)
+    sys.exit(1)
@@ -1,57 +1,92 @@
-from generators.symmetricpoints import SymmetricPointsGenerator
+import weakref
+import threading
+import numpy as np
+from vtk.util import numpy_support
+from generators.symmetricpoints import MeshGeometry, SymmetricPointsGenerator
 from core.settings import Settings
 from core.datacontainer import DataContainer
 from bio.brainregion import BrainRegion
 from bio.neuron import Neuron
 from bio.neuralconnection import NeuralConnection
-from vis.visneuralconnection import VisNeuralConnection
-from vis.visneuron import VisNeuron
+from bio.networkstore import NeuronStore, ConnectionStore
+from bio.spatialindex import SpatialIndex
+from bio.regionconnectivity import RegionConnectivity
+from vis.visneuralconnection import VisNeuralConnections
+from vis.visregionconnectivity import VisRegionConnectivity
+from vis.visneuron import VisNeurons
 
 class Brain:
   def __init__(self, data_container):
     self.__name_to_brain_region = dict()
-    self.__name_to_neuron = dict()
-    self.__name_to_neural_connection = dict()
+    # The (brain region, MeshGeometry) dictionary which saves the setup of the neuron generation (see __get_mesh_geometry()).
+    # The keys are weak, since the brain regions of a cancelled project loading never make it to this brain.
+    self.__brain_region_to_mesh_geometry = weakref.WeakKeyDictionary()
+    # The neurons and the neural connections (column by column, see bio/networkstore.py)
+    self.__neuron_store = NeuronStore()
+    self.__connection_store = ConnectionStore(self.__neuron_store)
+    # The grid over the neuron positions (for the spatial queries)
+    self.__spatial_index = SpatialIndex(self.__neuron_store)
+
+    # Neural connections whose absolute weight is below this threshold are hidden
+    self.__connection_weight_threshold = 0.0
+
+    # The region-aggregated connectivity: None (show the neural connections), "sum" or "mean"
+    self.__region_connectivity_mode = None
+    # The data item which shows the region-to-region bundles (created on demand)
+    self.__region_connectivity = None
+    # The aggregated weights (cached, see __get_region_connectivity_matrices())
+    self.__region_connectivity_matrices = None
+
+    # The name map, the stores (and everything derived from them) may be changed by several threads
+    self.__lock = threading.RLock()
 
     self.__data_container = data_container
-    self.__data_container.add_observer(self)
-
-
-  def observable_changed(self, change, data):
-    # Decide what to do depending on what changed
-    if change == DataContainer.change_is_new_data:
-      self.__add_brain_regions(data)
-    elif change == DataContainer.change_is_deleted_models:
-      self.__delete_data(data)
+    self.__data_container.subscribe(DataContainer.change_is_new_data, self.__add_brain_regions)
+    self.__data_container.subscribe(DataContainer.change_is_deleted_models, self.__delete_data)
 
 
   def __add_brain_regions(self, data):
-    for model in data:
-      if isinstance(model, BrainRegion):
-        self.__name_to_brain_region[model.name] = model
+    with self.__lock:
+      brain_regions_added = False
+      for model in data:
+        if isinstance(model, BrainRegion):
+          self.__name_to_brain_region[model.name] = model
+          brain_regions_added = True
 
-
-  def __delete_data(self, data_items):
-    for item in data_items:
-      if isinstance(item, BrainRegion): # delete the brain region
-        try:
-          del self.__name_to_brain_region[item.name]
-        except KeyError:
-          pass
-      elif isinstance(item, NeuralConnection): # delete the neural connection
-        try:
-          del self.__name_to_neural_connection[item.name]
-        except KeyError:
-          pass
-      elif isinstance(item, Neuron): # delete the neuron
-        self.__delete_neuron(item)
+      # The aggregated connectivity is out of date
+      if brain_regions_added:
+        self.__region_connectivity_matrices = None
+        self.__update_region_connectivity()
 
 
-  def __delete_neuron(self, neuron):
-    try:
-      del self.__name_to_neuron[neuron.name]
-    except KeyError:
-      pass
+  def __delete_data(self, data_items):
+    with self.__lock:
+      connectivity_changed = False
+      for item in data_items:
+        if isinstance(item, BrainRegion): # delete the brain region
+          self.__brain_region_to_mesh_geometry.pop(item, None)
+          try:
+            del self.__name_to_brain_region[item.name]
+          except KeyError:
+            pass
+          else:
+            connectivity_changed = True
+        elif isinstance(item, NeuralConnection): # delete the neural connection
+          if self.__connection_store.remove(item):
+            connectivity_changed = True
+        elif isinstance(item, Neuron): # delete the neuron
+          if self.__neuron_store.remove(item):
+            connectivity_changed = True
+        elif item is self.__region_connectivity: # the user deleted the bundles
+          self.__region_connectivity = None
+          self.__region_connectivity_mode = None
+          if self.__apply_neural_connection_weight_threshold():
+            self.__data_container.update_visibility()
+
+      # The aggregated connectivity is out of date
+      if connectivity_changed:
+        self.__region_connectivity_matrices = None
+        self.__update_region_connectivity()
 
 
   def create_neurons(self, neuron_parameters, progress_bar = None):
@@ -59,38 +94,59 @@ class Brain:
     by adding the new neurons to it. Thus, all observers of the data container get notified about the new
     data. Returns a list with error messages that tell what went wrong or an empty list if everything is
     fine. For example, an error message lists the names of the brain regions that are supposed to
-    contain neurons but are not loaded yet."""
+    contain neurons but are not loaded yet. This is the same as build_neurons() followed by add_neurons()."""
+    neuron_groups, error_messages = self.build_neurons(neuron_parameters, progress_bar)
+    self.add_neurons(neuron_groups, progress_bar)
+    return error_messages
+
+
+  def build_neurons(self, neuron_parameters, progress_bar = None, brain_regions = None):
+    """Creates the neurons (including their visual representations) according to 'neuron_parameters' but
+    neither saves them nor adds them to the data container (see add_neurons()). That's why this method can
+    run in a worker thread. The neurons are generated inside 'brain_regions' (a list of brain regions) or
+    inside the brain regions of this brain if 'brain_regions' is None. Returns a tuple (neuron groups, error
+    messages). Each group is a list of neurons which should be shown together: first the ones with known
+    positions and then the ones of each brain region."""
+    if not neuron_parameters:
+      return ([], [])
+
+    # Work with a copy, since the brain regions may be deleted while we are running
+    if brain_regions is None:
+      with self.__lock:
+        name_to_brain_region = dict(self.__name_to_brain_region)
+    else:
+      name_to_brain_region = {brain_region.name: brain_region for brain_region in brain_regions}
+
     try:
-      progress_bar.init(0, 2, "Generating the Neurons:")
+      progress_bar.init(0, len(neuron_parameters), "Generating the Neurons:")
       progress_bar.set_progress(0)
-    except:
+    except AttributeError:
       pass
 
-    # Delete the existing neurons
-    self.__data_container.delete_models(list(self.__name_to_neuron.values()))
-
-    if not neuron_parameters:
-      return []
-
+    # The new neurons go to a new store which replaces the one of this brain in add_neurons()
+    neuron_store = NeuronStore()
+    neuron_store.set_visual_representation(VisNeurons(neuron_store))
     brain_region_to_neurons = dict()
     new_neurons = list()
+    neuron_groups = [new_neurons]
+    counter = 0
 
     missing_brain_regions = set()
 
-    for np in neuron_parameters:
+    for neuron_params in neuron_parameters:
       try: # to get the neuron's position
-        p = np.position
+        p = neuron_params.position
       except AttributeError:
         # No position is provided
         try: # to get a brain region name
-          brain_region_name = np.brain_region_name
+          brain_region_name = neuron_params.brain_region_name
         except AttributeError:
           # Neither position nor brain region => cannot create the neuron
           continue
         else:
           # Make sure the desired brain region exists
           try:
-            brain_region = self.__name_to_brain_region[brain_region_name]
+            brain_region = name_to_brain_region[brain_region_name]
           except KeyError:
             missing_brain_regions.add(brain_region_name)
             continue
@@ -99,107 +155,486 @@ class Brain:
           if brain_region not in brain_region_to_neurons:
             brain_region_to_neurons[brain_region] = list()
           # Save the neuron parameters
-          brain_region_to_neurons[brain_region].append(np)
+          brain_region_to_neurons[brain_region].append(neuron_params)
       else:
         # We got position -> create the neuron
-        neuron = self.__create_neuron(np.name, p, np.threshold)
-        self.__add_neuron(neuron)
-        new_neurons.append(neuron)
-
-    try:
-      progress_bar.init(1, len(brain_region_to_neurons), "Generating the Neurons:")
-      counter = 1
-    except:
-      pass
+        new_neurons.append(self.__create_neuron(neuron_store, neuron_params.name, p, neuron_params.threshold, getattr(neuron_params, "brain_region_name", None)))
+        counter += 1
+        if counter % Settings.progressive_loading_chunk_size == 0:
+          try:
+            progress_bar.set_progress(counter)
+          except AttributeError:
+            pass
 
     # Now generate the neurons inside the brain regions
     for brain_region in brain_region_to_neurons:
-      try:
-        progress_bar.set_progress(counter)
-        counter += 1
-      except:
-        pass
-
       # Get the neuron parameters
-      neuron_parameters = brain_region_to_neurons[brain_region]
+      neuron_parameters_of_region = brain_region_to_neurons[brain_region]
       # This is the guy who generates the random neuron positions
-      points_generator = SymmetricPointsGenerator(brain_region, axis=0)
+      points_generator = SymmetricPointsGenerator(brain_region, axis=0, mesh_geometry=self.__get_mesh_geometry(brain_region, axis=0))
+      new_neurons = list()
 
-      for params in neuron_parameters:
+      for params in neuron_parameters_of_region:
         # Mirrored or "standard" neuron
         if params.brain_side and params.brain_side[0].lower() == "m": # "m" for mirrored
           p1, p2 = points_generator.generate_mirrored_points_inside_mesh()
-          n1 = self.__create_neuron(params.name + "_L", p1, params.threshold)
-          n2 = self.__create_neuron(params.name + "_R", p2, params.threshold)
-          self.__add_neuron(n1)
-          self.__add_neuron(n2)
-          new_neurons.append(n1)
-          new_neurons.append(n2)
+          new_neurons.append(self.__create_neuron(neuron_store, params.name + "_L", p1, params.threshold, brain_region.name))
+          new_neurons.append(self.__create_neuron(neuron_store, params.name + "_R", p2, params.threshold, brain_region.name))
         else:
           neuron_position = points_generator.generate_point_inside_mesh(params.brain_side)
-          neuron = self.__create_neuron(params.name, neuron_position, params.threshold)
-          self.__add_neuron(neuron)
-          new_neurons.append(neuron)
+          new_neurons.append(self.__create_neuron(neuron_store, params.name, neuron_position, params.threshold, brain_region.name))
+
+      neuron_groups.append(new_neurons)
+      counter += len(neuron_parameters_of_region)
+      try:
+        progress_bar.set_progress(counter)
+      except AttributeError:
+        pass
 
     try:
       progress_bar.done()
-    except:
+    except AttributeError:
       pass
 
-    self.__data_container.add_data(new_neurons)
-
     # Inform the user about missing brain regions
     if missing_brain_regions:
       error_message = "Missing brain region(s):\n"
       for name in missing_brain_regions:
         error_message += "  " + name + "\n"
-      return [error_message]
+      return (neuron_groups, [error_message])
 
     # everything is fine
-    return []
+    return (neuron_groups, [])
 
 
-  def __create_neuron(self, name, p, threshold):
-    vis_neuron = VisNeuron(name, p, Settings.neuron_sphere_radius)
-    return Neuron(name, p[0], p[1], p[2], threshold, vis_neuron)
+  def __get_mesh_geometry(self, brain_region, axis):
+    """Returns the MeshGeometry of the brain region. It is computed once and reused by later imports as long as
+    the mesh of the brain region does not change."""
+    with self.__lock:
+      mesh_geometry = self.__brain_region_to_mesh_geometry.get(brain_region)
+    if mesh_geometry and mesh_geometry.is_up_to_date(brain_region, axis):
+      return mesh_geometry
+
+    # This may take a while, so don't block the other threads
+    mesh_geometry = MeshGeometry(brain_region, axis)
+    with self.__lock:
+      self.__brain_region_to_mesh_geometry[brain_region] = mesh_geometry
+    return mesh_geometry
+
+
+  def add_neurons(self, neuron_groups, progress_bar = None):
+    """Replaces the neurons of this brain by the ones in 'neuron_groups' (see build_neurons()) and adds them
+    to the data container, which notifies its observers. Can be called in any thread. This runs all steps
+    of add_neurons_in_steps() at once."""
+    for step in self.add_neurons_in_steps(neuron_groups, progress_bar):
+      pass
+
 
+  def add_neurons_in_steps(self, neuron_groups, progress_bar = None):
+    """Like add_neurons() but returns an iterator which does the work step by step: each call of next() adds
+    one chunk of neurons, such that the GUI can do one step per event loop tick and render the scene in
+    between (see gui.stepqueue.StepQueue). The neurons should not be changed until the iterator is done."""
+    with self.__lock:
+      # Delete the existing neurons
+      self.__data_container.delete_models(self.__neuron_store.get_neurons())
 
-  def __add_neuron(self, neuron):
-    self.__name_to_neuron[neuron.name] = neuron
+      # Take over the store of the new neurons (all of them are in the store created by build_neurons())
+      first_neuron = next((neuron for neuron_group in neuron_groups for neuron in neuron_group), None)
+      self.__neuron_store = first_neuron.store if first_neuron else NeuronStore()
+      self.__spatial_index = SpatialIndex(self.__neuron_store)
+      self.__region_connectivity_matrices = None
+    yield
 
+    # Add the neurons to the container (and thus to the 3D view) group by group
+    yield from self.__add_data_in_chunks(neuron_groups, self.__data_container.add_data, progress_bar, "Adding the Neurons:")
 
-  def create_neural_connections(self, connection_parameters):
+
+  def __create_neuron(self, neuron_store, name, p, threshold, brain_region_name = None):
+    # The visual representation of the store draws the new neuron too
+    return neuron_store.add(name, p, threshold, brain_region_name)
+
+
+  def __add_data_in_chunks(self, data_groups, add_data, progress_bar, description):
+    """Returns an iterator which calls 'add_data' for each group in 'data_groups' (a list of lists), one call
+    per step. Big groups are split in chunks of Settings.progressive_loading_chunk_size items. The progress
+    bar is updated after each call. The lock is held during the calls only (and not between the steps)."""
+    chunk_size = Settings.progressive_loading_chunk_size
+    num_data_items = sum(len(data_group) for data_group in data_groups)
+    if not num_data_items:
+      return
+
+    try:
+      progress_bar.init(0, num_data_items, description)
+    except AttributeError:
+      pass
+
+    counter = 0
+    for data_group in data_groups:
+      for start in range(0, len(data_group), chunk_size):
+        chunk = data_group[start:start + chunk_size]
+        with self.__lock:
+          add_data(chunk)
+        counter += len(chunk)
+        try:
+          progress_bar.set_progress(counter)
+        except AttributeError:
+          pass
+        yield
+
+    try:
+      progress_bar.done()
+    except AttributeError:
+      pass
+
+
+  def create_neural_connections(self, connection_parameters, progress_bar = None):
     """Create neural connections according to the specifications in 'connection_parameters'. Modifies the
     data container by adding the new connections to it. Thus, all observers of the data container get
     notified about the new data. Returns a list with error messages that tell what went wrong or an empty
-    list if everything is fine. The current version always returns an empty list (no errors can occur)."""
-    # Delete existing neural connections
-    self.__data_container.delete_models(list(self.__name_to_neural_connection.values()))
+    list if everything is fine. The current version always returns an empty list (no errors can occur).
+    This is the same as build_neural_connections() followed by add_neural_connections()."""
+    self.add_neural_connections(self.build_neural_connections(connection_parameters, progress_bar), progress_bar)
+    # No error messages
+    return []
+
 
+  def build_neural_connections(self, connection_parameters, progress_bar = None, neurons = None):
+    """Creates the neural connections (including their visual representations) according to 'connection_parameters'
+    but neither saves them nor adds them to the data container (see add_neural_connections()). That's why this
+    method can run in a worker thread. The connections are between 'neurons' (a list of neurons) or between the
+    neurons of this brain if 'neurons' is None. Returns the list of new connections."""
     if not connection_parameters:
       return []
 
+    if neurons is None:
+      with self.__lock:
+        neuron_store = self.__neuron_store
+        find_neuron = neuron_store.find
+    else:
+      neuron_store = neurons[0].store if neurons else NeuronStore()
+      find_neuron = {neuron.name: neuron for neuron in neurons}.get
+    # The new connections go to a new store which replaces the one of this brain in add_neural_connections()
+    connection_store = ConnectionStore(neuron_store)
+    connection_store.set_visual_representation(VisNeuralConnections(connection_store))
+
+    try:
+      progress_bar.init(0, len(connection_parameters), "Creating the Connections:")
+    except AttributeError:
+      pass
+
     new_neural_connections = list()
 
-    for cp in connection_parameters:
+    for counter, cp in enumerate(connection_parameters, 1):
       # Get the neurons we are supposed to connect
-      src_neuron = self.__name_to_neuron.get(cp.src_neuron_name)
-      tar_neuron = self.__name_to_neuron.get(cp.tar_neuron_name)
-      if not src_neuron or not tar_neuron:
-        continue
-      # Create the name of the neural connection
-      nc_name = src_neuron.name + " -> " + tar_neuron.name
-      # Create a new neural connection and save it
-      nc = self.__create_neural_connection(nc_name, src_neuron.name, tar_neuron.name, src_neuron.p, tar_neuron.p, cp.weight)
-      self.__name_to_neural_connection[nc_name] = nc
-      new_neural_connections.append(nc)
-
-    # Add the new connections to the data container
-    self.__data_container.add_data(new_neural_connections)
-    # No error messages
-    return []
+      src_neuron = find_neuron(cp.src_neuron_name)
+      tar_neuron = find_neuron(cp.tar_neuron_name)
+      if src_neuron and tar_neuron:
+        # There is one connection per pair of neurons, the last weight wins
+        nc = connection_store.find(src_neuron.id, tar_neuron.id)
+        if nc:
+          nc.set_weight(cp.weight)
+        else:
+          # Create a new neural connection and save it
+          new_neural_connections.append(self.__create_neural_connection(connection_store, src_neuron, tar_neuron, cp.weight))
+
+      if counter % Settings.progressive_loading_chunk_size == 0:
+        try:
+          progress_bar.set_progress(counter)
+        except AttributeError:
+          pass
+
+    try:
+      progress_bar.done()
+    except AttributeError:
+      pass
+
+    return new_neural_connections
+
+
+  def add_neural_connections(self, neural_connections, progress_bar = None):
+    """Replaces the neural connections of this brain by 'neural_connections' (see build_neural_connections())
+    and adds them to the data container, which notifies its observers. Can be called in any thread. This runs
+    all steps of add_neural_connections_in_steps() at once."""
+    for step in self.add_neural_connections_in_steps(neural_connections, progress_bar):
+      pass
+
+
+  def add_neural_connections_in_steps(self, neural_connections, progress_bar = None):
+    """Like add_neural_connections() but step by step (see add_neurons_in_steps())."""
+    with self.__lock:
+      # Delete existing neural connections
+      self.__data_container.delete_models(self.__connection_store.get_neural_connections())
+
+      # Take over the store of the new connections (see build_neural_connections())
+      if not neural_connections:
+        self.__connection_store = ConnectionStore(self.__neuron_store)
+        return
+      self.__connection_store = neural_connections[0].store
+    yield
+
+    # Add the connections to the data container (and thus to the 3D view) chunk by chunk
+    yield from self.__add_data_in_chunks([neural_connections], self.__add_neural_connections, progress_bar, "Adding the Connections:")
+
+    # Update the bundles if the user looks at the region-aggregated connectivity
+    with self.__lock:
+      self.__region_connectivity_matrices = None
+      if self.__update_region_connectivity():
+        self.__data_container.update()
+
+
+  def __add_neural_connections(self, neural_connections):
+    """Adds 'neural_connections' (of the current store) to the data container. The ones below the current
+    weight threshold are hidden."""
+    store = self.__connection_store
+    rows = np.array([nc.id for nc in neural_connections], dtype = int)
+    store.set_shown(rows, (np.abs(store.weights[rows]) >= self.__connection_weight_threshold) & (not self.__region_connectivity_mode))
+    self.__data_container.add_data(neural_connections)
+
+
+  def __create_neural_connection(self, connection_store, src_neuron, tar_neuron, weight):
+    # The visual representation of the store draws the new connection too
+    return connection_store.add(src_neuron, tar_neuron, weight)
+
+
+  def get_neurons_in_sphere(self, center, radius):
+    """Returns the neurons whose distance to 'center' is at most 'radius'."""
+    with self.__lock:
+      return [self.__neuron_store.get_neuron(i) for i in self.__spatial_index.get_ids_in_sphere(center, radius)]
+
+
+  def get_neurons_in_box(self, min_corner, max_corner):
+    """Returns the neurons inside the axis-aligned box with the provided corners."""
+    with self.__lock:
+      return [self.__neuron_store.get_neuron(i) for i in self.__spatial_index.get_ids_in_box(min_corner, max_corner)]
+
+
+  def get_nearest_neurons(self, point, k = 1):
+    """Returns the 'k' neurons closest to 'point' sorted by their distance to it."""
+    with self.__lock:
+      return [self.__neuron_store.get_neuron(i) for i in self.__spatial_index.get_nearest_ids(point, k)]
+
+
+  def get_models_in_view_rectangle(self, world_to_view, rectangle):
+    """Returns a tuple (neurons, neural connections) with the visible neurons and connections inside a screen
+    rectangle. 'world_to_view' is a 4x4 matrix which maps homogeneous world coordinates to homogeneous view
+    coordinates (e.g., the composite projection matrix of a camera) and 'rectangle' is (x_min, y_min, x_max,
+    y_max) in view coordinates (after the division by w). A neuron is inside if it is in front of the camera
+    and its center projects into the rectangle. A connection is inside if both of its neurons are. This is a
+    single pass over the position array, occluded neurons are selected too."""
+    x_min, y_min, x_max, y_max = rectangle
+    world_to_view = np.asarray(world_to_view, dtype = float)
+
+    def is_inside(neuron_store):
+      # Project the neuron positions and check which ones are in the rectangle
+      p = neuron_store.positions.dot(world_to_view[:, :3].T) + world_to_view[:, 3]
+      w = p[:, 3]
+      in_front = w > 0
+      w = np.where(in_front, w, 1.0)
+      x, y = p[:, 0]/w, p[:, 1]/w
+      return neuron_store.is_alive & in_front & (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+
+    with self.__lock:
+      neuron_store = self.__neuron_store
+      neurons = [neuron_store.get_neuron(i) for i in np.flatnonzero(is_inside(neuron_store))]
+      neurons = [neuron for neuron in neurons if neuron.visual_representation.is_visible()]
+
+      connection_store = self.__connection_store
+      is_neuron_inside = is_inside(connection_store.neuron_store)
+      is_connection_inside = connection_store.is_alive & connection_store.is_shown & \
+        is_neuron_inside[connection_store.src_ids] & is_neuron_inside[connection_store.tar_ids]
+      neural_connections = [connection_store.get_neural_connection(i) for i in np.flatnonzero(is_connection_inside)]
+      return (neurons, neural_connections)
+
+
+  def get_neighbours(self, neurons, num_hops = 1, direction = "both"):
+    """Returns a tuple (neurons, neural connections) with the neurons which are at most 'num_hops' connections
+    away from 'neurons' and the connections which lead to them. The connections are followed from source to
+    target ('direction' is "out"), from target to source ("in") or both ways ("both"). The neurons in 'neurons'
+    are not part of the result. Uses the adjacency indices of the connection store, so this does not loop
+    over all connections."""
+    if direction not in ("in", "out", "both"):
+      raise ValueError("the direction has to be 'in', 'out' or 'both'")
+
+    with self.__lock:
+      connection_store = self.__connection_store
+      neuron_store = connection_store.neuron_store
+      neuron_ids = np.array([neuron.id for neuron in neurons if neuron.store is neuron_store], dtype = np.int64)
+      is_reached = np.zeros(len(neuron_store), dtype = bool)
+      is_reached[neuron_ids] = True
+      is_start_neuron = is_reached.copy()
+
+      # Breadth-first search, one hop (i.e., all neurons of the current front) at a time
+      connection_ids = list()
+      front = neuron_ids
+      for hop in range(num_hops):
+        next_front = list()
+        if direction in ("out", "both"):
+          ids = connection_store.get_outgoing_connection_ids(front)
+          connection_ids.append(ids)
+          next_front.append(connection_store.tar_ids[ids])
+        if direction in ("in", "both"):
+          ids = connection_store.get_incoming_connection_ids(front)
+          connection_ids.append(ids)
+          next_front.append(connection_store.src_ids[ids])
+        front = np.unique(np.concatenate(next_front))
+        front = front[~is_reached[front] & neuron_store.is_alive[front]]
+        if not front.size:
+          break
+        is_reached[front] = True
+
+      # Skip the connections to deleted neurons
+      connection_ids = np.unique(np.concatenate(connection_ids)) if connection_ids else np.zeros(0, dtype = np.int64)
+      connection_ids = connection_ids[neuron_store.is_alive[connection_store.src_ids[connection_ids]] & neuron_store.is_alive[connection_store.tar_ids[connection_ids]]]
+
+      neighbours = [neuron_store.get_neuron(i) for i in np.flatnonzero(is_reached & ~is_start_neuron)]
+      neural_connections = [connection_store.get_neural_connection(i) for i in connection_ids]
+      return (neighbours, neural_connections)
+
+
+  def set_neural_connection_weight_threshold(self, threshold):
+    """Shows the neural connections whose absolute weight is at least 'threshold' and hides all others. The
+    observers of the data container get notified if the visibility of some connection changed. This is a
+    single pass over the weights plus one rebuild of the connection geometry before the next frame (see
+    VisNeuralConnections), no matter how many connections change their visibility."""
+    with self.__lock:
+      self.__connection_weight_threshold = threshold
+      if self.__apply_neural_connection_weight_threshold():
+        self.__data_container.update_visibility()
+
+
+  def get_neural_connection_weight_threshold(self):
+    return self.__connection_weight_threshold
+
+
+  def get_max_abs_neural_connection_weight(self):
+    """Returns the maximum absolute weight of all neural connections or 0 if there are no connections."""
+    with self.__lock:
+      store = self.__connection_store
+      abs_weights = np.abs(store.weights[store.is_alive])
+      return float(abs_weights.max()) if abs_weights.size else 0.0
+
+
+  def __apply_neural_connection_weight_threshold(self):
+    """Updates the visibility of the neural connections according to the current weight threshold. Returns
+    True if the visibility of at least one connection changed and False otherwise. The 'is_shown' column of
+    the store is the actual visibility (also of the connections which the user has shown or hidden by hand)."""
+    store = self.__connection_store
+    is_shown = store.is_shown
+    # A single pass over the weights tells which connections have to be shown (none in the aggregated view)
+    if self.__region_connectivity_mode:
+      show = np.zeros(is_shown.shape, dtype = bool)
+    else:
+      show = store.is_alive & (np.abs(store.weights) >= self.__connection_weight_threshold)
+    if np.array_equal(show, is_shown):
+      return False
+    store.set_shown(slice(None, len(store)), show)
+    return True
+
+
+  def set_region_connectivity_mode(self, mode):
+    """Switches between showing the neural connections ('mode' is None) and showing the region-aggregated
+    connectivity, in which all connections from the neurons of one brain region to the neurons of another
+    one are collapsed into a single bundle. The bundle weight is the sum ('mode' is "sum") or the mean ('mode'
+    is "mean") of the connection weights. Neurons without a brain region are ignored."""
+    if mode not in (None, "sum", "mean"):
+      raise ValueError("the region connectivity mode has to be None, 'sum' or 'mean'")
+
+    with self.__lock:
+      self.__region_connectivity_mode = mode
+
+      # Hide or show the neural connections
+      self.__apply_neural_connection_weight_threshold()
+
+      if not mode:
+        if self.__region_connectivity:
+          self.__region_connectivity.visual_representation.visibility_off()
+        self.__data_container.update_visibility()
+        return
+
+      if self.__region_connectivity:
+        self.__update_region_connectivity()
+        self.__data_container.update_visibility()
+      else: # create the data item showing the bundles and add it to the container
+        self.__region_connectivity = RegionConnectivity("region connectivity", VisRegionConnectivity("region connectivity"))
+        self.__update_region_connectivity()
+        self.__data_container.add_data([self.__region_connectivity])
+
+
+  def get_region_connectivity_mode(self):
+    return self.__region_connectivity_mode
+
+
+  def __update_region_connectivity(self):
+    """Updates the bundles of the region-aggregated connectivity (if they are shown). Returns True if it did
+    something and False otherwise."""
+    if not self.__region_connectivity:
+      return False
+    vis_rep = self.__region_connectivity.visual_representation
+    if not self.__region_connectivity_mode:
+      vis_rep.visibility_off()
+      return False
+
+    brain_regions, weight_sums, counts = self.__get_region_connectivity_matrices()
+    # Collect the bundles between different brain regions (connections within a single region are not shown)
+    src_ids, tar_ids = np.nonzero(counts)
+    between_regions = src_ids != tar_ids
+    src_ids, tar_ids = src_ids[between_regions], tar_ids[between_regions]
+    weights = weight_sums[src_ids, tar_ids]
+    if self.__region_connectivity_mode == "mean":
+      weights = weights / counts[src_ids, tar_ids]
+    # Each bundle connects the centers of two brain regions
+    centers = np.array([self.__get_brain_region_center(br) for br in brain_regions]).reshape(-1, 3)
+    vis_rep.set_bundles(centers[src_ids], centers[tar_ids], weights)
+    vis_rep.visibility_on()
+    return True
+
+
+  def __get_region_connectivity_matrices(self):
+    """Returns a tuple (brain regions, weight sums, connection counts). The (i, j)-th entry of the weight sum
+    (count) matrix is the sum of the weights (the number) of the connections from the neurons in the i-th to
+    the neurons in the j-th brain region. This is the sparse product P^T*W*P of the neuron-to-region
+    membership matrix P and the connectivity matrix W, accumulated directly from the connection list. The
+    result is cached until the connections or brain regions change."""
+    if self.__region_connectivity_matrices is not None:
+      return self.__region_connectivity_matrices
+
+    brain_regions = list(self.__name_to_brain_region.values())
+    brain_region_ids = {brain_region.name: i for i, brain_region in enumerate(brain_regions)}
+    connection_store = self.__connection_store
+    neuron_store = connection_store.neuron_store
+    # Map the brain region table of the neuron store to the loaded brain regions (the extra -1 at the end is for
+    # the neurons without brain region, whose id is -1)
+    store_to_region_id = np.array([brain_region_ids.get(name, -1) for name in neuron_store.brain_region_names] + [-1], dtype = int)
+    # The row of P for each neuron (-1 for deleted neurons and the ones which are not in a loaded brain region)
+    neuron_to_region_id = np.where(neuron_store.is_alive, store_to_region_id[neuron_store.brain_region_ids], -1)
+
+    src_ids = neuron_to_region_id[connection_store.src_ids]
+    tar_ids = neuron_to_region_id[connection_store.tar_ids]
+    is_valid = connection_store.is_alive & (src_ids >= 0) & (tar_ids >= 0)
+    src_ids, tar_ids, weights = src_ids[is_valid], tar_ids[is_valid], connection_store.weights[is_valid]
+
+    # Accumulate the (region, region) entries
+    num_regions = len(brain_regions)
+    weight_sums = np.zeros((num_regions, num_regions))
+    counts = np.zeros((num_regions, num_regions), dtype = int)
+    np.add.at(weight_sums, (src_ids, tar_ids), weights)
+    np.add.at(counts, (src_ids, tar_ids), 1)
+
+    self.__region_connectivity_matrices = (brain_regions, weight_sums, counts)
+    return self.__region_connectivity_matrices
+
+
+  def __get_brain_region_center(self, brain_region):
+    """Returns the centroid of the mesh points of the brain region. It is taken from the (cached) MeshGeometry,
+    so it is computed once per mesh and not each time the bundles are updated."""
+    try:
+      return self.__get_mesh_geometry(brain_region, axis = 0).central_target
+    except ValueError: # the mesh has no triangles => no MeshGeometry
+      return self.__compute_brain_region_center(brain_region)
 
 
-  def __create_neural_connection(self, name, src_neuron_name, tar_neuron_name, src_pos, tar_pos, weight):
-    vis_rep = VisNeuralConnection(name, src_pos, tar_pos, src_neuron_name == tar_neuron_name)
-    return NeuralConnection(name, src_neuron_name, tar_neuron_name, weight, vis_rep)
+  def __compute_brain_region_center(self, brain_region):
+    vtk_points = brain_region.visual_representation.vtk_points
+    if not vtk_points or vtk_points.GetNumberOfPoints() <= 0:
+      return np.zeros(3)
+    return numpy_support.vtk_to_numpy(vtk_points.GetData()).mean(axis = 0)
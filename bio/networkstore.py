@@ -0,0 +1,390 @@
+import sys
+import numpy as np
+from core.arrayutils import concatenate_ranges
+from bio.neuron import Neuron
+from bio.neuralconnection import NeuralConnection
+
+def _grow(array, capacity):
+  """Returns a copy of 'array' whose first axis has 'capacity' entries (the new entries are zero)."""
+  new_array = np.zeros((capacity,) + array.shape[1:], dtype = array.dtype)
+  new_array[:array.shape[0]] = array
+  return new_array
+
+
+#============================================================================================================
+# NeuronStore ===============================================================================================
+#============================================================================================================
+class NeuronStore:
+  """Keeps the neurons column by column: the positions, the thresholds, the brain regions and the names
+  (interned strings) are NumPy arrays. A neuron is a row of this table (the row is the id of the neuron) and a
+  Neuron object is a handle which knows the store and the row only. The handles are created on demand, so a
+  neuron costs its entries in the arrays and in the (name, row) dictionary only. All neurons of a store share one visual
+  representation (a VisNeurons object, see set_visual_representation()). The arrays grow by doubling their
+  capacity. A deleted neuron stays in the table (such that the rows do not change) but is marked as dead."""
+  def __init__(self):
+    self.__size = 0
+    self.__positions = np.zeros((0, 3))
+    self.__thresholds = np.zeros(0)
+    # The row in self.__brain_region_names of the brain region of each neuron (-1 if unknown)
+    self.__brain_region_ids = np.zeros(0, dtype = np.int32)
+    self.__is_alive = np.zeros(0, dtype = bool)
+    self.__names = np.zeros(0, dtype = object)
+    # The visual representation of all neurons
+    self.__visual_representation = None
+    # Increases each time a neuron is added or removed or gets a new threshold
+    self.__version = 0
+    # The (name, row) dictionary of the living neurons
+    self.__name_to_row = dict()
+    # The table of brain region names (each name is there once) and the (name, position in table) dictionary
+    self.__brain_region_names = list()
+    self.__brain_region_name_to_id = dict()
+
+
+  def __len__(self):
+    """The number of rows (including the dead neurons)."""
+    return self.__size
+
+
+  def add(self, name, position, threshold, brain_region_name = None):
+    """Appends a new row and returns the Neuron for it."""
+    self.__reserve(self.__size + 1)
+    row = self.__size
+    self.__positions[row] = position
+    self.__thresholds[row] = threshold
+    self.__brain_region_ids[row] = self.__get_brain_region_id(brain_region_name)
+    self.__is_alive[row] = True
+    name = sys.intern(name)
+    self.__names[row] = name
+    self.__name_to_row[name] = row
+    self.__size += 1
+    self.__version += 1
+    return Neuron(self, row)
+
+
+  def remove(self, neuron):
+    """Marks 'neuron' as dead. Returns True if it was a living neuron of this store and False otherwise."""
+    if neuron.store is not self or not self.__is_alive[neuron.id]:
+      return False
+    self.__is_alive[neuron.id] = False
+    self.__version += 1
+    del self.__name_to_row[self.__names[neuron.id]]
+    return True
+
+
+  def find(self, name):
+    """Returns the living neuron with the provided name or None if there is no such neuron."""
+    row = self.__name_to_row.get(name)
+    return None if row is None else Neuron(self, row)
+
+
+  def get_neurons(self):
+    """Returns the list of living neurons."""
+    return [Neuron(self, row) for row in np.flatnonzero(self.is_alive).tolist()]
+
+
+  def get_neuron(self, row):
+    return Neuron(self, int(row))
+
+
+  def get_name(self, row):
+    return self.__names[row]
+
+
+  def get_position(self, row):
+    return tuple(self.__positions[row].tolist())
+
+
+  def get_threshold(self, row):
+    return float(self.__thresholds[row])
+
+
+  def set_threshold(self, row, threshold):
+    self.__thresholds[row] = threshold
+    self.__version += 1
+
+
+  def get_brain_region_name(self, row):
+    brain_region_id = self.__brain_region_ids[row]
+    return None if brain_region_id < 0 else self.__brain_region_names[brain_region_id]
+
+
+  def set_visual_representation(self, visual_representation):
+    """Sets the object which draws all neurons of this store (see VisNeurons)."""
+    self.__visual_representation = visual_representation
+
+
+  def get_visual_representation(self, row):
+    """Returns the visual representation of the neuron in 'row' or None if the store has none."""
+    if self.__visual_representation is None:
+      return None
+    return self.__visual_representation.get_visual_representation(row)
+
+
+  @property
+  def version(self):
+    return self.__version
+
+
+  @property
+  def positions(self):
+    """An (n, 3) array view of the neuron positions (one row per neuron)."""
+    return self.__positions[:self.__size]
+
+
+  @property
+  def thresholds(self):
+    return self.__thresholds[:self.__size]
+
+
+  @property
+  def brain_region_ids(self):
+    """The position of the brain region of each neuron in 'brain_region_names' (-1 for neurons without a brain region)."""
+    return self.__brain_region_ids[:self.__size]
+
+
+  @property
+  def brain_region_names(self):
+    return list(self.__brain_region_names)
+
+
+  @property
+  def is_alive(self):
+    return self.__is_alive[:self.__size]
+
+
+  def __get_brain_region_id(self, brain_region_name):
+    if brain_region_name is None:
+      return -1
+    brain_region_id = self.__brain_region_name_to_id.get(brain_region_name)
+    if brain_region_id is None:
+      brain_region_id = len(self.__brain_region_names)
+      self.__brain_region_names.append(sys.intern(brain_region_name))
+      self.__brain_region_name_to_id[brain_region_name] = brain_region_id
+    return brain_region_id
+
+
+  def __reserve(self, capacity):
+    if capacity <= self.__positions.shape[0]:
+      return
+    capacity = max(capacity, 2*self.__positions.shape[0], 16)
+    self.__positions = _grow(self.__positions, capacity)
+    self.__thresholds = _grow(self.__thresholds, capacity)
+    self.__brain_region_ids = _grow(self.__brain_region_ids, capacity)
+    self.__is_alive = _grow(self.__is_alive, capacity)
+    self.__names = _grow(self.__names, capacity)
+
+
+#============================================================================================================
+# ConnectionStore ===========================================================================================
+#============================================================================================================
+class ConnectionStore:
+  """Keeps the neural connections column by column (like NeuronStore does with the neurons): the ids of the
+  source and target neurons (rows of a NeuronStore) and the weights are NumPy arrays. A connection is
+  identified by its row or by the pair (source id, target id), i.e., there is at most one connection per
+  pair. The names are not saved, they are composed of the neuron names on demand (see get_name()). A
+  NeuralConnection object is a handle which knows the store and the row only (created on demand). There is also an 'is_shown'
+  column which tells whether the connection is shown (see set_shown()). All connections of a store share one
+  visual representation (a VisNeuralConnections object, see set_visual_representation()) which draws the
+  shown ones and checks 'version' to find out whether something changed.
+
+  The connections from (to) a neuron are found with a CSR (CSC) index, i.e., the connection ids sorted by
+  source (target) neuron id and the position in this order where the connections of each neuron start. The
+  indices are built on demand after connections have been added. Deleting a connection does not change
+  them, the queries skip the dead connections."""
+  def __init__(self, neuron_store):
+    self.__neuron_store = neuron_store
+    self.__size = 0
+    self.__src_ids = np.zeros(0, dtype = np.int32)
+    self.__tar_ids = np.zeros(0, dtype = np.int32)
+    self.__weights = np.zeros(0)
+    self.__is_alive = np.zeros(0, dtype = bool)
+    self.__is_shown = np.zeros(0, dtype = bool)
+    # The visual representation of all connections
+    self.__visual_representation = None
+    # Increases each time a connection is added, removed, shown or hidden
+    self.__version = 0
+    # The (key, row) dictionary of the living connections (see __get_key())
+    self.__key_to_row = dict()
+    # The CSR and CSC indices, each is a tuple (start positions, connection ids), see __build_adjacency_index()
+    self.__csr = None
+    self.__csc = None
+
+
+  def __len__(self):
+    """The number of rows (including the dead connections)."""
+    return self.__size
+
+
+  @property
+  def neuron_store(self):
+    """The store of the neurons which are connected by the connections in this store."""
+    return self.__neuron_store
+
+
+  def add(self, src_neuron, tar_neuron, weight):
+    """Appends a new (shown) row and returns the NeuralConnection for it. 'src_neuron' and 'tar_neuron' have to be
+    neurons of 'neuron_store'. Raises ValueError if they are connected already."""
+    key = ConnectionStore.__get_key(src_neuron.id, tar_neuron.id)
+    if key in self.__key_to_row:
+      raise ValueError("the neurons '" + src_neuron.name + "' and '" + tar_neuron.name + "' are connected already")
+    self.__reserve(self.__size + 1)
+    row = self.__size
+    self.__src_ids[row] = src_neuron.id
+    self.__tar_ids[row] = tar_neuron.id
+    self.__is_alive[row] = True
+    self.__is_shown[row] = True
+    self.__key_to_row[key] = row
+    self.__size += 1
+    self.__version += 1
+    self.__csr = self.__csc = None
+    self.__weights[row] = weight
+    return NeuralConnection(self, row)
+
+
+  def remove(self, neural_connection):
+    """Marks 'neural_connection' as dead. Returns True if it was a living connection of this store and False
+    otherwise."""
+    row = neural_connection.id
+    if neural_connection.store is not self or not self.__is_alive[row]:
+      return False
+    self.__is_alive[row] = False
+    self.__is_shown[row] = False
+    self.__version += 1
+    del self.__key_to_row[ConnectionStore.__get_key(self.__src_ids[row], self.__tar_ids[row])]
+    return True
+
+
+  def find(self, src_id, tar_id):
+    """Returns the living connection from the neuron with id 'src_id' to the one with id 'tar_id' or None if
+    there is no such connection."""
+    row = self.__key_to_row.get(ConnectionStore.__get_key(src_id, tar_id))
+    return None if row is None else NeuralConnection(self, row)
+
+
+  def get_neural_connections(self):
+    """Returns the list of living connections."""
+    return [NeuralConnection(self, row) for row in np.flatnonzero(self.is_alive).tolist()]
+
+
+  def get_neural_connection(self, row):
+    return NeuralConnection(self, int(row))
+
+
+  def get_name(self, row):
+    return self.get_src_neuron_name(row) + " -> " + self.get_tar_neuron_name(row)
+
+
+  def get_src_neuron_name(self, row):
+    return self.__neuron_store.get_name(self.__src_ids[row])
+
+
+  def get_tar_neuron_name(self, row):
+    return self.__neuron_store.get_name(self.__tar_ids[row])
+
+
+  def get_weight(self, row):
+    return float(self.__weights[row])
+
+
+  def set_weight(self, row, weight):
+    self.__weights[row] = weight
+
+
+  def set_shown(self, rows, values):
+    """Shows or hides the connection(s) in 'rows' (a row, an array of rows or a slice). 'values' is a bool or a
+    bool array with one entry per row."""
+    self.__is_shown[rows] = values
+    self.__version += 1
+
+
+  def set_visual_representation(self, visual_representation):
+    """Sets the object which draws all connections of this store (see VisNeuralConnections)."""
+    self.__visual_representation = visual_representation
+
+
+  def get_visual_representation(self, row):
+    """Returns the visual representation of the connection in 'row' or None if the store has none."""
+    if self.__visual_representation is None:
+      return None
+    return self.__visual_representation.get_visual_representation(row)
+
+
+  @property
+  def version(self):
+    return self.__version
+
+
+  @property
+  def src_ids(self):
+    """The rows (in 'neuron_store') of the source neurons."""
+    return self.__src_ids[:self.__size]
+
+
+  @property
+  def tar_ids(self):
+    """The rows (in 'neuron_store') of the target neurons."""
+    return self.__tar_ids[:self.__size]
+
+
+  @property
+  def weights(self):
+    return self.__weights[:self.__size]
+
+
+  @property
+  def is_alive(self):
+    return self.__is_alive[:self.__size]
+
+
+  @property
+  def is_shown(self):
+    """Change it with set_shown() only."""
+    return self.__is_shown[:self.__size]
+
+
+  def get_outgoing_connection_ids(self, neuron_ids):
+    """Returns the ids of the living connections which start at the neurons with the provided ids (an array)."""
+    if self.__csr is None or self.__csr[0].size != len(self.__neuron_store) + 1:
+      self.__csr = self.__build_adjacency_index(self.src_ids)
+    return self.__get_living_connection_ids(self.__csr, neuron_ids)
+
+
+  def get_incoming_connection_ids(self, neuron_ids):
+    """Returns the ids of the living connections which end at the neurons with the provided ids (an array)."""
+    if self.__csc is None or self.__csc[0].size != len(self.__neuron_store) + 1:
+      self.__csc = self.__build_adjacency_index(self.tar_ids)
+    return self.__get_living_connection_ids(self.__csc, neuron_ids)
+
+
+  def __build_adjacency_index(self, neuron_ids):
+    """Sorts the connections by 'neuron_ids' (the source or the target neuron id of each connection). Returns a
+    tuple (start positions, connection ids) such that the connections of the i-th neuron are
+    connection_ids[start_positions[i]:start_positions[i+1]]."""
+    num_neurons = len(self.__neuron_store)
+    start_positions = np.zeros(num_neurons + 1, dtype = np.int64)
+    np.cumsum(np.bincount(neuron_ids, minlength = num_neurons), out = start_positions[1:])
+    return (start_positions, np.argsort(neuron_ids, kind = "stable"))
+
+
+  def __get_living_connection_ids(self, adjacency_index, neuron_ids):
+    start_positions, connection_ids = adjacency_index
+    neuron_ids = np.asarray(neuron_ids, dtype = np.int64)
+    ids = connection_ids[concatenate_ranges(start_positions[neuron_ids], start_positions[neuron_ids + 1])]
+    return ids[self.__is_alive[ids]]
+
+
+  @staticmethod
+  def __get_key(src_id, tar_id):
+    """Packs the neuron ids into a single int, which is a cheaper dictionary key than a tuple."""
+    return (int(src_id) << 32) | int(tar_id)
+
+
+  def __reserve(self, capacity):
+    if capacity <= self.__weights.shape[0]:
+      return
+    capacity = max(capacity, 2*self.__weights.shape[0], 16)
+    self.__src_ids = _grow(self.__src_ids, capacity)
+    self.__tar_ids = _grow(self.__tar_ids, capacity)
+    self.__weights = _grow(self.__weights, capacity)
+    self.__is_alive = _grow(self.__is_alive, capacity)
+    self.__is_shown = _grow(self.__is_shown, capacity)
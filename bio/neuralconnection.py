@@ -1,42 +1,85 @@
 class NeuralConnection:
-  def __init__(self, name, src_neuron_name, tar_neuron_name, weight, visual_representation):
-    self.__name = name
-    self.__src_neuron_name = src_neuron_name
-    self.__tar_neuron_name = tar_neuron_name
-    self.__weight = weight
-    self.__vis_rep = visual_representation
-    # This is just to update the visual representation
-    self.set_weight(weight)
+  """A lightweight handle to a neural connection. The data of the connection is in a row of a ConnectionStore
+  (see bio/networkstore.py), this guy knows only the store and the row. Create neural connections with
+  ConnectionStore.add()."""
+  __slots__ = ("__store", "__row")
+
+  def __init__(self, store, row):
+    self.__store = store
+    self.__row = row
+
+
+  def __eq__(self, other):
+    # The handles are created on demand, so two of them are equal if they refer to the same row
+    return isinstance(other, NeuralConnection) and self.__store is other.__store and self.__row == other.__row
+
+
+  def __hash__(self):
+    return hash((id(self.__store), self.__row))
 
 
   def set_weight(self, weight):
-    self.__weight = weight
-    try:
-      self.__vis_rep.on_weight_changed(self)
-    except AttributeError:
-      pass
+    self.__store.set_weight(self.__row, weight)
+
+
+  def set_visibility(self, value):
+    """Shows (value = True) or hides (value = False) this connection. The store keeps track of which
+    connections are shown and its visual representation draws them (see VisNeuralConnections)."""
+    self.__store.set_shown(self.__row, bool(value))
+
+
+  @property
+  def store(self):
+    return self.__store
+
+
+  @property
+  def id(self):
+    """The integer id of this connection, i.e., its row in the store."""
+    return self.__row
 
 
   @property
   def name(self):
-    return self.__name
+    """The name is not saved anywhere, it is composed of the neuron names each time it is needed."""
+    return self.__store.get_name(self.__row)
+
+
+  @property
+  def src_id(self):
+    return int(self.__store.src_ids[self.__row])
+
+
+  @property
+  def tar_id(self):
+    return int(self.__store.tar_ids[self.__row])
+
+
+  @property
+  def src_neuron(self):
+    return self.__store.neuron_store.get_neuron(self.__store.src_ids[self.__row])
+
+
+  @property
+  def tar_neuron(self):
+    return self.__store.neuron_store.get_neuron(self.__store.tar_ids[self.__row])
 
 
   @property
   def src_neuron_name(self):
-    return self.__src_neuron_name
+    return self.__store.get_src_neuron_name(self.__row)
 
 
   @property
   def tar_neuron_name(self):
-    return self.__tar_neuron_name
+    return self.__store.get_tar_neuron_name(self.__row)
 
 
   @property
   def weight(self):
-    return self.__weight
+    return self.__store.get_weight(self.__row)
 
 
   @property
   def visual_representation(self):
-    return self.__vis_rep
+    return self.__store.get_visual_representation(self.__row)
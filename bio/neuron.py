@@ -1,53 +1,62 @@
 class Neuron:
-  def __init__(self, name, x, y, z, threshold, visual_representation):
-    self.__name = name
-    self.__index = -1
-    self.__pos = (x, y, z)
-    self.__threshold = threshold
-    self.__vis_rep = visual_representation
-    # This is just to update the visual representation
-    self.set_threshold(threshold)
+  """A lightweight handle to a neuron. The data of the neuron is in a row of a NeuronStore (see
+  bio/networkstore.py), this guy knows only the store and the row. Create neurons with NeuronStore.add()."""
+  __slots__ = ("__store", "__row")
 
+  def __init__(self, store, row):
+    self.__store = store
+    self.__row = row
 
-  def set_name(self, name):
-    self.__name = name
 
+  def __eq__(self, other):
+    # The handles are created on demand, so two of them are equal if they refer to the same row
+    return isinstance(other, Neuron) and self.__store is other.__store and self.__row == other.__row
 
-  def set_index(self, idx):
-    self.__index = idx
+
+  def __hash__(self):
+    return hash((id(self.__store), self.__row))
 
 
   def set_threshold(self, threshold):
-    self.__threshold = threshold
-    try:
-      self.__vis_rep.on_threshold_changed(self)
-    except AttributeError:
-      pass
+    self.__store.set_threshold(self.__row, threshold)
+
+
+  @property
+  def store(self):
+    return self.__store
 
 
   @property
   def name(self):
-    return self.__name
+    return self.__store.get_name(self.__row)
 
 
   @property
-  def index(self):
-    return self.__index
+  def id(self):
+    """The integer id of this neuron, i.e., its row in the store. It does not change as long as the neuron
+    lives."""
+    return self.__row
 
 
   @property
   def position(self):
-    return self.__pos
+    return self.__store.get_position(self.__row)
 
   @property
   def p(self):
-    return self.__pos
+    return self.__store.get_position(self.__row)
 
   @property
   def threshold(self):
-    return self.__threshold
+    return self.__store.get_threshold(self.__row)
+
+
+  @property
+  def brain_region_name(self):
+    """The name of the brain region the neuron was generated in (None if unknown)."""
+    return self.__store.get_brain_region_name(self.__row)
 
 
   @property
   def visual_representation(self):
-    return self.__vis_rep
+    return self.__store.get_visual_representation(self.__row)
@@ -0,0 +1,16 @@
+class RegionConnectivity:
+  """The connectivity between brain regions. Its visual representation shows one bundle per pair of brain
+  regions whose neurons are connected. The bundles are computed by the Brain."""
+  def __init__(self, name, visual_representation):
+    self.__name = name
+    self.__vis_rep = visual_representation
+
+
+  @property
+  def name(self):
+    return self.__name
+
+
+  @property
+  def visual_representation(self):
+    return self.__vis_rep
@@ -0,0 +1,137 @@
+import numpy as np
+from core.arrayutils import concatenate_ranges
+
+class SpatialIndex:
+  """A uniform grid over the neuron positions of a NeuronStore. The neuron ids are sorted by (linearized) grid
+  cell, so the neurons in a cell are a range of the sorted ids which is found with a binary search. The cell
+  size is chosen such that a cell contains a few neurons on average.
+
+  Neurons which are added to the store after the grid was built are kept in a list of pending ids and are
+  checked one by one (with NumPy) by the queries. Once there are too many of them, the grid is rebuilt. Dead
+  neurons are never returned."""
+  # The average number of neurons per cell
+  __neurons_per_cell = 8
+  # The grid is rebuilt if the pending neurons are more than this fraction of the neurons in the grid (or
+  # more than the minimum below)
+  __max_pending_fraction = 0.1
+  __min_max_pending = 1024
+
+  def __init__(self, neuron_store):
+    self.__neuron_store = neuron_store
+    # The rows of the store we know about (the grid and the pending list contain the ids [0, num_ids))
+    self.__num_ids = 0
+    self.__pending_ids = np.zeros(0, dtype = np.int64)
+    # The grid: its origin, cell size, number of cells along each axis and the ids sorted by cell key
+    self.__origin = np.zeros(3)
+    self.__cell_size = 1.0
+    self.__num_cells = np.ones(3, dtype = np.int64)
+    self.__sorted_keys = np.zeros(0, dtype = np.int64)
+    self.__sorted_ids = np.zeros(0, dtype = np.int64)
+
+
+  def get_ids_in_box(self, min_corner, max_corner):
+    """Returns the ids of the living neurons inside the axis-aligned box with the provided corners."""
+    min_corner, max_corner = np.asarray(min_corner, dtype = float), np.asarray(max_corner, dtype = float)
+    ids = self.__get_candidate_ids(min_corner, max_corner)
+    positions = self.__neuron_store.positions[ids]
+    return ids[np.all((positions >= min_corner) & (positions <= max_corner), axis = 1)]
+
+
+  def get_ids_in_sphere(self, center, radius):
+    """Returns the ids of the living neurons whose distance to 'center' is at most 'radius'."""
+    center = np.asarray(center, dtype = float)
+    ids = self.__get_candidate_ids(center - radius, center + radius)
+    squared_distances = np.sum((self.__neuron_store.positions[ids] - center)**2, axis = 1)
+    return ids[squared_distances <= radius*radius]
+
+
+  def get_nearest_ids(self, point, k = 1):
+    """Returns the ids of the 'k' living neurons closest to 'point' sorted by distance (fewer if there are less
+    than 'k' living neurons). Searches in a growing sphere around 'point' until it contains 'k' neurons."""
+    point = np.asarray(point, dtype = float)
+    self.__update()
+    num_living = int(np.count_nonzero(self.__neuron_store.is_alive))
+    k = min(k, num_living)
+    if k <= 0:
+      return np.zeros(0, dtype = np.int64)
+
+    # The sphere which contains the whole grid (and the pending neurons) contains all neurons
+    positions = self.__neuron_store.positions
+    max_radius = np.sqrt(np.max(np.sum((positions - point)**2, axis = 1))) if self.__pending_ids.size else \
+      np.linalg.norm(np.maximum(np.abs(point - self.__origin), np.abs(point - self.__origin - self.__num_cells*self.__cell_size)))
+    radius = self.__cell_size
+    while True:
+      ids = self.get_ids_in_sphere(point, radius)
+      if ids.size >= k or radius >= max_radius:
+        break
+      radius *= 2
+    if ids.size < k: # this happens only if a pending neuron is farther away than the grid
+      ids = np.flatnonzero(self.__neuron_store.is_alive)
+
+    squared_distances = np.sum((positions[ids] - point)**2, axis = 1)
+    nearest = np.argpartition(squared_distances, k - 1)[:k]
+    return ids[nearest[np.argsort(squared_distances[nearest], kind = "stable")]]
+
+
+  def __get_candidate_ids(self, min_corner, max_corner):
+    """Returns the ids of the living neurons in the grid cells which intersect the provided box and the ids
+    of the living pending neurons."""
+    self.__update()
+    # The range of cells along each axis (clamped to the grid)
+    min_cell = np.clip(np.floor((min_corner - self.__origin)/self.__cell_size).astype(np.int64), 0, self.__num_cells - 1)
+    max_cell = np.clip(np.floor((max_corner - self.__origin)/self.__cell_size).astype(np.int64), 0, self.__num_cells - 1)
+    is_outside = np.any(max_corner < self.__origin) or np.any(min_corner > self.__origin + self.__num_cells*self.__cell_size)
+
+    if is_outside or not self.__sorted_ids.size:
+      ids = self.__pending_ids
+    elif np.prod(max_cell - min_cell + 1) > self.__sorted_ids.size:
+      # The box covers more cells than there are neurons => take all of them
+      ids = np.concatenate((self.__sorted_ids, self.__pending_ids))
+    else:
+      x, y, z = np.meshgrid(*(np.arange(min_cell[i], max_cell[i] + 1) for i in range(3)), indexing = "ij")
+      keys = self.__get_keys(np.column_stack((x.ravel(), y.ravel(), z.ravel())))
+      starts = np.searchsorted(self.__sorted_keys, keys, side = "left")
+      ends = np.searchsorted(self.__sorted_keys, keys, side = "right")
+      ids = np.concatenate((self.__sorted_ids[concatenate_ranges(starts, ends)], self.__pending_ids))
+    return ids[self.__neuron_store.is_alive[ids]]
+
+
+  def __update(self):
+    """Takes the new rows of the store into account: adds them to the pending ids or rebuilds the grid if
+    there are too many pending ids."""
+    num_ids = len(self.__neuron_store)
+    if num_ids == self.__num_ids:
+      return
+    self.__pending_ids = np.concatenate((self.__pending_ids, np.arange(self.__num_ids, num_ids)))
+    self.__num_ids = num_ids
+    max_pending = max(SpatialIndex.__min_max_pending, SpatialIndex.__max_pending_fraction*self.__sorted_ids.size)
+    if self.__pending_ids.size > max_pending or not self.__sorted_ids.size:
+      self.__build()
+
+
+  def __build(self):
+    positions = self.__neuron_store.positions[:self.__num_ids]
+    self.__pending_ids = np.zeros(0, dtype = np.int64)
+    if not positions.shape[0]:
+      return
+
+    # Choose the cell size such that there are a few neurons per cell (the grid can be flat in some direction)
+    self.__origin = positions.min(axis = 0)
+    extent = positions.max(axis = 0) - self.__origin
+    used_extent = extent[extent > 0]
+    if used_extent.size:
+      cell_volume = np.prod(used_extent)*SpatialIndex.__neurons_per_cell/positions.shape[0]
+      self.__cell_size = float(cell_volume**(1.0/used_extent.size))
+    else:
+      self.__cell_size = 1.0
+    self.__num_cells = np.floor(extent/self.__cell_size).astype(np.int64) + 1
+
+    keys = self.__get_keys(np.floor((positions - self.__origin)/self.__cell_size).astype(np.int64))
+    self.__sorted_ids = np.argsort(keys, kind = "stable")
+    self.__sorted_keys = keys[self.__sorted_ids]
+
+
+  def __get_keys(self, cells):
+    """Linearizes the (n, 3) array of cell coordinates."""
+    cells = np.minimum(cells, self.__num_cells - 1)
+    return (cells[:, 0]*self.__num_cells[1] + cells[:, 1])*self.__num_cells[2] + cells[:, 2]
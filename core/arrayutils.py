@@ -0,0 +1,8 @@
+import numpy as np
+
+def concatenate_ranges(starts, ends):
+  """Returns the concatenation of the integer ranges [starts[i], ends[i]) as an array. There is no Python loop:
+  the j-th entry of the result is the start of its range plus its offset from the beginning of its range."""
+  counts = ends - starts
+  range_begins = np.cumsum(counts) - counts
+  return np.repeat(starts - range_begins, counts) + np.arange(int(counts.sum()))
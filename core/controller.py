@@ -2,11 +2,18 @@ from core.datacontainer import DataContainer
 from bio.neuron import Neuron
 from bio.neuralconnection import NeuralConnection
 from bio.brain import Brain
+from vis.vtkbatch import VtkBatchItem
 
 class Controller:
   def __init__(self, data_container, brain):
     self.__data_container = data_container
-    self.__data_container.add_observer(self)
+    self.__data_container.subscribe(DataContainer.change_is_new_data, self.__add_data_items)
+    self.__data_container.subscribe(DataContainer.change_is_new_selection, self.__set_selection)
+    self.__data_container.subscribe(DataContainer.change_is_deleted_models, self.__delete_models)
+    for change in (DataContainer.change_is_modified_neural_connections, DataContainer.change_is_modified_neurons,
+                   DataContainer.change_is_data_visibility, DataContainer.change_is_color, DataContainer.change_is_transparency,
+                   DataContainer.change_is_slice_index, DataContainer.change_is_see_inside, DataContainer.change_is_update):
+      self.__data_container.subscribe(change, self.__on_modified_data)
     self.__brain = brain
     self.__viewer3d = None
 
@@ -14,8 +21,11 @@ class Controller:
 
     # Here we keep the models in a (vtkProp3D, model) dictionary
     self.__prop3d_to_model = dict()
-    # Here we keep the selected models in a (vtkProp3D, model) dictionary
-    self.__prop3d_to_selected_model = dict()
+    # All neurons (neural connections) of a store share one actor, here we keep the (vtkProp3D, VtkBatchModel)
+    # dictionary, the picked cell tells which neuron (connection) was picked
+    self.__prop3d_to_batch = dict()
+    # The highlighted (i.e., selected) models
+    self.__highlighted_models = set()
 
   
   @property
@@ -36,10 +46,10 @@ class Controller:
   def on_key_released(self, viewer3d, key):
     if key == "Delete":
       models_to_delete = list()
-      # Collect all models except neurons and neural connections
-      for model in self.__prop3d_to_selected_model.values():
-        if not isinstance(model, Neuron) and not isinstance(model, NeuralConnection):
-          models_to_delete.append(model)
+      # Collect all models except neurons and neural connections (without looking at the selected ones)
+      for model_type in self.__data_container.get_selected_model_types():
+        if not issubclass(model_type, (Neuron, NeuralConnection)):
+          models_to_delete.extend(self.__data_container.get_selected_models_of_type(model_type))
       # Delete the collected models
       self.__data_container.delete_models(models_to_delete)
 
@@ -57,30 +67,43 @@ class Controller:
     self.__perform_prop3d_picking = False
 
 
+  def on_area_selected(self, viewer3d, world_to_view, rectangle):
+    """The user dragged a rectangle (see VtkWidget.get_world_to_view_matrix() for the coordinates). Selects all
+    (visible) neurons and neural connections in it or adds them to the selection if ctrl. is pressed. In both
+    cases, the data container notifies its observers once."""
+    neurons, neural_connections = self.__brain.get_models_in_view_rectangle(world_to_view, rectangle)
+    models = neurons + neural_connections
+    if viewer3d.is_ctrl_key_pressed():
+      models.extend(self.__data_container.get_selected_models())
+    self.__data_container.set_selection(models)
+
+
   def __process_picked_prop3d(self, viewer3d, prop3d):
+    picked_model = self.__get_picked_model(viewer3d, prop3d)
     if viewer3d.is_ctrl_key_pressed():
       # Check if she picked the same model twice
-      twice_picked_model = self.__prop3d_to_selected_model.get(prop3d)
-      if twice_picked_model:
+      if picked_model in self.__highlighted_models:
         # Remove the already picked model from the selection
-        self.__data_container.remove_from_selection(twice_picked_model)
+        self.__data_container.remove_from_selection(picked_model)
       else:
         # Add the newly picked model or None to the selection
-        self.__data_container.add_to_selection(self.__prop3d_to_model.get(prop3d))
+        self.__data_container.add_to_selection(picked_model)
     # The user doesn't hold the ctrl. key
     else:
-      self.__data_container.set_selection(self.__prop3d_to_model.get(prop3d))
-
-
-  def observable_changed(self, change, data):
-    # Decide what to do depending on what changed
-    if change == DataContainer.change_is_new_data:
-      self.__add_data_items(data)
-    elif change == DataContainer.change_is_new_selection:
-      self.__set_selection(data)
-    elif change == DataContainer.change_is_deleted_models:
-      self.__delete_models(data)
-    elif self.__viewer3d:
+      self.__data_container.set_selection(picked_model)
+
+
+  def __get_picked_model(self, viewer3d, prop3d):
+    """Returns the model of the picked 'prop3d' or None."""
+    batch = self.__prop3d_to_batch.get(prop3d)
+    if batch:
+      return batch.get_model(viewer3d.pick_cell(prop3d))
+    return self.__prop3d_to_model.get(prop3d)
+
+
+  def __on_modified_data(self, data):
+    # Models changed their appearance (visibility, color, etc.) so the 3D view has to be updated
+    if self.__viewer3d:
       self.__viewer3d.reset_clipping_range()
 
 
@@ -92,27 +115,36 @@ class Controller:
     for data_item in data_items:
       # We need a data item with a prop3d
       try:
-        prop3d = data_item.visual_representation.prop3d
+        vis_rep = data_item.visual_representation
+        prop3d = vis_rep.prop3d
       except AttributeError:
         pass
       else:
-        self.__prop3d_to_model[prop3d] = data_item
+        if isinstance(vis_rep, VtkBatchItem):
+          self.__prop3d_to_batch[prop3d] = vis_rep.batch
+        elif prop3d: # e.g., the volume slicer has no prop3d
+          self.__prop3d_to_model[prop3d] = data_item
 
     # Add the items to the 3d viewer
     if self.__viewer3d:
       self.__viewer3d.add_models(data_items)
 
 
-  def __set_selection(self, models):
-    # First, un-highlight all models
-    for model in self.__prop3d_to_model.values():
-      model.visual_representation.highlight_off()
-
-    # Clear the selection
-    self.__prop3d_to_selected_model = dict()
+  def __set_selection(self, selection):
+    """Updates the highlighting according to the new 'selection' (see core.datacontainer.Selection). Only the
+    models which were added to or removed from the selection are touched."""
+    # Un-highlight the models which are not selected anymore
+    for model in selection.removed:
+      try:
+        vis_rep = model.visual_representation
+        prop3d = vis_rep.prop3d
+      except AttributeError:
+        continue
+      vis_rep.highlight_off()
+      self.__highlighted_models.discard(model)
 
-    # Now, highligh the ones we want to highlight
-    for model in models:
+    # Now, highligh the newly selected models
+    for model in selection.added:
       # Make sure that the current model has a visual representation with a prop3d
       try:
         vis_rep = model.visual_representation
@@ -121,13 +153,13 @@ class Controller:
         continue
 
       # Make sure we have that model
-      if prop3d not in self.__prop3d_to_model:
+      if prop3d not in self.__prop3d_to_model and prop3d not in self.__prop3d_to_batch:
         continue
 
       # Highlight the model
       vis_rep.highlight_on()
-      # Save it in the selection dictionary
-      self.__prop3d_to_selected_model[prop3d] = model
+      # Save it in the selection set
+      self.__highlighted_models.add(model)
 
     # Update the view
     if self.__viewer3d:
@@ -142,7 +174,11 @@ class Controller:
         pass
       else: # silently delete the models (no exception even if they are not in the dictionary)
         self.__prop3d_to_model.pop(prop3d, None)
-        self.__prop3d_to_selected_model.pop(prop3d, None)
+        self.__highlighted_models.discard(model)
     # Update the 3d view
     if self.__viewer3d:
       self.__viewer3d.delete_models(models)
+    # Forget the batches which are not in the scene anymore
+    for prop3d, batch in list(self.__prop3d_to_batch.items()):
+      if not batch.has_items_in_scene():
+        del self.__prop3d_to_batch[prop3d]
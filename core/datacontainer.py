@@ -1,5 +1,18 @@
+import threading
+import contextlib
 from core.observable import Observable
 
+class Selection(frozenset):
+  """This is what the observers get when the selection changes: the (read-only) set of the selected models.
+  Furthermore, it knows which models were added to and removed from the previous selection, such that
+  observers can update only what really changed."""
+  def __new__(cls, selected_models, added = (), removed = ()):
+    selection = super().__new__(cls, selected_models)
+    selection.added = frozenset(added)
+    selection.removed = frozenset(removed)
+    return selection
+
+
 class DataContainer(Observable):
   # These are the possible changes that can happen to an Observable
   change_is_new_data = 1
@@ -12,7 +25,7 @@ class DataContainer(Observable):
   change_is_slice_index = 24
   change_is_deleted_models = 25
   change_is_see_inside = 26
-  change_is_update = 26
+  change_is_update = 27
 
 
   def __init__(self):
@@ -21,6 +34,63 @@ class DataContainer(Observable):
     self.__models = set()
     # This guy keeps the selected models
     self.__selected_models = set()
+    # The models and the selected models by type: (type, dictionary with the models as keys) dictionaries. A
+    # model is in the dictionary of each of its classes (see get_models_of_type()).
+    self.__type_to_models = dict()
+    self.__type_to_selected_models = dict()
+    # The models may change in several threads. The observers get notified after the lock is released.
+    self.__lock = threading.RLock()
+    # The changes made within a batch (see batch()) are collected here and delivered at its end
+    self.__batch_depth = 0
+    self.__batched_changes = dict()
+    self.__selected_models_before_batch = set()
+
+
+  @contextlib.contextmanager
+  def batch(self):
+    """Use it as 'with data_container.batch(): ...' to merge all changes made within the block. The observers
+    are notified at the end of the (outermost) block, once per type of change, with the merged data: the
+    lists of new, deleted and modified models are concatenated and the selection notification contains the
+    final selection together with everything added to and removed from it in the block. Note that changes
+    made by other threads while the block runs end up in the batch as well."""
+    with self.__lock:
+      if self.__batch_depth == 0:
+        self.__selected_models_before_batch = set(self.__selected_models)
+      self.__batch_depth += 1
+    try:
+      yield self
+    finally:
+      with self.__lock:
+        self.__batch_depth -= 1
+        is_batch_done = self.__batch_depth == 0
+      if is_batch_done:
+        self.__notify_observers_about_batched_changes()
+
+
+  def notify_observers_about_change(self, change, data):
+    """Inherited from Observable. Notifies the observers right away or collects the change if we are in a batch."""
+    with self.__lock:
+      if self.__batch_depth > 0:
+        if change in (DataContainer.change_is_new_data, DataContainer.change_is_deleted_models,
+                      DataContainer.change_is_modified_neurons, DataContainer.change_is_modified_neural_connections):
+          self.__batched_changes.setdefault(change, list()).extend(data)
+        else: # the selection is computed at the end and the other changes have no data
+          self.__batched_changes[change] = data
+        return
+    Observable.notify_observers_about_change(self, change, data)
+
+
+  def __notify_observers_about_batched_changes(self):
+    with self.__lock:
+      changes = self.__batched_changes
+      self.__batched_changes = dict()
+      selection = Selection(self.__selected_models, self.__selected_models - self.__selected_models_before_batch,
+        self.__selected_models_before_batch - self.__selected_models)
+    # Notify the observers in the order in which the changes first happened
+    for change, data in changes.items():
+      if change == DataContainer.change_is_new_selection:
+        data = selection
+      Observable.notify_observers_about_change(self, change, data)
 
 
   def is_empty(self):
@@ -29,29 +99,84 @@ class DataContainer(Observable):
 
   def clear(self):
     """Removes everything from the container leaving it empty. The observers get notified."""
+    with self.__lock:
+      selection = Selection((), removed = self.__selected_models)
+      deleted_models = list(self.__models)
+      self.__models = set()
+      self.__selected_models = set()
+      # Keep the dictionaries (someone may have a view on them)
+      for models in self.__type_to_models.values(): models.clear()
+      for models in self.__type_to_selected_models.values(): models.clear()
     # Notify the observers about the changes
-    self.notify_observers_about_change(DataContainer.change_is_new_selection, list())
-    self.notify_observers_about_change(DataContainer.change_is_deleted_models, list(self.__models))
-    # Now, clear everything
-    self.__models = set()
-    self.__selected_models = set()
+    self.notify_observers_about_change(DataContainer.change_is_new_selection, selection)
+    self.notify_observers_about_change(DataContainer.change_is_deleted_models, deleted_models)
 
 
   def add_data(self, data_items):
-    for data_item in data_items:
-      if data_item: self.__models.add(data_item)
+    with self.__lock:
+      for data_item in data_items:
+        if data_item:
+          self.__models.add(data_item)
+          self.__add_to_type_index(self.__type_to_models, data_item)
     # Notify the observers about the new models
     self.notify_observers_about_change(DataContainer.change_is_new_data, data_items)
 
 
   def get_models(self):
     """Returns a list of all models."""
-    return list(self.__models)
+    with self.__lock:
+      return list(self.__models)
 
 
   def get_selected_models(self):
     """Returns a list of the selected models."""
-    return list(self.__selected_models)
+    with self.__lock:
+      return list(self.__selected_models)
+
+
+  def get_models_of_type(self, model_type):
+    """Returns a list of the models which are instances of 'model_type' (e.g., BrainRegion). It is a copy taken
+    while holding the lock, so it is safe to iterate over it while other threads change the container. The
+    copy costs time proportional to the number of these models only (there is no loop over the others)."""
+    with self.__lock:
+      return list(self.__type_to_models.get(model_type, ()))
+
+
+  def get_selected_models_of_type(self, model_type):
+    """Like get_models_of_type() but for the selected models."""
+    with self.__lock:
+      return list(self.__type_to_selected_models.get(model_type, ()))
+
+
+  def get_selected_model_types(self):
+    """Returns the (most derived) types of the selected models, i.e., the types T such that some selected model
+    is an instance of T and of no subclass of T."""
+    with self.__lock:
+      # Most model types have no subclasses, so any() stops at the first model
+      return [model_type for model_type, models in self.__type_to_selected_models.items()
+        if any(type(model) is model_type for model in models)]
+
+
+  def __add_to_type_index(self, type_to_models, model):
+    # The model is in the dictionary of each of its classes (except 'object')
+    for model_type in type(model).__mro__[:-1]:
+      type_to_models.setdefault(model_type, dict())[model] = None
+
+
+  def __remove_from_type_index(self, type_to_models, model):
+    for model_type in type(model).__mro__[:-1]:
+      try:
+        del type_to_models[model_type][model]
+      except KeyError:
+        pass
+
+
+  def __set_selected_type_index(self):
+    # Refill the dictionaries (and don't replace them, since someone may have a view on them)
+    for models in self.__type_to_selected_models.values():
+      models.clear()
+    for model in self.__selected_models:
+      self.__add_to_type_index(self.__type_to_selected_models, model)
 
   
   def neural_connections_changed(self, neural_connections):
@@ -89,59 +214,76 @@ class DataContainer(Observable):
 
 
   def add_to_selection(self, item):
-    if item in self.__models:
+    with self.__lock:
+      if item not in self.__models or item in self.__selected_models:
+        return
       self.__selected_models.add(item)
-      self.notify_observers_about_change(DataContainer.change_is_new_selection, self.__selected_models)
+      self.__add_to_type_index(self.__type_to_selected_models, item)
+      selection = Selection(self.__selected_models, added = (item,))
+    self.notify_observers_about_change(DataContainer.change_is_new_selection, selection)
 
 
   def remove_from_selection(self, item):
-    try:
-      self.__selected_models.remove(item)
-    except ValueError:
-      pass
-    else:
-      self.notify_observers_about_change(DataContainer.change_is_new_selection, self.__selected_models)
+    with self.__lock:
+      try:
+        self.__selected_models.remove(item)
+      except KeyError:
+        return
+      self.__remove_from_type_index(self.__type_to_selected_models, item)
+      selection = Selection(self.__selected_models, removed = (item,))
+    self.notify_observers_about_change(DataContainer.change_is_new_selection, selection)
 
 
   def set_selection(self, items):
-    self.__selected_models = set()
-    try:
-      for item in items:
-        if item in self.__models:
-          self.__selected_models.add(item)
-    except TypeError: # it seems that 'items' is not iterable, i.e., it is a single item
-      if items in self.__models:
-        self.__selected_models.add(items)
+    with self.__lock:
+      old_selected_models = self.__selected_models
+      self.__selected_models = set()
+      try:
+        for item in items:
+          if item in self.__models:
+            self.__selected_models.add(item)
+      except TypeError: # it seems that 'items' is not iterable, i.e., it is a single item
+        if items in self.__models:
+          self.__selected_models.add(items)
+      self.__set_selected_type_index()
+      selection = Selection(self.__selected_models, self.__selected_models - old_selected_models, old_selected_models - self.__selected_models)
 
     # Notify the observers about the new selection
-    self.notify_observers_about_change(DataContainer.change_is_new_selection, self.__selected_models)
+    self.notify_observers_about_change(DataContainer.change_is_new_selection, selection)
 
 
   def invert_model_selection(self):
-    # Remove the selected and add the non-selected models to the selection
-    for model in self.__models:
-      try:
-        self.__selected_models.remove(model)
-      except KeyError:
-        self.__selected_models.add(model)
+    with self.__lock:
+      old_selected_models = self.__selected_models
+      # The non-selected models become the selection
+      self.__selected_models = self.__models - old_selected_models
+      self.__set_selected_type_index()
+      selection = Selection(self.__selected_models, self.__selected_models, old_selected_models)
 
     # Notify the observers about the new selection
-    self.notify_observers_about_change(DataContainer.change_is_new_selection, self.__selected_models)
-        
+    self.notify_observers_about_change(DataContainer.change_is_new_selection, selection)
+
 
   def delete_models(self, models):
-    # Delete all selected models from the set of models
-    for model in models:
-      # Delete the model from the set of ALL models
-      try:
-        self.__models.remove(model)
-      except KeyError:
-        pass
-      # Delete the model from the selection
-      try:
-        self.__selected_models.remove(model)
-      except KeyError:
-        pass
+    removed_from_selection = list()
+    with self.__lock:
+      # Delete all selected models from the set of models
+      for model in models:
+        # Delete the model from the set of ALL models
+        try:
+          self.__models.remove(model)
+        except KeyError:
+          continue
+        self.__remove_from_type_index(self.__type_to_models, model)
+        # Delete the model from the selection
+        try:
+          self.__selected_models.remove(model)
+        except KeyError:
+          pass
+        else:
+          self.__remove_from_type_index(self.__type_to_selected_models, model)
+          removed_from_selection.append(model)
+      selection = Selection(self.__selected_models, removed = removed_from_selection)
     # Notify the observers about the changes
     self.notify_observers_about_change(DataContainer.change_is_deleted_models, models)
-    self.notify_observers_about_change(DataContainer.change_is_new_selection, self.__selected_models)
+    self.notify_observers_about_change(DataContainer.change_is_new_selection, selection)
@@ -0,0 +1,126 @@
+import re
+import bisect
+
+class NameIndex:
+  """Finds objects by their names (case-insensitive). The lower-case names are kept in a list and in a single
+  string (one name per line). If a query matches a few names only (counting the occurrences in the string is
+  done in C), the matches are found in the string and mapped back to the objects with a binary search.
+  Otherwise, it is faster to loop over the names. Adding and removing objects is cheap, the string is rebuilt
+  on the next search."""
+  # Up to this number of occurrences of the query in the joined names, we jump from match to match
+  __max_num_matches_to_jump_to = 2000
+
+  def __init__(self):
+    # The objects and their lower-case names in the order they were added (removed ones are None)
+    self.__objects = list()
+    self.__lowered_names = list()
+    # The (object, position in the lists above) dictionary
+    self.__object_to_id = dict()
+    # The names joined by "\n" and the start positions of the names in it (see __get_text())
+    self.__text = None
+    self.__name_starts = None
+
+
+  def __len__(self):
+    return len(self.__object_to_id)
+
+
+  def __contains__(self, obj):
+    return obj in self.__object_to_id
+
+
+  def add(self, obj, name):
+    if obj in self.__object_to_id:
+      self.remove(obj)
+    self.__object_to_id[obj] = len(self.__objects)
+    self.__objects.append(obj)
+    self.__lowered_names.append(name.lower().replace("\n", " "))
+    self.__text = None
+
+
+  def remove(self, obj):
+    try:
+      i = self.__object_to_id.pop(obj)
+    except KeyError:
+      return
+    self.__objects[i] = None
+    self.__lowered_names[i] = None
+    self.__text = None
+
+
+  def search(self, query):
+    """Returns the list of objects (in the order they were added) whose names match 'query':
+      're:<pattern>'   - the name contains a match of the regular expression <pattern>
+      with * or ?      - the whole name matches the glob pattern (* matches anything, ? a single character)
+      anything else    - the name contains the query
+    Returns None for an empty query (i.e., no filtering). Raises ValueError for an invalid regular expression."""
+    if not query:
+      return None
+    literal, is_match = NameIndex.__parse(query)
+    return [obj for obj, name in self.__get_candidates(literal) if is_match(name)]
+
+
+  @staticmethod
+  def get_matcher(query):
+    """Returns a function which tells whether a name matches 'query' (see search()) or None for an empty
+    query. Use it to check a few names without an index. Raises ValueError for an invalid regular expression."""
+    if not query:
+      return None
+    is_match = NameIndex.__parse(query)[1]
+    return lambda name: bool(is_match(name.lower().replace("\n", " ")))
+
+
+  @staticmethod
+  def __parse(query):
+    """Returns a tuple (literal, function). Each name which matches the (non-empty) 'query' contains the literal
+    and the function tells whether a lower-case name matches."""
+    if query[:3].lower() == "re:":
+      # Don't lower the pattern itself, it would change escapes like \S, \W or \Z
+      try:
+        regex = re.compile(query[3:], re.IGNORECASE)
+      except re.error as error:
+        raise ValueError("invalid regular expression: " + str(error))
+      return ("", regex.search)
+
+    query = query.lower()
+
+    if "*" in query or "?" in query:
+      # Translate the glob pattern to a regular expression which matches whole names
+      parts = re.split(r"([*?])", query)
+      regex = re.compile("".join(".*" if part == "*" else "." if part == "?" else re.escape(part) for part in parts) + r"\Z", re.DOTALL)
+      # Use the longest literal part of the pattern to find the candidates
+      literal = max(parts, key = len)
+      if literal in ("*", "?"):
+        literal = ""
+      return (literal, regex.match)
+
+    return (query, lambda name: query in name)
+
+
+  def __get_candidates(self, literal):
+    """Returns the (object, lower-case name) pairs whose names contain 'literal' or all pairs if it is faster
+    to check them one by one."""
+    text, name_starts = self.__get_text()
+    if literal and text.count(literal) <= NameIndex.__max_num_matches_to_jump_to:
+      ids = sorted({bisect.bisect_right(name_starts, match.start()) - 1 for match in re.finditer(re.escape(literal), text)})
+      return [(self.__objects[i], self.__lowered_names[i]) for i in ids]
+    return zip(self.__objects, self.__lowered_names)
+
+
+  def __get_text(self):
+    """Returns the joined names and their start positions. Rebuilds them (and removes the deleted objects
+    from the lists) if the index changed since the last call."""
+    if self.__text is None:
+      alive = [i for i, obj in enumerate(self.__objects) if obj is not None]
+      if len(alive) < len(self.__objects):
+        self.__objects = [self.__objects[i] for i in alive]
+        self.__lowered_names = [self.__lowered_names[i] for i in alive]
+        self.__object_to_id = {obj: i for i, obj in enumerate(self.__objects)}
+      self.__text = "\n".join(self.__lowered_names)
+      # Each name starts one character after the end of the previous one
+      self.__name_starts = list()
+      start = 0
+      for name in self.__lowered_names:
+        self.__name_starts.append(start)
+        start += len(name) + 1
+    return (self.__text, self.__name_starts)
@@ -1,33 +1,69 @@
-import inspect
-
 #======================================================================================================
 # Observable ==========================================================================================
 #======================================================================================================
 class Observable:
+  # The guy who delivers the notifications of all observables (see set_notification_dispatcher())
+  __notification_dispatcher = None
+
+  @staticmethod
+  def set_notification_dispatcher(dispatcher):
+    """'dispatcher' gets called with a function (without arguments) which notifies the observers about a change.
+    It may call the function right away or later in another thread, e.g., the GUI can make sure that all
+    observers get notified in the GUI thread even if the observables change in worker threads. If 'dispatcher'
+    is None (the default), the observers get notified right away in the thread which made the change."""
+    Observable.__notification_dispatcher = dispatcher
+
+
   def __init__(self):
-    # These will be the guys observing this objects
+    # These will be the guys observing all changes of this object (see add_observer())
     self.observers = list()
+    # The dispatch table: a (change, list of callbacks) dictionary (see subscribe())
+    self.__subscribers = dict()
 
   def add_observer(self, observer):
-    # This is the error to raise if 'observer' doesn't have the observable_changed method
-    type_error = TypeError("the observer has to implement the method observable_changed(self, change, data)")
-
-    try:
-      arg_names = inspect.getargspec(observer.observable_changed)[0]
-      if len(arg_names) != 3 or arg_names[0] != "self" or arg_names[1] != "change" or arg_names[2] != "data":
-        raise type_error
-    except:
-      raise type_error
+    """Registers 'observer' for all changes. It has to implement the method observable_changed(self, change, data).
+    Observers which are interested in a few changes only should use subscribe() instead."""
+    if not callable(getattr(observer, "observable_changed", None)):
+      raise TypeError("the observer has to implement the method observable_changed(self, change, data)")
 
     # Make sure that 'observer' is not already in the list (we add each observer only once)
-    try:
-      self.observers.index(observer)
-    except:
+    if observer not in self.observers:
       self.observers.append(observer)
 
 
+  def subscribe(self, change, callback):
+    """Registers 'callback' for a single change (one of the self.change_is_XXX members). It gets called with the
+    data of the change, i.e., callback(data), and only when this specific change happens."""
+    if not callable(callback):
+      raise TypeError("the callback for change " + str(change) + " has to be callable")
+
+    # Each callback is registered only once per change
+    callbacks = self.__subscribers.setdefault(change, list())
+    if callback not in callbacks:
+      callbacks.append(callback)
+
+
+  def unsubscribe(self, change, callback):
+    try:
+      self.__subscribers[change].remove(callback)
+    except (KeyError, ValueError):
+      pass
+
+
   def notify_observers_about_change(self, change, data):
     """The model should call this method when it changed and pass the specific change (should be one of the self.change_is_XXX members) and some data.
-    This method then calls the observable_changed method of all registered observers passing 'change' and 'data' to each one."""
+    This method then calls the observable_changed method of all registered observers and the callbacks subscribed to 'change'
+    (using the notification dispatcher, if one is set)."""
+    dispatcher = Observable.__notification_dispatcher
+    if dispatcher:
+      dispatcher(lambda: self.__deliver_notification(change, data))
+    else:
+      self.__deliver_notification(change, data)
+
+
+  def __deliver_notification(self, change, data):
     for observer in self.observers:
       observer.observable_changed(change, data)
+    # Copy the list since a callback might (un)subscribe
+    for callback in tuple(self.__subscribers.get(change, ())):
+      callback(data)
@@ -21,3 +21,31 @@ class ProgressBar(metaclass = abc.ABCMeta):
   def done(self):
     """This method is called when the loading is finished."""
     pass
+
+
+#============================================================================================================
+# SilentProgressBar =========================================================================================
+#============================================================================================================
+class SilentProgressBar(ProgressBar):
+  """A progress bar which shows nothing. Used when there is no GUI, e.g., when rendering in batch mode."""
+
+  def init(self, range_min, range_max, description = None):
+    """Inherited from parent class."""
+    pass
+
+  def set_progress(self, k):
+    """Inherited from parent class."""
+    pass
+
+  def done(self):
+    """Inherited from parent class."""
+    pass
+
+
+#============================================================================================================
+# OperationCancelled ========================================================================================
+#============================================================================================================
+class OperationCancelled(Exception):
+  """A progress bar raises this guy (in init() or set_progress()) when the user cancelled the operation whose
+  progress it shows. The operation is aborted and leaves everything as it was."""
+  pass
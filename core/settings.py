@@ -12,3 +12,32 @@ class Settings:
   # the rough distance between neurons in the same brain region. Note that the current algorithm does not
   # guarantee that the neurons will have exactly this distance.
   inter_neuron_distance = 15
+  # In the region-aggregated connectivity view, the connections between the neurons of two brain regions are
+  # collapsed into a single tube. The tube radius is proportional to the absolute aggregated weight and lies
+  # between the following two values.
+  region_bundle_min_radius = 0.5
+  region_bundle_max_radius = 6.0
+  # The arrowhead of a neural connection is only rendered if it is at least that many pixels long on the
+  # screen. Otherwise, the connection is rendered as a plain line.
+  neural_connection_arrowhead_min_pixels = 4.0
+  # The frame rate the 3D viewer tries to achieve while the user rotates, pans or zooms. If the last frame
+  # was slower, the rendering quality is reduced during the interaction (fewer depth peels for the
+  # transparent brain regions, coarse brain region meshes, no arrowheads). A full quality frame is rendered
+  # as soon as the interaction stops.
+  interactive_frame_rate = 15.0
+  interactive_max_number_of_peels = 1
+  # Brain regions with more triangles than this get a coarse version which is used for interactive rendering.
+  # The second parameter defines how coarse it is (the number of grid cells along each axis).
+  brain_region_lod_min_num_triangles = 20000
+  brain_region_lod_num_divisions = 48
+  # The neurons are placed in the brain regions with the help of a voxel grid which tells which voxels are inside
+  # a brain region. This is the number of voxels along the longest side of the bounding box of a brain region.
+  # The grid is saved next to the mesh file (with the extension .insidemask.npz) and reused.
+  brain_region_mask_resolution = 128
+  # Large amounts of neurons and neural connections are added to the scene in chunks of that size. The GUI adds
+  # one chunk per event loop tick, so it renders the scene and updates the progress bar between the chunks.
+  progressive_loading_chunk_size = 5000
+  # Volumes which are too large for the main memory are read slice by slice. That many slices are cached and
+  # that many neighbours (on each side) of the current slice are loaded in the background.
+  volume_slice_cache_size = 32
+  volume_prefetch_radius = 2
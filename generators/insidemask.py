@@ -0,0 +1,131 @@
+import os
+import numpy as np
+
+class InsideMask:
+  """A voxel grid which tells which voxels are inside a closed mesh. It is computed by casting one line parallel
+  to the z axis through each column of voxels and marking the voxels between the first and the second, the
+  third and the fourth, etc. intersection (parity fill). With the mask, testing whether a point is inside
+  and drawing random inside points costs the same no matter how many triangles the mesh has."""
+  def __init__(self, origin, voxel_size, mask):
+    """'mask' is a 3D bool array (x, y, z), the center of the voxel (i, j, k) is origin + (i, j, k)*voxel_size
+    + voxel_size/2."""
+    self.__origin = np.asarray(origin, dtype = float)
+    self.__voxel_size = float(voxel_size)
+    self.__mask = mask
+    # The (flat) ids of the inside voxels
+    self.__inside_voxel_ids = np.flatnonzero(mask)
+    # The inside voxels whose 26 neighbours are inside as well (see sample_points())
+    self.__is_interior = self.__erode(mask)
+
+
+  @staticmethod
+  def __erode(mask):
+    """Returns a bool array of the shape of 'mask' which is True for the voxels which are in 'mask' together
+    with their 26 neighbours (the voxels outside of the grid are not in the mask)."""
+    padded = np.pad(mask, 1, mode = "constant", constant_values = False)
+    nx, ny, nz = mask.shape
+    is_interior = mask.copy()
+    for dx in range(3):
+      for dy in range(3):
+        for dz in range(3):
+          is_interior &= padded[dx:dx + nx, dy:dy + ny, dz:dz + nz]
+    return is_interior
+
+
+  @staticmethod
+  def create(mesh_geometry, resolution):
+    """Voxelizes the mesh of 'mesh_geometry' (see MeshGeometry.cast_z_rays()) with 'resolution' voxels along the
+    longest side of its bounding box."""
+    b = mesh_geometry.bounding_box
+    origin = np.array([b[0], b[2], b[4]])
+    extent = np.array([b[1] - b[0], b[3] - b[2], b[5] - b[4]])
+    voxel_size = max(float(extent.max()), 1e-12)/resolution
+    dims = np.maximum(np.ceil(extent/voxel_size).astype(np.int64), 1)
+
+    # One line through the center of each voxel column
+    x, y = np.meshgrid(origin[0] + (np.arange(dims[0]) + 0.5)*voxel_size, origin[1] + (np.arange(dims[1]) + 0.5)*voxel_size, indexing = "ij")
+    ray_ids, z = mesh_geometry.cast_z_rays(np.column_stack((x.ravel(), y.ravel())))
+
+    # Pair the 1st with the 2nd hit, the 3rd with the 4th, etc. of each line (a single unpaired hit is ignored)
+    hit_ids = np.arange(ray_ids.size)
+    first_hits = np.searchsorted(ray_ids, ray_ids, side = "left")
+    is_entry = ((hit_ids - first_hits) % 2 == 0) & (hit_ids + 1 < ray_ids.size)
+    is_entry[is_entry] = ray_ids[hit_ids[is_entry] + 1] == ray_ids[is_entry]
+    entries = np.flatnonzero(is_entry)
+    rays = ray_ids[entries]
+    # The voxels whose centers are between the entry and the exit
+    starts = np.clip(np.ceil((z[entries] - origin[2])/voxel_size - 0.5).astype(np.int64), 0, dims[2])
+    ends = np.clip(np.floor((z[entries + 1] - origin[2])/voxel_size - 0.5).astype(np.int64) + 1, 0, dims[2])
+    is_valid = starts < ends
+
+    # Mark the z ranges with +1 at the start and -1 after the end, the inside voxels have a positive prefix sum
+    marks = np.zeros((dims[0]*dims[1], dims[2] + 1), dtype = np.int32)
+    np.add.at(marks, (rays[is_valid], starts[is_valid]), 1)
+    np.add.at(marks, (rays[is_valid], ends[is_valid]), -1)
+    mask = (np.cumsum(marks, axis = 1)[:, :dims[2]] > 0).reshape(dims[0], dims[1], dims[2])
+    return InsideMask(origin, voxel_size, mask)
+
+
+  @staticmethod
+  def load(file_name, bounding_box, resolution):
+    """Loads a mask saved by save(). Returns None if there is no such file, if it cannot be read or if it was
+    computed for another resolution or a mesh with another bounding box or modification time."""
+    try:
+      with np.load(file_name) as data:
+        mesh_file_name = str(data["mesh_file_name"])
+        if int(data["resolution"]) != resolution or not np.allclose(data["bounding_box"], bounding_box) or \
+           float(data["mesh_file_mtime"]) != os.path.getmtime(mesh_file_name):
+          return None
+        shape = tuple(data["shape"])
+        mask = np.unpackbits(data["mask"], count = int(np.prod(shape))).astype(bool).reshape(shape)
+        return InsideMask(data["origin"], float(data["voxel_size"]), mask)
+    except (OSError, ValueError, KeyError):
+      return None
+
+
+  def save(self, file_name, mesh_file_name, bounding_box, resolution):
+    """Saves the mask together with what load() needs to check whether it is still valid. Does nothing if the
+    file cannot be written (e.g., the mesh is in a read-only folder)."""
+    try:
+      temp_file_name = file_name + ".tmp.npz"
+      np.savez_compressed(temp_file_name, mask = np.packbits(self.__mask.ravel()), shape = np.array(self.__mask.shape),
+        origin = self.__origin, voxel_size = self.__voxel_size, bounding_box = np.asarray(bounding_box, dtype = float),
+        resolution = resolution, mesh_file_name = mesh_file_name, mesh_file_mtime = os.path.getmtime(mesh_file_name))
+      os.replace(temp_file_name, file_name)
+    except OSError:
+      pass
+
+
+  @property
+  def inside_voxel_ids(self):
+    return self.__inside_voxel_ids
+
+
+  def get_voxel_centers(self, voxel_ids):
+    """Returns the centers of the voxels with the provided (flat) ids as an (n, 3) array."""
+    ijk = np.column_stack(np.unravel_index(voxel_ids, self.__mask.shape))
+    return self.__origin + (ijk + 0.5)*self.__voxel_size
+
+
+  def sample_points(self, voxel_ids, num_points):
+    """Returns 'num_points' random points as an (n, 3) array. Each one is in a voxel drawn uniformly from
+    'voxel_ids'. The voxels at the boundary of the mask may stick out of the mesh (only their centers are
+    guaranteed to be inside), so the points in those voxels are at the centers. The other points are at a
+    random position within their voxel."""
+    voxel_ids = voxel_ids[np.random.randint(0, voxel_ids.size, num_points)]
+    points = self.get_voxel_centers(voxel_ids)
+    is_interior = self.__is_interior.ravel()[voxel_ids]
+    points[is_interior] += np.random.uniform(-0.5, 0.5, (int(np.count_nonzero(is_interior)), 3))*self.__voxel_size
+    return points
+
+
+  def contains(self, points):
+    """Returns a bool array which tells for each point (a row of the (n, 3) array 'points') whether it is in an
+    inside voxel. This is accurate up to the voxel size only: a point close to the mesh surface may be in an
+    inside voxel but outside the mesh and vice versa."""
+    points = np.asarray(points, dtype = float).reshape(-1, 3)
+    ijk = np.floor((points - self.__origin)/self.__voxel_size).astype(np.int64)
+    is_in_grid = np.all((ijk >= 0) & (ijk < self.__mask.shape), axis = 1)
+    result = np.zeros(points.shape[0], dtype = bool)
+    result[is_in_grid] = self.__mask[ijk[is_in_grid, 0], ijk[is_in_grid, 1], ijk[is_in_grid, 2]]
+    return result
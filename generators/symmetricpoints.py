@@ -2,6 +2,10 @@ import vtk
 import math
 import random
 import numpy as np
+from vtk.util import numpy_support
+from core.arrayutils import concatenate_ranges
+from core.settings import Settings
+from generators.insidemask import InsideMask
 from generators.uniformpointcloud import UniformPointCloud
 
 class OrientedPoint:
@@ -10,12 +14,21 @@ class OrientedPoint:
     self.n = n
 
 
-class SymmetricPointsGenerator:
+class MeshGeometry:
+  """The data a SymmetricPointsGenerator needs about a mesh: the bounding box, the ids of the mesh points on
+  the left and right side, the centroids of both sides, a grid for intersecting the mesh with many lines
+  parallel to the z axis at once (see cast_z_rays()) and the voxels inside the mesh (see get_inside_mask()).
+  All of this depends on the mesh only, so it can be computed once and shared by several generators as long
+  as the mesh does not change (see is_up_to_date())."""
   def __init__(self, vtk_mesh, axis):
-    """Initialize this object with the mesh in which the points are supposed to be generated. 'axis' should
-    be 0, 1 or 2 depending on whether you want to mirror the generated point along the x, y or z axis."""
+    """'vtk_mesh' is a vtkPolyData object or something with a visual representation which has one (e.g., a
+    brain region). 'axis' should be 0, 1 or 2 depending on whether the points are mirrored along the x, y
+    or z axis."""
+    # The name of the mesh file (if known) tells where to save the inside mask
+    self.__mesh_file_name = None
     if not isinstance(vtk_mesh, vtk.vtkPolyData):
       try:
+        self.__mesh_file_name = getattr(vtk_mesh.visual_representation, "file_name", None)
         vtk_mesh = vtk_mesh.visual_representation.vtk_poly_data
       except AttributeError:
         raise
@@ -23,49 +36,199 @@ class SymmetricPointsGenerator:
     if not vtk_mesh.GetPoints() or not vtk_mesh.GetPolys():
       raise ValueError("input argument 'vtk_mesh' has no points and/or triangles")
 
-    self.__vtk_mesh = vtk_mesh
+    self.vtk_mesh = vtk_mesh
+    self.axis = axis
+    # The modification time of the mesh at the time we computed everything
+    self.__mesh_mtime = vtk_mesh.GetMTime()
 
     # Compute the bounding box of the mesh
     vtk_mesh.ComputeBounds()
-    self.__bounding_box = b = vtk_mesh.GetBounds()
-    self.__bounding_box_diag = math.sqrt((b[1]-b[0])**2 + (b[3]-b[2])**2 + (b[5]-b[4])**2)
+    self.bounding_box = b = vtk_mesh.GetBounds()
+    self.bounding_box_diag = math.sqrt((b[1]-b[0])**2 + (b[3]-b[2])**2 + (b[5]-b[4])**2)
 
     # Populate the lists which contain the point ids
     self.__build_point_id_lists(axis)
 
-    self.__left_point_cloud = UniformPointCloud(self.__left_target)
-    self.__right_point_cloud = UniformPointCloud(self.__right_target)
-    self.__central_point_cloud = UniformPointCloud(self.__central_target)
+    # The triangles and the (x, y) grid which tells which triangles a z line may hit (built on demand)
+    self.__triangles = None
+    self.__ray_grid = None
+    # The voxels inside the mesh and the ids of the inside voxels on each side (computed on demand)
+    self.__inside_mask = None
+    self.__side_to_inside_voxel_ids = dict()
+
 
-    # This is the guy who does an efficient line-surface intersection
-    self.__obb_tree = vtk.vtkOBBTree()
-    self.__obb_tree.SetDataSet(vtk_mesh)
-    self.__obb_tree.BuildLocator()
+  def is_up_to_date(self, vtk_mesh, axis):
+    """Returns True if this object was computed for 'vtk_mesh' (the same object) and 'axis' and the mesh did not
+    change since then."""
+    if not isinstance(vtk_mesh, vtk.vtkPolyData):
+      vtk_mesh = vtk_mesh.visual_representation.vtk_poly_data
+    return vtk_mesh is self.vtk_mesh and axis == self.axis and vtk_mesh.GetMTime() == self.__mesh_mtime
 
 
   def __build_point_id_lists(self, axis):
-    self.__left_point_ids = list()
-    self.__left_target = np.array([0.0, 0.0, 0.0])
-    self.__right_point_ids = list()
-    self.__right_target = np.array([0.0, 0.0, 0.0])
-    self.__all_point_ids = list()
-    self.__central_target = np.array([0.0, 0.0, 0.0])
-    middle = 0.5*(self.__bounding_box[2*axis] + self.__bounding_box[2*axis + 1])
-
-    for i in range(self.__vtk_mesh.GetNumberOfPoints()):
-      p = self.__vtk_mesh.GetPoint(i)
-      self.__central_target += p
-      self.__all_point_ids.append(i)
-      if p[axis] > middle:
-        self.__left_point_ids.append(i)
-        self.__left_target += p
-      else:
-        self.__right_point_ids.append(i)
-        self.__right_target += p
-
-    if self.__left_point_ids: self.__left_target /= len(self.__left_point_ids)
-    if self.__right_point_ids: self.__right_target /= len(self.__right_point_ids)
-    self.__central_target /= self.__vtk_mesh.GetNumberOfPoints()
+    """Splits the mesh points in a left and a right half (at the middle of the bounding box along 'axis') and
+    computes the centroids of both halves and of all points. The point ids are NumPy arrays."""
+    self.points = points = numpy_support.vtk_to_numpy(self.vtk_mesh.GetPoints().GetData()).astype(float)
+    middle = 0.5*(self.bounding_box[2*axis] + self.bounding_box[2*axis + 1])
+    is_left = points[:, axis] > middle
+
+    self.all_point_ids = np.arange(points.shape[0])
+    self.left_point_ids = np.flatnonzero(is_left)
+    self.right_point_ids = np.flatnonzero(~is_left)
+
+    self.central_target = points.mean(axis = 0)
+    self.left_target = points[is_left].mean(axis = 0) if self.left_point_ids.size else np.zeros(3)
+    self.right_target = points[~is_left].mean(axis = 0) if self.right_point_ids.size else np.zeros(3)
+
+
+  def get_inside_mask(self):
+    """Returns the InsideMask of the mesh (with Settings.brain_region_mask_resolution). It is loaded from the file
+    next to the mesh file if that one is up to date. Otherwise, it is computed (and saved)."""
+    if self.__inside_mask is not None:
+      return self.__inside_mask
+
+    resolution = Settings.brain_region_mask_resolution
+    mask_file_name = self.__mesh_file_name + ".insidemask.npz" if self.__mesh_file_name else None
+    if mask_file_name:
+      self.__inside_mask = InsideMask.load(mask_file_name, self.bounding_box, resolution)
+    if self.__inside_mask is None:
+      self.__inside_mask = InsideMask.create(self, resolution)
+      if mask_file_name:
+        self.__inside_mask.save(mask_file_name, self.__mesh_file_name, self.bounding_box, resolution)
+    return self.__inside_mask
+
+
+  def get_inside_voxel_ids(self, side):
+    """Returns the ids of the inside voxels on the provided side ("l", "r" or anything else for both sides). The
+    sides are split like the mesh points (see __build_point_id_lists())."""
+    if side not in ("l", "r"):
+      side = None
+    voxel_ids = self.__side_to_inside_voxel_ids.get(side)
+    if voxel_ids is None:
+      inside_mask = self.get_inside_mask()
+      voxel_ids = inside_mask.inside_voxel_ids
+      if side:
+        middle = 0.5*(self.bounding_box[2*self.axis] + self.bounding_box[2*self.axis + 1])
+        is_left = inside_mask.get_voxel_centers(voxel_ids)[:, self.axis] > middle
+        voxel_ids = voxel_ids[is_left if side == "l" else ~is_left]
+      self.__side_to_inside_voxel_ids[side] = voxel_ids
+    return voxel_ids
+
+
+  def cast_z_rays(self, xy):
+    """Intersects the mesh with the lines parallel to the z axis through the points in 'xy' (an (n, 2) array).
+    Returns a tuple (ray ids, z) of arrays sorted by ray id and then by z: the k-th intersection point is
+    (xy[ray_ids[k]], z[k]). A line through an edge or a vertex hits several triangles at the same point, such
+    hits are reported once. All lines are handled at once: each one is tested against the triangles of its
+    grid cell only, with a vectorized barycentric test."""
+    triangles = self.__get_triangles()
+    origin, cell_size, num_cells, cell_starts, cell_triangle_ids = self.__get_ray_grid()
+    xy = np.asarray(xy, dtype = float).reshape(-1, 2)
+
+    # The (ray, triangle) pairs to test: each ray with the triangles in its cell (the rays outside the grid miss)
+    cells = np.floor((xy - origin)/cell_size).astype(np.int64)
+    is_in_grid = np.all((cells >= 0) & (cells <= num_cells), axis = 1)
+    cells = np.minimum(cells, num_cells - 1)
+    keys = cells[:, 0]*num_cells[1] + cells[:, 1]
+    starts = np.where(is_in_grid, cell_starts[np.where(is_in_grid, keys, 0)], 0)
+    ends = np.where(is_in_grid, cell_starts[np.where(is_in_grid, keys, 0) + 1], 0)
+    ray_ids = np.repeat(np.arange(xy.shape[0]), ends - starts)
+    a, b, c = (triangles[cell_triangle_ids[concatenate_ranges(starts, ends)], i] for i in range(3))
+
+    # Barycentric coordinates (u, v) of the rays in the xy projections of the triangles
+    ab, ac, ap = b - a, c - a, xy[ray_ids] - a[:, :2]
+    det = ab[:, 0]*ac[:, 1] - ab[:, 1]*ac[:, 0]
+    is_not_flat = np.abs(det) > 1e-12*(self.bounding_box_diag**2)
+    det = np.where(is_not_flat, det, 1.0)
+    u = (ap[:, 0]*ac[:, 1] - ap[:, 1]*ac[:, 0])/det
+    v = (ab[:, 0]*ap[:, 1] - ab[:, 1]*ap[:, 0])/det
+    eps = 1e-9
+    is_hit = is_not_flat & (u >= -eps) & (v >= -eps) & (u + v <= 1 + eps)
+    ray_ids = ray_ids[is_hit]
+    z = (a[:, 2] + u*ab[:, 2] + v*ac[:, 2])[is_hit]
+
+    # Sort by ray and z and drop the hits which (almost) coincide with the previous hit of the same ray
+    order = np.lexsort((z, ray_ids))
+    ray_ids, z = ray_ids[order], z[order]
+    is_duplicate = np.zeros(z.shape, dtype = bool)
+    is_duplicate[1:] = (ray_ids[1:] == ray_ids[:-1]) & (z[1:] - z[:-1] <= 1e-9*self.bounding_box_diag)
+    return (ray_ids[~is_duplicate], z[~is_duplicate])
+
+
+  def __get_triangles(self):
+    """Returns the triangles of the mesh as an (n, 3, 3) array (triangle, corner, coordinate)."""
+    if self.__triangles is None:
+      polys = self.vtk_mesh.GetPolys()
+      cells = numpy_support.vtk_to_numpy(polys.GetData())
+      if cells.size != 4*polys.GetNumberOfCells():
+        # Not only triangles => triangulate first
+        triangle_filter = vtk.vtkTriangleFilter()
+        triangle_filter.SetInputData(self.vtk_mesh)
+        triangle_filter.PassLinesOff()
+        triangle_filter.PassVertsOff()
+        triangle_filter.Update()
+        cells = numpy_support.vtk_to_numpy(triangle_filter.GetOutput().GetPolys().GetData())
+      self.__triangles = self.points[cells.reshape(-1, 4)[:, 1:]]
+    return self.__triangles
+
+
+  def __get_ray_grid(self):
+    """Returns a tuple (origin, cell size, number of cells, cell starts, triangle ids) which describes a grid in
+    the xy plane with about as many cells as the mesh has triangles. Each triangle is in the cells which
+    overlap its xy bounding box. The triangles in the cell with key k = i*(number of cells along y) + j are
+    triangle_ids[cell_starts[k]:cell_starts[k+1]]."""
+    if self.__ray_grid is not None:
+      return self.__ray_grid
+
+    triangles = self.__get_triangles()
+    b = self.bounding_box
+    origin = np.array([b[0], b[2]])
+    extent = np.maximum(np.array([b[1] - b[0], b[3] - b[2]]), 1e-12)
+    num_cells_per_axis = int(min(max(math.sqrt(triangles.shape[0]), 1), 1024))
+    num_cells = np.array([num_cells_per_axis, num_cells_per_axis], dtype = np.int64)
+    cell_size = extent/num_cells
+
+    # The range of cells of each triangle
+    min_cells = np.clip(np.floor((triangles[:, :, :2].min(axis = 1) - origin)/cell_size).astype(np.int64), 0, num_cells - 1)
+    max_cells = np.clip(np.floor((triangles[:, :, :2].max(axis = 1) - origin)/cell_size).astype(np.int64), 0, num_cells - 1)
+    range_sizes = max_cells - min_cells + 1
+    # One entry per (triangle, cell) pair: the offset of the cell in the range of its triangle gives the cell
+    counts = range_sizes[:, 0]*range_sizes[:, 1]
+    triangle_ids = np.repeat(np.arange(triangles.shape[0]), counts)
+    offsets = concatenate_ranges(np.zeros_like(counts), counts)
+    cell_x = min_cells[triangle_ids, 0] + offsets % range_sizes[triangle_ids, 0]
+    cell_y = min_cells[triangle_ids, 1] + offsets // range_sizes[triangle_ids, 0]
+    keys = cell_x*num_cells[1] + cell_y
+
+    # Sort the pairs by cell
+    order = np.argsort(keys, kind = "stable")
+    cell_starts = np.zeros(num_cells[0]*num_cells[1] + 1, dtype = np.int64)
+    np.cumsum(np.bincount(keys, minlength = num_cells[0]*num_cells[1]), out = cell_starts[1:])
+    self.__ray_grid = (origin, cell_size, num_cells, cell_starts, triangle_ids[order])
+    return self.__ray_grid
+
+
+class SymmetricPointsGenerator:
+  def __init__(self, vtk_mesh, axis, mesh_geometry = None):
+    """Initialize this object with the mesh in which the points are supposed to be generated. 'axis' should
+    be 0, 1 or 2 depending on whether you want to mirror the generated point along the x, y or z axis. Pass
+    'mesh_geometry' (a MeshGeometry of the mesh) to skip computing it. Each generator has its own point clouds,
+    i.e., it spreads the points it generates independently of the other generators."""
+    if mesh_geometry is None:
+      mesh_geometry = MeshGeometry(vtk_mesh, axis)
+
+    geometry = mesh_geometry
+    self.__vtk_mesh = geometry.vtk_mesh
+    self.__bounding_box = geometry.bounding_box
+    self.__bounding_box_diag = geometry.bounding_box_diag
+    self.__left_point_ids, self.__left_target = geometry.left_point_ids, geometry.left_target
+    self.__right_point_ids, self.__right_target = geometry.right_point_ids, geometry.right_target
+    self.__all_point_ids, self.__central_target = geometry.all_point_ids, geometry.central_target
+    self.__mesh_geometry = geometry
+
+    self.__left_point_cloud = UniformPointCloud(self.__left_target)
+    self.__right_point_cloud = UniformPointCloud(self.__right_target)
+    self.__central_point_cloud = UniformPointCloud(self.__central_target)
 
 
   def generate_point_inside_mesh(self, side):
@@ -74,25 +237,14 @@ class SymmetricPointsGenerator:
 
     # Which side?
     if side == "l": # 'l' for left
-      surface_point_ids = self.__left_point_ids
       point_cloud = self.__left_point_cloud
     elif side == "r": # 'r' for right
-      surface_point_ids = self.__right_point_ids
       point_cloud = self.__right_point_cloud
     else: # make it central
-      surface_point_ids = self.__all_point_ids
       point_cloud = self.__central_point_cloud
 
-    candidate_points = list()
-
     # Generate some candidate points from which we will select (the best) one
-    for i in range(100):
-      random_id = surface_point_ids[random.randint(0, len(surface_point_ids) - 1)]
-      p = self.__vtk_mesh.GetPoint(random_id)
-      p = np.array([p[0], p[1], p[2]])
-      candidate_points.append(self.__generate_random_point_in_mesh(p))
-
-    return point_cloud.insert_best_point(candidate_points)
+    return point_cloud.insert_best_point(self.generate_candidate_points_inside_mesh(side, 100))
 
 
   def generate_mirrored_points_inside_mesh(self):
@@ -100,31 +252,22 @@ class SymmetricPointsGenerator:
     p_L = len(self.__left_point_ids) / (len(self.__left_point_ids) + len(self.__right_point_ids))
     # Randomly select a side
     if random.random() < p_L:
-      surface_point_ids = self.__left_point_ids
+      side = "l"
       target_point = self.__left_target
       opposite_target_point = self.__right_target
       point_cloud = self.__left_point_cloud
       opposite_point_cloud = self.__right_point_cloud
       got_left = True
     else:
-      surface_point_ids = self.__right_point_ids
+      side = "r"
       target_point = self.__right_target
       opposite_target_point = self.__left_target
       point_cloud = self.__right_point_cloud
       opposite_point_cloud = self.__left_point_cloud
       got_left = False
 
-    candidate_points = list()
-
-    # Generate some candidate points from which we will select (the best) one
-    for i in range(100):
-      random_id = surface_point_ids[random.randint(0, len(surface_point_ids) - 1)]
-      p = self.__vtk_mesh.GetPoint(random_id)
-      p = np.array([p[0], p[1], p[2]])
-      candidate_points.append(self.__generate_random_point_in_mesh(p))
-
-    # Insert a point in the selected point cloud
-    p = point_cloud.insert_best_point(candidate_points)
+    # Generate some candidate points from which we will select (the best) one and insert it in the selected point cloud
+    p = point_cloud.insert_best_point(self.generate_candidate_points_inside_mesh(side, 100))
 
     # Insert the mirrored version of 'p' in the other point cloud
     diff = p - target_point
@@ -138,22 +281,48 @@ class SymmetricPointsGenerator:
       return (p_m, p)
 
 
-  def __generate_random_point_in_mesh(self, surface_point):
-    # This is another possibility to generate a point inside the mesh
-    a = np.array([surface_point[0], surface_point[1], self.__bounding_box[4] - 1])
-    b = np.array([surface_point[0], surface_point[1], self.__bounding_box[5] + 1])
-
-    # Cut the mesh by the line which connects a to b
-    intersection_points = vtk.vtkPoints()
-    self.__obb_tree.IntersectWithLine(a, b, intersection_points, None)
-    
-    if intersection_points.GetNumberOfPoints() < 2:
-      print("RandomMeshPointsGenerator.__generate_random_point_in_mesh: line-mesh intersection went wrong. We return a surface point.")
-      return surface_point
-
-    # Return a random point between the first two intersection points
-    p = intersection_points.GetPoint(0)
-    p = np.array([p[0], p[1], p[2]])
-    q = intersection_points.GetPoint(1)
-    q = np.array([q[0], q[1], q[2]])
-    return p + random.uniform(0.4, 0.6)*(q - p)
+  def generate_candidate_points_inside_mesh(self, side, num_points):
+    """Returns 'num_points' random points inside the mesh on the provided side ("l", "r" or anything else for
+    both sides) as an (n, 3) array. The points are drawn uniformly from the inside voxels of the side (see
+    MeshGeometry.get_inside_mask()), so this does not depend on the number of triangles. If the side has no
+    inside voxels (the mesh is too thin for the voxel size), we fall back to casting lines through the mesh
+    (see __cast_candidate_points())."""
+    voxel_ids = self.__mesh_geometry.get_inside_voxel_ids(side)
+    if not voxel_ids.size:
+      return self.__cast_candidate_points(side, num_points)
+
+    return self.__mesh_geometry.get_inside_mask().sample_points(voxel_ids, num_points)
+
+
+  def contains(self, points):
+    """Returns a bool array which tells for each point (a row of the (n, 3) array 'points') whether it is inside
+    the mesh. This is accurate up to the voxel size of the inside mask only (see InsideMask.contains()), the
+    points near the mesh surface may be classified wrongly."""
+    return self.__mesh_geometry.get_inside_mask().contains(points)
+
+
+  def __cast_candidate_points(self, side, num_points):
+    """Returns 'num_points' random points inside the mesh as an (n, 3) array. For each one, we take a random
+    mesh point of the provided side and pick a point between the first two intersections of the mesh with the
+    line through the mesh point parallel to the z axis. All lines are intersected with the mesh at once (see
+    MeshGeometry.cast_z_rays())."""
+    if side == "l":
+      surface_point_ids = self.__left_point_ids
+    elif side == "r":
+      surface_point_ids = self.__right_point_ids
+    else:
+      surface_point_ids = self.__all_point_ids
+
+    points = self.__mesh_geometry.points[surface_point_ids[np.random.randint(0, len(surface_point_ids), num_points)]]
+    ray_ids, z = self.__mesh_geometry.cast_z_rays(points[:, :2])
+
+    # The first two intersections of each line
+    first_hits = np.searchsorted(ray_ids, np.arange(num_points), side = "left")
+    num_hits = np.searchsorted(ray_ids, np.arange(num_points), side = "right") - first_hits
+    has_two_hits = num_hits >= 2
+    if not np.all(has_two_hits):
+      print("SymmetricPointsGenerator.__cast_candidate_points: line-mesh intersection went wrong. We use surface points.")
+
+    z1, z2 = z[first_hits[has_two_hits]], z[first_hits[has_two_hits] + 1]
+    points[has_two_hits, 2] = z1 + np.random.uniform(0.4, 0.6, z1.size)*(z2 - z1)
+    return points
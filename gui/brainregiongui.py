@@ -12,7 +12,9 @@ class BrainRegionGUI(QtWidgets.QGroupBox):
 
     # Register yourself as an observer
     self.__data_container = data_container
-    self.__data_container.add_observer(self)
+    self.__data_container.subscribe(DataContainer.change_is_new_selection, self.__update)
+    self.__data_container.subscribe(DataContainer.change_is_color, lambda data: self.__update_color_selection_button())
+    self.__data_container.subscribe(DataContainer.change_is_transparency, lambda data: self.__update_transparency_slider())
 
     # This list keeps the models (objects) we have
     self.__brain_regions = list()
@@ -58,23 +60,9 @@ class BrainRegionGUI(QtWidgets.QGroupBox):
     self.hide()
 
 
-  def observable_changed(self, change, data):
-    # Decide what to do depending on the change
-    if change == DataContainer.change_is_new_selection:
-      self.__update(data)
-    elif change == DataContainer.change_is_color:
-      self.__update_color_selection_button()
-    elif change == DataContainer.change_is_transparency:
-      self.__update_transparency_slider()
-
-
   def __update(self, models):
-    self.__brain_regions = list()
-
-    # Get the brain regions only
-    for model in models:
-      if isinstance(model, BrainRegion):
-        self.__brain_regions.append(model)
+    # Get the selected brain regions only
+    self.__brain_regions = self.__data_container.get_selected_models_of_type(BrainRegion)
 
     if self.__brain_regions:
       self.__update_see_inside_checkbox()
@@ -1,5 +1,6 @@
 import os
 from .listwidget import ListWidget
+from bio.neuron import Neuron
 from core.datacontainer import DataContainer
 from PyQt5 import QtWidgets, QtCore, QtWidgets
 
@@ -10,8 +11,9 @@ from PyQt5 import QtWidgets, QtCore, QtWidgets
 class DataPanel(QtWidgets.QDockWidget):
   """This is the dock widget for the loaded models. It will have: (1) a line edit where the user
   can search for a model among the loaded ones, (2) buttons to manage the model selection/deletion,
-  (3) a list with the loaded models, (4) buttons to control the model visibility."""
-  def __init__(self, data_container):
+  (3) a list with the loaded models, (4) buttons to select the neighbours of the selected neurons,
+  (5) buttons to control the model visibility."""
+  def __init__(self, data_container, brain):
     if not isinstance(data_container, DataContainer):
       raise TypeError("the input data container has the wrong type")
 
@@ -19,11 +21,18 @@ class DataPanel(QtWidgets.QDockWidget):
     self.setFeatures(QtWidgets.QDockWidget.DockWidgetFloatable | QtWidgets.QDockWidget.DockWidgetMovable)
 
     self.__data_container = data_container
-    self.__data_container.add_observer(self)
+    self.__brain = brain
+    self.__data_container.subscribe(DataContainer.change_is_new_selection, self.__update_buttons_according_to_selection)
 
     # (1)
     self.__data_search = QtWidgets.QLineEdit()
+    self.__data_search.setPlaceholderText("part of a name, a glob pattern (*, ?) or re:<regular expression>")
     self.__data_search.textChanged.connect(self.__on_search_text_changed)
+    # Don't search on every keystroke but once the user stopped typing for a moment
+    self.__search_timer = QtCore.QTimer()
+    self.__search_timer.setSingleShot(True)
+    self.__search_timer.setInterval(200)
+    self.__search_timer.timeout.connect(self.__search)
     # (2)
     self.__btn_invert_model_selection = QtWidgets.QPushButton("invert selection")
     self.__btn_invert_model_selection.clicked.connect(self.__on_invert_model_selection)
@@ -33,6 +42,21 @@ class DataPanel(QtWidgets.QDockWidget):
     # (3)
     self.__list_widget = ListWidget(data_container)
     # (4)
+    self.__num_hops = QtWidgets.QSpinBox()
+    self.__num_hops.setRange(1, 100)
+    self.__num_hops.setPrefix("hops: ")
+    self.__neighbour_direction = QtWidgets.QComboBox()
+    self.__neighbour_direction.addItems(["in & out", "in", "out"])
+    self.__btn_select_neighbours = QtWidgets.QPushButton("select neighbours")
+    self.__btn_select_neighbours.clicked.connect(self.__on_select_neighbours)
+    self.__btn_select_neighbours.setEnabled(False)
+    neighbours_group_layout = QtWidgets.QHBoxLayout()
+    neighbours_group_layout.addWidget(self.__num_hops)
+    neighbours_group_layout.addWidget(self.__neighbour_direction)
+    neighbours_group_layout.addWidget(self.__btn_select_neighbours)
+    neighbours_group = QtWidgets.QGroupBox("neighbours of the selected neurons")
+    neighbours_group.setLayout(neighbours_group_layout)
+    # (5)
     btn_make_all_visible = QtWidgets.QPushButton("all")
     btn_make_all_visible.clicked.connect(self.__on_make_all_visible)
     btn_make_all_invisible = QtWidgets.QPushButton("none")
@@ -58,7 +82,8 @@ class DataPanel(QtWidgets.QDockWidget):
     dock_layout.addWidget(self.__btn_invert_model_selection, 2, 1, 1, 1)
     dock_layout.addWidget(self.__btn_delete_selected_models, 2, 2, 1, 1)
     dock_layout.addWidget(self.__list_widget, 3, 0, 1, -1)
-    dock_layout.addWidget(visibility_group, 4, 0, 1, -1)
+    dock_layout.addWidget(neighbours_group, 4, 0, 1, -1)
+    dock_layout.addWidget(visibility_group, 5, 0, 1, -1)
     # Group everything in a frame
     dock_frame = QtWidgets.QFrame()
     dock_frame.setLayout(dock_layout)
@@ -66,13 +91,6 @@ class DataPanel(QtWidgets.QDockWidget):
     self.setWidget(dock_frame)
 
 
-  def observable_changed(self, change, data):
-    if change == DataContainer.change_is_new_selection:
-      self.__update_buttons_according_to_selection(data)
-    #elif change == DataContainer.change_is_new_data:
-    #  self.__data_search.clear()
-
-
   def __update_buttons_according_to_selection(self, data):
     if len(data) > 0:
       self.__btn_delete_selected_models.setEnabled(True)
@@ -80,10 +98,24 @@ class DataPanel(QtWidgets.QDockWidget):
     else:
       self.__btn_delete_selected_models.setEnabled(False)
       self.__btn_selection_visibility.setEnabled(False)
+    self.__btn_select_neighbours.setEnabled(len(self.__data_container.get_selected_models_of_type(Neuron)) > 0)
 
 
   def __on_search_text_changed(self, search_text):
-    self.__list_widget.show_items_containing_text(search_text.lower())
+    # (Re)start the timer, see __search()
+    self.__search_timer.start()
+
+
+  def __search(self):
+    try:
+      self.__list_widget.show_items_matching(self.__data_search.text())
+    except ValueError as error:
+      # Let the user know that the query is invalid
+      self.__data_search.setStyleSheet("color: red")
+      self.__data_search.setToolTip(str(error))
+    else:
+      self.__data_search.setStyleSheet("")
+      self.__data_search.setToolTip("")
 
 
   def __on_invert_model_selection(self):
@@ -91,7 +123,15 @@ class DataPanel(QtWidgets.QDockWidget):
 
 
   def __on_delete_selected_models(self):
-    self.__data_container.delete_models(self.__list_widget.get_selected_models())
+    self.__list_widget.delete_selected_models()
+
+
+  def __on_select_neighbours(self):
+    # Select the neurons and their neighbours together with the connections between them (they get highlighted)
+    neurons = self.__data_container.get_selected_models_of_type(Neuron)
+    direction = ("both", "in", "out")[self.__neighbour_direction.currentIndex()]
+    neighbours, neural_connections = self.__brain.get_neighbours(neurons, self.__num_hops.value(), direction)
+    self.__data_container.set_selection(neurons + neighbours + neural_connections)
 
 
   def __on_make_all_visible(self):
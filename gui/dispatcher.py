@@ -0,0 +1,27 @@
+from PyQt5 import QtCore
+
+#==================================================================================================
+# MainThreadDispatcher ============================================================================
+#==================================================================================================
+class MainThreadDispatcher(QtCore.QObject):
+  """A notification dispatcher (see Observable.set_notification_dispatcher()) which calls the functions in the
+  thread this object was created in, i.e., create it in the Qt main thread. Functions coming from this thread
+  are called right away, the ones coming from other threads are queued and called by the Qt event loop (in
+  the order they came in). This way, worker threads can change the models while the observers (the GUI
+  and the VTK stuff) are only touched in the main thread."""
+  function_queued = QtCore.pyqtSignal(object)
+
+  def __init__(self):
+    super().__init__()
+    self.function_queued.connect(self.__call_function, QtCore.Qt.QueuedConnection)
+
+
+  def __call__(self, function):
+    if QtCore.QThread.currentThread() == self.thread():
+      function()
+    else:
+      self.function_queued.emit(function)
+
+
+  def __call_function(self, function):
+    function()
@@ -1,116 +1,255 @@
 from bio.brainregion import BrainRegion
-from vis.vtkvol import VtkVolumeModel
+from bio.neuron import Neuron
+from bio.neuralconnection import NeuralConnection
 from core.datacontainer import DataContainer
+from core.nameindex import NameIndex
 from PyQt5 import QtCore, QtWidgets
 
 #============================================================================================================
-# ListWidgetItem ============================================================================================
+# ModelListModel ============================================================================================
 #============================================================================================================
-class ListWidgetItem(QtWidgets.QListWidgetItem):
-  def __init__(self, model):
-    super().__init__(model.name)
-    # Save the model
-    self.model = model
-
-    # Shall it be checked (i.e., is the model visible)
-    if self.model.visual_representation.is_visible(): self.setCheckState(QtCore.Qt.Checked)
-    else: self.setCheckState(QtCore.Qt.Unchecked)
-
-    # Per default the item is not hidden and not selected
-    self.is_hidden = False
-    self.setSelected(False)
-
-
-  def update_model_visibility(self):
-    if self.__is_checked(): self.model.visual_representation.visibility_on()
-    else: self.model.visual_representation.visibility_off()
-
-
-  def __is_checked(self):
-    return self.checkState() == QtCore.Qt.Checked
+class ModelListModel(QtCore.QAbstractListModel):
+  """The Qt model behind the list in the data panel. It keeps the listed models in an array and provides
+  the model names and the visibility (as check state) on demand, i.e., the view asks only for the rows it
+  is currently showing. The rows are the models which pass the filter (see set_filter()) in the order they
+  were added."""
+  def __init__(self, data_container):
+    super().__init__()
+    self.__data_container = data_container
+    # All listed models (in the order they were added, as a list and as a set)
+    self.__all_models = list()
+    self.__listed_models = set()
+    # The search index over the model names. The models are indexed on the next search only, since composing
+    # the names of many neural connections is expensive and not needed as long as nobody searches.
+    self.__name_index = NameIndex()
+    self.__unindexed_models = dict() # the values are not used, it's an ordered set
+    # The filter query, its matcher (see NameIndex.get_matcher()) and the models which pass it (these are the
+    # rows) with the (model, row) dictionary
+    self.__filter_query = ""
+    self.__filter_matcher = None
+    self.__models = list()
+    self.__model_to_row = dict()
+
+
+  def rowCount(self, parent = QtCore.QModelIndex()):
+    """Inherited from QAbstractListModel."""
+    if parent.isValid():
+      return 0
+    return len(self.__models)
+
+
+  def data(self, index, role = QtCore.Qt.DisplayRole):
+    """Inherited from QAbstractListModel."""
+    if not index.isValid():
+      return None
+    model = self.__models[index.row()]
+    if role == QtCore.Qt.DisplayRole:
+      return model.name
+    if role == QtCore.Qt.CheckStateRole:
+      return QtCore.Qt.Checked if model.visual_representation.is_visible() else QtCore.Qt.Unchecked
+    return None
+
+
+  def setData(self, index, value, role = QtCore.Qt.EditRole):
+    """Inherited from QAbstractListModel. Called when the user clicks a check box."""
+    if not index.isValid() or role != QtCore.Qt.CheckStateRole:
+      return False
+    self.set_visibility([self.__models[index.row()]], 1 if value == QtCore.Qt.Checked else 0)
+    return True
+
+
+  def flags(self, index):
+    """Inherited from QAbstractListModel."""
+    if not index.isValid():
+      return QtCore.Qt.NoItemFlags
+    return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsUserCheckable
+
+
+  def get_model(self, row):
+    return self.__models[row]
+
+
+  def get_row(self, model):
+    """Returns the row of 'model' or -1 if it is not listed or does not pass the filter."""
+    return self.__model_to_row.get(model, -1)
+
+
+  def is_listed(self, model):
+    return model in self.__listed_models
+
+
+  def get_shown_models(self):
+    """Returns the models which pass the filter."""
+    return list(self.__models)
+
+
+  def get_all_models(self):
+    return list(self.__all_models)
+
+
+  def set_filter(self, query):
+    """Shows only the models whose names match 'query' (see NameIndex.search()). An empty query shows all
+    models. Raises ValueError if 'query' is an invalid regular expression."""
+    if query:
+      # Index the models added since the last search
+      for model in self.__unindexed_models:
+        self.__name_index.add(model, model.name)
+      self.__unindexed_models.clear()
+    matching_models = self.__name_index.search(query)
+    self.beginResetModel()
+    self.__filter_query = query
+    self.__filter_matcher = NameIndex.get_matcher(query)
+    self.__models = list(self.__all_models) if matching_models is None else matching_models
+    self.__update_model_to_row()
+    self.endResetModel()
+
+
+  def add_models(self, models):
+    """Appends 'models' to the list."""
+    models = [model for model in dict.fromkeys(models) if model not in self.__listed_models]
+    if not models:
+      return
+    self.__listed_models.update(models)
+    self.__all_models.extend(models)
+    self.__unindexed_models.update(dict.fromkeys(models))
+
+    # Show the new models which pass the filter (check only them, not the whole index)
+    if self.__filter_matcher:
+      models = [model for model in models if self.__filter_matcher(model.name)]
+      if not models:
+        return
+    first_row = len(self.__models)
+    self.beginInsertRows(QtCore.QModelIndex(), first_row, first_row + len(models) - 1)
+    for row, model in enumerate(models, first_row):
+      self.__model_to_row[model] = row
+    self.__models.extend(models)
+    self.endInsertRows()
+
+
+  def remove_models(self, models):
+    """Removes 'models' from the list. The rows are removed in blocks of consecutive rows and the arrays are
+    compacted once, so this stays linear even if many models get removed."""
+    models = [model for model in dict.fromkeys(models) if model in self.__listed_models]
+    if not models:
+      return
+    for model in models:
+      self.__name_index.remove(model)
+      self.__unindexed_models.pop(model, None)
+    removed_models = set(models)
+    self.__listed_models.difference_update(removed_models)
+    self.__all_models = [model for model in self.__all_models if model not in removed_models]
+
+    rows = sorted(self.__model_to_row[model] for model in models if model in self.__model_to_row)
+    if not rows:
+      return
 
+    # Collect the blocks of consecutive rows
+    blocks = list()
+    first_row = last_row = rows[0]
+    for row in rows[1:]:
+      if row == last_row + 1:
+        last_row = row
+      else:
+        blocks.append((first_row, last_row))
+        first_row = last_row = row
+    blocks.append((first_row, last_row))
+
+    # Too many blocks => it is cheaper to let the view start from scratch
+    if len(blocks) > 100:
+      self.beginResetModel()
+      self.__models = [model for model in self.__models if model not in removed_models]
+      self.__update_model_to_row()
+      self.endResetModel()
+      return
 
-  def set_checked(self):
-    if not self.__is_checked(): self.setCheckState(QtCore.Qt.Checked)
-    self.model.visual_representation.visibility_on()
+    # Remove the blocks from the last one to the first one, such that the row numbers stay valid
+    for first_row, last_row in reversed(blocks):
+      self.beginRemoveRows(QtCore.QModelIndex(), first_row, last_row)
+      del self.__models[first_row:last_row + 1]
+      self.endRemoveRows()
+    self.__update_model_to_row()
 
 
-  def set_unchecked(self):
-    if self.__is_checked(): self.setCheckState(QtCore.Qt.Unchecked)
-    self.model.visual_representation.visibility_off()
+  def __update_model_to_row(self):
+    self.__model_to_row = {model: row for row, model in enumerate(self.__models)}
 
 
-  def set_hidden(self, hidden):
-    self.is_hidden = hidden
+  def set_visibility(self, models, state):
+    """Changes the visibility of 'models' at once:
+    state ==  1: make them visible
+    state ==  0: make them invisible
+    state == -1: switch their visibility
+    The data container notifies its observers once."""
+    if not models:
+      return
+    for model in models:
+      vis_rep = model.visual_representation
+      value = state == 1 or (state == -1 and not vis_rep.is_visible())
+      if isinstance(model, NeuralConnection):
+        # The connection store has to know which connections are shown (for the weight threshold)
+        model.set_visibility(value)
+      elif value:
+        vis_rep.visibility_on()
+      else:
+        vis_rep.visibility_off()
+    self.__data_container.update_visibility()
 
 
-  def toggle_check_state(self):
-    if self.__is_checked():
-      self.set_unchecked()
-    else:
-      self.set_checked()
+  def on_visibility_changed(self):
+    """Makes the view fetch the (visible part of the) check states again."""
+    if self.__models:
+      self.dataChanged.emit(self.index(0), self.index(len(self.__models) - 1), [QtCore.Qt.CheckStateRole])
 
 
 #============================================================================================================
 # ListWidget ================================================================================================
 #============================================================================================================
-class ListWidget(QtWidgets.QListWidget):
+class ListWidget(QtWidgets.QListView):
+  """Shows the loaded models. The list is a view of a ModelListModel, so it stays fast with a huge number
+  of models."""
   def __init__(self, data_container):
     super().__init__()
     self.__data_container = data_container
     # Make sure that the data container has the right type
     if not isinstance(self.__data_container, DataContainer):
       raise TypeError("the data container has the wrong type")
+
+    # The listed models
+    self.__list_model = ModelListModel(data_container)
+    self.setModel(self.__list_model)
+    # The rows of a huge list have the same height, so let Qt skip computing it for each one
+    self.setUniformItemSizes(True)
+
     # Register itself as an observer to the data_container
-    self.__data_container.add_observer(self)
+    self.__data_container.subscribe(DataContainer.change_is_new_data, self.__add_data_items)
+    self.__data_container.subscribe(DataContainer.change_is_new_selection, self.__update_selection)
+    self.__data_container.subscribe(DataContainer.change_is_deleted_models, self.__delete_models)
+    self.__data_container.subscribe(DataContainer.change_is_data_visibility, lambda data: self.__list_model.on_visibility_changed())
+
+    # The listed models which are selected in the data container
+    self.__selected_models = set()
 
-    self.__model_to_item = dict()
-    self.__model_to_selected_item = dict()
-    self.__ordered_items = list()    
- 
     self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
-    self.itemSelectionChanged.connect(self.__on_item_selection)
-    self.itemChanged.connect(self.__on_item_changed)
+    self.selectionModel().selectionChanged.connect(self.__on_item_selection)
 
-    # The following ones are used in some of the callbacks
-    self.__update_data_container_visibility = True
+    # The following one is used in some of the callbacks
     self.__ignore_selection_callback = False
 
 
-  def observable_changed(self, change, data):
-    # Decide what to do depending on the change
-    if change == DataContainer.change_is_new_data:
-      self.__add_data_items(data)
-    elif change == DataContainer.change_is_new_selection:
-      self.__update_selection(data)
-    elif change == DataContainer.change_is_deleted_models:
-      self.__delete_models(data)
-
-
-  def show_items_containing_text(self, text):
-    """Loop over the loaded models and show only those which contain 'text' in the name."""
+  def show_items_matching(self, query):
+    """Show only the models whose names match 'query' (see NameIndex.search()). Raises ValueError if 'query'
+    is an invalid regular expression."""
     # The following lines cause Qt to call __on_item_selection which we don't want
     ignore_selection_callback = self.__ignore_selection_callback
     self.__ignore_selection_callback = True
-    
-    # First, remove all elements from the list (don't call self.clear() since the items are destroyed!)
-    for i in range(self.count()):
-      self.takeItem(0)
-
-    # Insert all elements whose names contain 'text'
-    for item in self.__ordered_items:
-      if text in item.model.name.lower():
-        item.is_hidden = False
-        self.insertItem(self.count(), item)
-      else:
-        item.is_hidden = True
-
-    # Mark all selected items as such in the QListWidget
-    for selected_item in self.__model_to_selected_item.values():
-      selected_item.setSelected(True)
 
-    # Restore the state
-    self.__ignore_selection_callback = ignore_selection_callback
+    try:
+      self.__list_model.set_filter(query)
+      # Mark all selected items as such in the view
+      self.__select_models(self.__selected_models)
+    finally:
+      # Restore the state
+      self.__ignore_selection_callback = ignore_selection_callback
 
 
   def update_visibility(self, state):
@@ -118,154 +257,98 @@ class ListWidget(QtWidgets.QListWidget):
     state ==  1: make all visible
     state ==  0: make all invisible
     state == -1: switch visibility"""
-    # The problem is that the following loop triggers __on_item_changed() which would cause the
-    # data container to update its visibility in each iteration. It is better to do this once at the
-    # end of this function. That's why the following two lines:
-    update_data_container_visibility = self.__update_data_container_visibility # save the current state
-    self.__update_data_container_visibility = False
-    
-    # Update all QList items but not the data container
-    for item in self.__ordered_items:
-      if item.is_hidden:
-        continue
-      
-      if state == 1: item.set_checked()
-      elif state == 0: item.set_unchecked()
-      elif state == -1: item.toggle_check_state()
-
-    # Now, update the data container visibility
-    self.__update_data_container_visibility = update_data_container_visibility
-    self.__data_container.update_visibility()
+    self.__list_model.set_visibility(self.__list_model.get_shown_models(), state)
 
 
   def make_selected_visible(self):
-    # The problem is that the following loop triggers __on_item_changed() which would cause the
-    # data container to update its visibility in each iteration. It is better to do this once at the
-    # end of this function. That's why the following two lines:
-    update_data_container_visibility = self.__update_data_container_visibility # save the current state
-    self.__update_data_container_visibility = False
-
-    # Make all invisible
-    for item in self.__ordered_items:
-      item.set_unchecked()
-    # Make only the selected visible
-    for selected_model in self.__model_to_selected_item.values():
-      selected_model.set_checked()
-
-    # Now, update the data container visibility
-    self.__update_data_container_visibility = update_data_container_visibility
-    self.__data_container.update_visibility()
+    # Make all invisible and only the selected visible (the data container notifies its observers once)
+    with self.__data_container.batch():
+      self.__list_model.set_visibility(self.__list_model.get_all_models(), 0)
+      self.__list_model.set_visibility(list(self.__selected_models), 1)
 
 
   def keyPressEvent(self, event):
     # Do the default Qt stuff
     super().keyPressEvent(event)
     if event.key() == QtCore.Qt.Key_Delete:
-      self.__data_container.delete_models(self.get_selected_models())
+      self.delete_selected_models()
 
 
   def get_selected_models(self):
-    return list(self.__model_to_selected_item.keys())
+    return list(self.__selected_models)
+
 
+  def delete_selected_models(self):
+    """Deletes the selected models except the neurons and neural connections, which belong to the loaded
+    network (just like the 3D view does, see Controller.on_key_released())."""
+    self.__data_container.delete_models([model for model in self.__selected_models if not isinstance(model, (Neuron, NeuralConnection))])
 
-  def __on_item_selection(self):
+
+  def __on_item_selection(self, selected, deselected):
     if self.__ignore_selection_callback:
       return
-    
-    selected_models = list()
-    
+
     # Collect the models selected by the user
-    for item in self.selectedItems():
-        selected_models.append(item.model)
+    selected_models = [self.__list_model.get_model(index.row()) for index in self.selectionModel().selectedIndexes()]
 
     # If the user holds the ctrl. key, add the hidden selected items to the current ones
     if QtWidgets.QApplication.keyboardModifiers() == QtCore.Qt.ControlModifier:
-      for sel_item in self.__model_to_selected_item.values():
-        if sel_item.is_hidden:
-          selected_models.append(sel_item.model)
+      for model in self.__selected_models:
+        if self.__list_model.get_row(model) < 0:
+          selected_models.append(model)
 
     # Update the selection in the data container
     self.__data_container.set_selection(selected_models)
 
 
-  def __on_item_changed(self, item):
-    item.update_model_visibility()
-    # Shall we update the data container and thus notify all its observers?
-    if self.__update_data_container_visibility:
-      self.__data_container.update_visibility()
-
-
   def __add_data_items(self, models):
     # Add one checkable list item per model
-    for model in models:
-      if not isinstance(model, BrainRegion):
-        continue
-      # Create our own data item
-      item = ListWidgetItem(model)
-      item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
-      # Save the item in the dictionaries
-      self.__model_to_item[model] = item
-      # Save the item in the ordered list
-      if isinstance(model, VtkVolumeModel):
-        self.__ordered_items.insert(0, item)
-        self.insertItem(0, item)
-      else:
-        self.__ordered_items.append(item)
-        self.insertItem(self.count(), item)
+    self.__list_model.add_models([model for model in models if isinstance(model, (BrainRegion, Neuron, NeuralConnection))])
 
 
   def __update_selection(self, data):
     # Save the current state before changing it
     ignore_selection_callback = self.__ignore_selection_callback
-    # The following for-loop makes Qt call the self.__on_item_selection callback which would update the data container selection. However, we do not want that,
+    # Selecting the items makes Qt call the self.__on_item_selection callback which would update the data container selection. However, we do not want that,
     # since this would make the data container inform all its observers (including this one) about the change, which would again lead to this method -> endless loop.
     # That's why the following line:
     self.__ignore_selection_callback = True
 
-    # First, unselect all
-    self.clearSelection()
-    self.__model_to_selected_item.clear()
-
-    item = None
-    # Select only those in 'data'
-    for model in data:
-      item = self.__model_to_item.get(model)
-      if item:
-        item.setSelected(True)
-        self.__model_to_selected_item[model] = item
+    self.__selected_models = {model for model in data if self.__list_model.is_listed(model)}
+    indices = self.__select_models(self.__selected_models)
 
     # If there was only one item => scroll to it
-    if len(data) == 1 and item:
-      self.scrollToItem(item)
+    if len(data) == 1 and len(indices) == 1:
+      self.scrollTo(indices[0])
 
     # Restore the state
     self.__ignore_selection_callback = ignore_selection_callback
 
 
-  def __delete_models(self, models):
-    for model in models:
-      self.__delete_model(model)
+  def __select_models(self, models):
+    """Selects the rows of 'models' which pass the filter and unselects all other rows. Consecutive rows are
+    selected as a single range. Returns the model indices of the selected rows."""
+    rows = sorted(row for row in (self.__list_model.get_row(model) for model in models) if row >= 0)
+
+    item_selection = QtCore.QItemSelection()
+    i = 0
+    while i < len(rows):
+      # Find the end of the range of consecutive rows starting at the i-th one
+      j = i
+      while j + 1 < len(rows) and rows[j + 1] == rows[j] + 1:
+        j += 1
+      item_selection.select(self.__list_model.index(rows[i]), self.__list_model.index(rows[j]))
+      i = j + 1
+
+    self.selectionModel().select(item_selection, QtCore.QItemSelectionModel.ClearAndSelect)
+    return [self.__list_model.index(row) for row in rows]
 
 
-  def __delete_model(self, model):
+  def __delete_models(self, models):
     ignore_selection_callback = self.__ignore_selection_callback
     self.__ignore_selection_callback = True
 
-    # Get the list item corresponding to the model
-    item = self.__model_to_item.get(model)
-    
-    # Remove the model from the dictionaries
-    try:
-      del self.__model_to_item[model]
-      del self.__model_to_selected_item[model]
-    except KeyError:
-      pass
-    # Remove the corresponding item from the QListWidget and another internal list
-    if item:
-      self.takeItem(self.row(item))
-      try:
-        self.__ordered_items.remove(item)
-      except KeyError:
-        pass
+    self.__list_model.remove_models(models)
+    self.__selected_models.difference_update(models)
 
     self.__ignore_selection_callback = ignore_selection_callback
@@ -7,6 +7,8 @@ from gui.vtkwidget import VtkWidget
 from gui.progress import ProgressBarFrame
 from gui.datapanel import DataPanel
 from gui.propspanel import PropsPanel
+from gui.worker import Worker
+from gui.stepqueue import StepQueue
 from IO.project import ProjectIO
 from IO.conmat import ConnectivityMatrixIO
 
@@ -15,6 +17,9 @@ from IO.conmat import ConnectivityMatrixIO
 # MainWindow ======================================================================================
 #==================================================================================================
 class MainWindow(QtWidgets.QMainWindow):
+  # Emitted in the worker thread once the brain regions of the project being opened are loaded (see __on_open_project())
+  project_brain_regions_loaded = QtCore.pyqtSignal(object)
+
   def __init__(self, qt_app, controller):
     QtWidgets.QMainWindow.__init__(self)
 
@@ -28,6 +33,14 @@ class MainWindow(QtWidgets.QMainWindow):
     # This guy handles the file/project IO
     self.__project_io = ProjectIO(self.__progress_bar)
 
+    # This guy runs the heavy work in the background (see __run_in_background())
+    self.__worker = None
+    self.__on_background_task_succeeded = None
+    # This guy adds the results of the background work to the data container chunk by chunk (see __show_project())
+    self.__step_queue = StepQueue(self.__on_step_queue_empty, lambda error_message: self.__show_messages([error_message], "Error:"))
+    # The signal comes from the worker thread, so the brain regions are shown in the GUI thread
+    self.project_brain_regions_loaded.connect(self.__show_project_brain_regions)
+
     self.__add_menus()
     self.__setup_main_frame()
 
@@ -104,16 +117,16 @@ class MainWindow(QtWidgets.QMainWindow):
 
   def __setup_main_frame(self):
     # Create the OpenGL-based VTK widget
-    self.__viewer3d = VtkWidget(self, self.__progress_bar)
+    self.__viewer3d = VtkWidget(self)
     self.setCentralWidget(self.__viewer3d)
     self.__controller.set_viewer3d(self.__viewer3d)
 
     # Add the dock which shows the list of the loaded data (on the left in the main window)
-    self.__data_panel = DataPanel(self.__data_container)
+    self.__data_panel = DataPanel(self.__data_container, self.__brain)
     self.addDockWidget(QtCore.Qt.LeftDockWidgetArea, self.__data_panel)
 
     # Add the dock which shows the properties of the selected object (on the right in the main window)
-    self.__props_panel = PropsPanel(self.__data_container)
+    self.__props_panel = PropsPanel(self.__data_container, self.__brain)
     self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.__props_panel)
 
 
@@ -122,13 +135,85 @@ class MainWindow(QtWidgets.QMainWindow):
     if project_file_name[0]:
       # Get the project folder and the project name
       self.__project_folder, project_name = os.path.split(project_file_name[0])
-      # Open the project
-      error_messages = self.__project_io.open_project(self.__load_files_folder, project_file_name[0],
-        self.__data_container, self.__brain, self.__viewer3d)
-      # Update the window title
-      self.setWindowTitle(project_name + "  -  BrainVisPy")
-      if error_messages:
-        self.__show_messages(error_messages, "Errors while loading project:")
+      # Open the project: read it in the background, show the brain regions as soon as they are loaded and the
+      # neurons and connections once they are created
+      self.__run_in_background(lambda progress_bar: self.__project_io.read_project(self.__load_files_folder, project_file_name[0],
+        self.__brain, progress_bar, self.project_brain_regions_loaded.emit), self.__show_project)
+
+
+  def __show_project_brain_regions(self, project):
+    self.__project_io.show_brain_regions(project, self.__data_container, self.__viewer3d)
+    # Update the window title
+    self.setWindowTitle(os.path.split(project.file_name)[1] + "  -  BrainVisPy")
+
+
+  def __show_project(self, project):
+    """Adds the neurons and connections to the scene (the brain regions are already there) one chunk per event
+    loop tick, such that the user sees the scene grow."""
+    self.__step_queue.add(self.__project_io.show_neural_network_in_steps(project, self.__brain, self.__viewer3d))
+    if project.error_messages:
+      self.__step_queue.add(self.__show_messages_step(project.error_messages, "Errors while loading project:"))
+
+
+  def __show_messages_step(self, messages, title):
+    """Returns an iterator whose only step shows the messages (to show them after the steps before it)."""
+    self.__show_messages(messages, title)
+    yield
+
+
+  def __run_in_background(self, task, on_succeeded):
+    """Runs task(progress_bar) in a worker thread and calls on_succeeded(result) in the GUI thread when the task
+    is done. The user can cancel the task. The menus and the panels are disabled until the task and the steps
+    it adds to the step queue are done, so there is one task at a time and the user does not change the data
+    while it is being added."""
+    self.__set_data_editing_enabled(False)
+    self.__on_background_task_succeeded = on_succeeded
+    self.__worker = Worker(task, self.__progress_bar, self)
+    self.__worker.succeeded.connect(self.__on_worker_succeeded)
+    self.__worker.failed.connect(self.__on_worker_failed)
+    self.__worker.cancelled.connect(self.__on_worker_cancelled)
+    self.__worker.finished.connect(self.__worker.deleteLater)
+    self.__progress_bar.set_cancel_callback(self.__worker.cancel)
+    self.__worker.start()
+
+
+  def __on_worker_succeeded(self, result):
+    # Adding the result to the data container (in the GUI thread) can not be cancelled
+    self.__progress_bar.set_cancel_callback(None)
+    try:
+      self.__on_background_task_succeeded(result)
+    finally:
+      self.__on_background_task_finished()
+
+
+  def __on_worker_failed(self, error_message):
+    self.__progress_bar.done()
+    self.__on_background_task_finished()
+    self.__show_messages([error_message], "Error:")
+
+
+  def __on_worker_cancelled(self):
+    self.__progress_bar.done()
+    self.__on_background_task_finished()
+
+
+  def __on_background_task_finished(self):
+    self.__progress_bar.set_cancel_callback(None)
+    self.__on_background_task_succeeded = None
+    self.__worker = None
+    if self.__step_queue.is_empty():
+      self.__set_data_editing_enabled(True)
+
+
+  def __on_step_queue_empty(self):
+    if not self.__worker:
+      self.__set_data_editing_enabled(True)
+
+
+  def __set_data_editing_enabled(self, enabled):
+    self.menuBar().setEnabled(enabled)
+    self.__data_panel.setEnabled(enabled)
+    self.__props_panel.setEnabled(enabled)
 
 
   def __show_messages(self, messages, title):
@@ -165,7 +250,7 @@ class MainWindow(QtWidgets.QMainWindow):
       # Take the first file name and extract the folder from it
       self.__load_files_folder = os.path.split(file_names[0][0])[0]
       # Load the files
-      self.__project_io.load_files(file_names[0], self.__data_container, self.__viewer3d)
+      self.__load_files(file_names[0])
 
 
   def __on_import_folder(self):
@@ -178,7 +263,12 @@ class MainWindow(QtWidgets.QMainWindow):
       for file_name in os.listdir(folder_name):
         full_file_names.append(folder_name + "/" + file_name) # works on Windows too
       # Load the files. The data_container will notify its observers that new data was loaded.
-      self.__project_io.load_files(full_file_names, self.__data_container, self.__viewer3d)
+      self.__load_files(full_file_names)
+
+
+  def __load_files(self, file_names):
+    self.__run_in_background(lambda progress_bar: self.__project_io.read_files(file_names, progress_bar),
+      lambda brain_regions: self.__project_io.show_files(brain_regions, self.__data_container, self.__viewer3d))
 
 
   def __on_save_project(self):
@@ -219,11 +309,19 @@ class MainWindow(QtWidgets.QMainWindow):
     conn_mat_file_name = QtWidgets.QFileDialog.getOpenFileName(self, "Import a connectivity matrix", self.__connectivity_matrix_folder, r"CSV Files (*.csv)")[0]
     if conn_mat_file_name:
       self.__connectivity_matrix_folder = os.path.split(conn_mat_file_name)[0]
-      # Load the connectivity matrix
+      # Load the connectivity matrix and create the neural network in the background
       conn_mat_io = ConnectivityMatrixIO()
-      error_messages = conn_mat_io.load_matrix(conn_mat_file_name, self.__brain, self.__progress_bar)
-      if error_messages:
-        self.__show_messages(error_messages, "Error(s) while creating the neural network:")
+      self.__run_in_background(lambda progress_bar: conn_mat_io.read_matrix(conn_mat_file_name, self.__brain, progress_bar),
+        self.__show_neural_network)
+
+
+  def __show_neural_network(self, neural_network):
+    neuron_groups, neural_connections, error_messages = neural_network
+    # Add the neurons and connections one chunk per event loop tick (see __show_project())
+    self.__step_queue.add(self.__brain.add_neurons_in_steps(neuron_groups, self.__progress_bar))
+    self.__step_queue.add(self.__brain.add_neural_connections_in_steps(neural_connections, self.__progress_bar))
+    if error_messages:
+      self.__step_queue.add(self.__show_messages_step(error_messages, "Error(s) while creating the neural network:"))
 
 
   def __load_config_file(self):
@@ -274,6 +372,10 @@ class MainWindow(QtWidgets.QMainWindow):
     if reply == QtWidgets.QMessageBox.Yes:
       # Save some info (like the folder of the current project and other stuff) to a config file (to have it for next time)
       self.__update_config_file()
+      # Stop the background work (if any)
+      if self.__worker:
+        self.__worker.cancel()
+        self.__worker.wait()
       event.accept()
     else:
       event.ignore()
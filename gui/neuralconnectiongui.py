@@ -3,7 +3,7 @@ from bio.neuralconnection import NeuralConnection
 from PyQt5 import QtGui, QtWidgets, QtCore
 
 class NeuralConnectionGUI(QtWidgets.QGroupBox):
-  def __init__(self, data_container):
+  def __init__(self, data_container, brain):
     if not isinstance(data_container, DataContainer):
       raise TypeError("the data container has the wrong type")
 
@@ -11,46 +11,124 @@ class NeuralConnectionGUI(QtWidgets.QGroupBox):
 
     # Register yourself as an observer
     self.__data_container = data_container
-    self.__data_container.add_observer(self)
+    self.__data_container.subscribe(DataContainer.change_is_new_selection, self.__update)
+    self.__data_container.subscribe(DataContainer.change_is_new_data, lambda data: self.__update_threshold_slider())
+    self.__data_container.subscribe(DataContainer.change_is_deleted_models, lambda data: self.__update_threshold_slider())
+    # This guy filters and aggregates the connections
+    self.__brain = brain
+
+    # The resolution of the weight threshold slider
+    self.__num_slider_steps = 1000
 
     # CREATE THE GUI ELEMENTS
     self.__name_label = QtWidgets.QLabel("name:")
     self.__name_value = QtWidgets.QLabel("")
     self.__weight_label = QtWidgets.QLabel("weight:")
     self.__weight_value = QtWidgets.QLabel("")
+    # The weight threshold slider (connections with a smaller absolute weight are hidden)
+    self.__threshold_value = QtWidgets.QLabel("0")
+    self.__threshold_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+    self.__threshold_slider.setMinimum(0)
+    self.__threshold_slider.setMaximum(self.__num_slider_steps)
+    self.__threshold_slider.setSingleStep(1)
+    self.__threshold_slider.valueChanged.connect(self.__on_threshold_slider_value_changed)
+    self.__threshold_slider.sliderReleased.connect(self.__apply_threshold)
+    # Don't filter the connections on every slider step but once the user stopped moving the slider for a moment
+    # (or released it)
+    self.__threshold_timer = QtCore.QTimer()
+    self.__threshold_timer.setSingleShot(True)
+    self.__threshold_timer.setInterval(200)
+    self.__threshold_timer.timeout.connect(self.__apply_threshold)
+    # Show the neural connections or the region-aggregated connectivity
+    self.__view_modes = [("neural connections", None), ("region bundles (sum)", "sum"), ("region bundles (mean)", "mean")]
+    self.__view_mode_combo_box = QtWidgets.QComboBox()
+    for view_mode in self.__view_modes:
+      self.__view_mode_combo_box.addItem(view_mode[0])
+    self.__view_mode_combo_box.currentIndexChanged.connect(self.__on_view_mode_changed)
 
     # ADD THE GUI ELEMENTS TO A LAYOUT
-    layout = QtWidgets.QGridLayout()
-    layout.addWidget(self.__name_label, 0, 0, 1, 1, QtCore.Qt.AlignLeft)
-    layout.addWidget(self.__name_value, 0, 1, 1, 1, QtCore.Qt.AlignLeft)
-    layout.addWidget(self.__weight_label, 1, 0, 1, 1, QtCore.Qt.AlignLeft)
-    layout.addWidget(self.__weight_value, 1, 1, 1, 1, QtCore.Qt.AlignLeft)
+    # The properties of a single selected connection
+    props_layout = QtWidgets.QGridLayout()
+    props_layout.addWidget(self.__name_label, 0, 0, 1, 1, QtCore.Qt.AlignLeft)
+    props_layout.addWidget(self.__name_value, 0, 1, 1, 1, QtCore.Qt.AlignLeft)
+    props_layout.addWidget(self.__weight_label, 1, 0, 1, 1, QtCore.Qt.AlignLeft)
+    props_layout.addWidget(self.__weight_value, 1, 1, 1, 1, QtCore.Qt.AlignLeft)
+    self.__props_frame = QtWidgets.QFrame()
+    self.__props_frame.setLayout(props_layout)
+    # The weight threshold (applies to all connections)
+    threshold_layout = QtWidgets.QGridLayout()
+    threshold_layout.addWidget(QtWidgets.QLabel("min. |weight|:"), 0, 0, 1, 1, QtCore.Qt.AlignLeft)
+    threshold_layout.addWidget(self.__threshold_value, 0, 1, 1, 1, QtCore.Qt.AlignLeft)
+    threshold_layout.addWidget(self.__threshold_slider, 1, 0, 1, -1)
+    threshold_layout.addWidget(QtWidgets.QLabel("show:"), 2, 0, 1, 1, QtCore.Qt.AlignLeft)
+    threshold_layout.addWidget(self.__view_mode_combo_box, 2, 1, 1, 1)
+    threshold_frame = QtWidgets.QFrame()
+    threshold_frame.setLayout(threshold_layout)
+
+    layout = QtWidgets.QVBoxLayout()
+    layout.addWidget(self.__props_frame)
+    layout.addWidget(threshold_frame)
     self.setLayout(layout)
+    self.__props_frame.hide()
     self.hide()
 
 
-  def observable_changed(self, change, data):
-    # Decide what to do depending on the change
-    if change == DataContainer.change_is_new_selection:
-      self.__update(data)
-
-
   def __update(self, data):
-    naural_connections = list()
+    # Get the selected neural connection(s)
+    neural_connections = self.__data_container.get_selected_models_of_type(NeuralConnection)
 
-    # Collect the neural connections
-    for item in data:
-      if isinstance(item, NeuralConnection):
-        naural_connections.append(item)
-    
     # We can deal with a single neural connection
-    if len(naural_connections) != 1:
-      self.hide()
+    if len(neural_connections) != 1:
+      self.__props_frame.hide()
       return
 
     # Update the GUI elements
-    self.__name_value.setText(naural_connections[0].name)
-    self.__weight_value.setText(str(naural_connections[0].weight))
+    neural_connection = neural_connections[0]
+    self.__name_value.setText(neural_connection.name)
+    self.__weight_value.setText(str(neural_connection.weight))
 
     # Show this GUI element to the user
+    self.__props_frame.show()
     self.show()
+
+
+  def __update_threshold_slider(self):
+    max_abs_weight = self.__brain.get_max_abs_neural_connection_weight()
+    # Show the threshold slider only if there are connections to filter
+    if max_abs_weight <= 0.0:
+      self.hide()
+      return
+
+    # Move the slider to the current threshold without calling the slider callback
+    threshold = min(self.__brain.get_neural_connection_weight_threshold(), max_abs_weight)
+    self.__threshold_timer.stop()
+    self.__threshold_slider.blockSignals(True)
+    self.__threshold_slider.setValue(int(round(self.__num_slider_steps*threshold / max_abs_weight)))
+    self.__threshold_slider.blockSignals(False)
+    self.__threshold_value.setText(str(round(threshold, 3)))
+    # Show the current view mode (the user may have deleted the region bundles)
+    view_mode_index = [view_mode[1] for view_mode in self.__view_modes].index(self.__brain.get_region_connectivity_mode())
+    self.__view_mode_combo_box.blockSignals(True)
+    self.__view_mode_combo_box.setCurrentIndex(view_mode_index)
+    self.__view_mode_combo_box.blockSignals(False)
+    self.show()
+
+
+  def __get_slider_threshold(self):
+    return self.__threshold_slider.value()*self.__brain.get_max_abs_neural_connection_weight() / self.__num_slider_steps
+
+
+  def __on_threshold_slider_value_changed(self, value):
+    # Show the new value right away but (re)start the timer, see __apply_threshold()
+    self.__threshold_value.setText(str(round(self.__get_slider_threshold(), 3)))
+    self.__threshold_timer.start()
+
+
+  def __apply_threshold(self):
+    self.__threshold_timer.stop()
+    # Let the brain hide the connections below the threshold
+    self.__brain.set_neural_connection_weight_threshold(self.__get_slider_threshold())
+
+
+  def __on_view_mode_changed(self, index):
+    self.__brain.set_region_connectivity_mode(self.__view_modes[index][1])
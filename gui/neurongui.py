@@ -11,7 +11,7 @@ class NeuronGUI(QtWidgets.QGroupBox):
 
     # Register yourself as an observer
     self.__data_container = data_container
-    self.__data_container.add_observer(self)
+    self.__data_container.subscribe(DataContainer.change_is_new_selection, self.__update)
 
     # CREATE THE GUI ELEMENTS
     self.__name_label = QtWidgets.QLabel("name:")
@@ -29,28 +29,19 @@ class NeuronGUI(QtWidgets.QGroupBox):
     self.hide()
 
 
-  def observable_changed(self, change, data):
-    # Decide what to do depending on the change
-    if change == DataContainer.change_is_new_selection:
-      self.__update(data)
-
-
   def __update(self, data):
-    neurons = list()
+    # Get the selected neuron(s)
+    neurons = self.__data_container.get_selected_models_of_type(Neuron)
 
-    # Collect the neuron(s)    
-    for item in data:
-      if isinstance(item, Neuron):
-        neurons.append(item)
-    
     # We can deal with a single neuron
     if len(neurons) != 1:
       self.hide()
       return
 
     # Update the GUI elements
-    self.__name_value.setText(neurons[0].name)
-    self.__threshold_value.setText(str(round(neurons[0].threshold, 3)))
+    neuron = next(iter(neurons))
+    self.__name_value.setText(neuron.name)
+    self.__threshold_value.setText(str(round(neuron.threshold, 3)))
 
     # Show this GUI element to the user
     self.show()
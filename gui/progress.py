@@ -15,11 +15,17 @@ class ProgressBarFrame(ProgressBar):
     self.__progress_bar = QtWidgets.QProgressBar()
     # The guy who explains what is going on
     self.__description_label = QtWidgets.QLabel("")
+    # The guy who cancels the operation (shown only if it can be cancelled, see set_cancel_callback())
+    self.__cancel_button = QtWidgets.QPushButton("Cancel")
+    self.__cancel_button.clicked.connect(self.__on_cancel_button_clicked)
+    self.__cancel_button.hide()
+    self.__cancel_callback = None
 
     # The layout
     layout = QtWidgets.QHBoxLayout()
     layout.addWidget(self.__description_label)
     layout.addWidget(self.__progress_bar)
+    layout.addWidget(self.__cancel_button)
     # The window to be shown
     self.__dialog = QtWidgets.QFrame(self.__parent_window, QtCore.Qt.Window | QtCore.Qt.CustomizeWindowHint)
     self.__dialog.setLayout(layout)
@@ -42,20 +48,37 @@ class ProgressBarFrame(ProgressBar):
     left = parent_rect.left() + 0.5*(1.0 - width_frac)*parent_rect.width()
     top = parent_rect.top() + 0.5*parent_rect.height() - 0.5*height
 
-    self.__qt_app.processEvents()
     self.__dialog.setGeometry(left, top, width, height)
     self.__dialog.show()
-    self.__qt_app.processEvents()
 
 
   def set_progress(self, k):
     """Inherited from parent class."""
     self.__progress_bar.setValue(k)
+    # Only repaint the frame. Processing the events here would let the user interact with the GUI while the
+    # caller is in the middle of changing the data. The GUI stays responsive anyway: the tasks which run in a
+    # Worker report their progress with queued signals and the models are added one chunk per event loop tick
+    # (see StepQueue).
     self.__dialog.repaint()
-    self.__qt_app.processEvents()
 
 
   def done(self):
     """Inherited from parent class."""
     self.__dialog.close()
     self.__description_label.setText("")
+
+
+  def set_cancel_callback(self, callback):
+    """'callback' gets called (without arguments) when the user clicks the cancel button. The button is shown
+    only if there is a callback, i.e., call this method with None once the operation can not be cancelled."""
+    self.__cancel_callback = callback
+    self.__cancel_button.setEnabled(True)
+    self.__cancel_button.setVisible(callback is not None)
+
+
+  def __on_cancel_button_clicked(self):
+    # Once is enough
+    self.__cancel_button.setEnabled(False)
+    self.__description_label.setText("Cancelling...")
+    if self.__cancel_callback:
+      self.__cancel_callback()
@@ -9,7 +9,7 @@ class PropsPanel(QtWidgets.QDockWidget):
   """This is the dock widget for the properties of a selected models(s). It has a list showing the
   selected models and specialized GUI elements which show the properties of polygonal and volume
   models."""
-  def __init__(self, data_container):
+  def __init__(self, data_container, brain):
     if not isinstance(data_container, DataContainer):
       raise TypeError("the data container has the wrong type")
 
@@ -18,7 +18,7 @@ class PropsPanel(QtWidgets.QDockWidget):
 
     # Register yourself as an observer
     self.__data_container = data_container
-    self.__data_container.add_observer(self)
+    self.__data_container.subscribe(DataContainer.change_is_new_selection, self.__update)
 
     # The selection list with its label
     self.__selection_list_label = QtWidgets.QLabel("no selected objects")
@@ -35,7 +35,7 @@ class PropsPanel(QtWidgets.QDockWidget):
     # The GUIs for the brain regions, neurons, neural connections, ...
     dock_layout.addWidget(NeuronGUI(self.__data_container))
     dock_layout.addWidget(BrainRegionGUI(self.__data_container))
-    dock_layout.addWidget(NeuralConnectionGUI(self.__data_container))
+    dock_layout.addWidget(NeuralConnectionGUI(self.__data_container, brain))
     
     # Group everything in a frame
     dock_frame = QtWidgets.QFrame()
@@ -44,12 +44,6 @@ class PropsPanel(QtWidgets.QDockWidget):
     self.setWidget(dock_frame)
 
 
-  def observable_changed(self, change, data):
-    # Decide what to the depending on the change
-    if change == DataContainer.change_is_new_selection:
-      self.__update(data)
-
-
   def __update(self, models):
     # Update the label above the qt list widget
     num_models = len(models)
@@ -0,0 +1,52 @@
+import collections
+from PyQt5 import QtCore
+
+#==================================================================================================
+# StepQueue =======================================================================================
+#==================================================================================================
+class StepQueue:
+  """Runs work which has to be done in the GUI thread (e.g., adding many models to the data container) without
+  freezing the GUI. The work comes as iterators: each call of next() does one step, e.g., adds one chunk of
+  models (see Brain.add_neurons_in_steps()). The queue does one step per tick of the Qt event loop (using
+  QTimer.singleShot(0)), so the GUI handles the user input and renders the scene between the steps. The
+  iterators run one after the other in the order they were added."""
+  def __init__(self, on_empty = None, on_failed = None):
+    """'on_empty' gets called (without arguments) once the last iterator is done. 'on_failed' gets called with
+    the error message if a step raises an exception. The remaining steps of that iterator are dropped."""
+    self.__iterators = collections.deque()
+    self.__is_step_scheduled = False
+    self.__on_empty = on_empty
+    self.__on_failed = on_failed
+
+
+  def add(self, iterator):
+    self.__iterators.append(iter(iterator))
+    self.__schedule_step()
+
+
+  def is_empty(self):
+    return len(self.__iterators) == 0
+
+
+  def __schedule_step(self):
+    # One step per tick, no matter how many iterators we have
+    if not self.__is_step_scheduled:
+      self.__is_step_scheduled = True
+      QtCore.QTimer.singleShot(0, self.__do_step)
+
+
+  def __do_step(self):
+    self.__is_step_scheduled = False
+    try:
+      next(self.__iterators[0])
+    except StopIteration:
+      self.__iterators.popleft()
+    except Exception as error:
+      self.__iterators.popleft()
+      if self.__on_failed:
+        self.__on_failed(str(error))
+
+    if self.__iterators:
+      self.__schedule_step()
+    elif self.__on_empty:
+      self.__on_empty()
@@ -1,20 +1,36 @@
 import vtk
-from core.progress import ProgressBar
+import numpy as np
+from PyQt5 import QtCore
+from core.settings import Settings
 from gui.vtkqgl import VTKQGLWidget
+from vis.vtkbatch import VtkBatchItem, VtkBatchSet
+from vis.connectionlod import ConnectionLOD
 
 class VtkWidget(VTKQGLWidget):
-  def __init__(self, parent_qt_frame, progress_bar):
+  def __init__(self, parent_qt_frame):
     super().__init__(parent_qt_frame)
-    # This one indicates the progress of computationally heavy tasks
-    self.__progress_bar = progress_bar
 
     # The observers of this guy
     self.__observers = list()
 
+    # All render requests made within one event loop tick are handled by a single render (see request_render())
+    self.__is_render_pending = False
+    self.__is_reset_clipping_range_pending = False
+    self.__is_reset_camera_pending = False
+
     # The render window
     #self.renderer.SetBackground(0.4, 0.41, 0.42)
     self.renderer.SetBackground(1.0, 1.0, 1.0)
     self.enable_depthpeeling()
+    # This is the full quality (see __on_start_interaction())
+    self.__still_max_number_of_peels = self.renderer.GetMaximumNumberOfPeels()
+    self.__is_reduced_quality = False
+    self.interactor.SetDesiredUpdateRate(Settings.interactive_frame_rate)
+    # Before each frame, update the neurons and connections (see VtkBatchModel) and decide which connections
+    # are close enough to be rendered with arrowheads
+    self.__batches = VtkBatchSet()
+    self.__connection_lod = ConnectionLOD()
+    self.renderer.AddObserver("StartEvent", self.__on_render_start)
     
     self.__interactor_style = vtk.vtkInteractorStyleTrackballCamera()
     self.__interactor_style.AddObserver("KeyReleaseEvent", self.__on_key_released)
@@ -23,12 +39,23 @@ class VtkWidget(VTKQGLWidget):
     self.__interactor_style.AddObserver("RightButtonPressEvent", self.__on_right_button_pressed)
     self.__interactor_style.AddObserver("RightButtonReleaseEvent", self.__on_right_button_released)
     self.__interactor_style.AddObserver("MouseMoveEvent", self.__on_mouse_moved)
+    self.__interactor_style.AddObserver("StartInteractionEvent", self.__on_start_interaction)
+    self.__interactor_style.AddObserver("EndInteractionEvent", self.__on_end_interaction)
     self.interactor.SetInteractorStyle(self.__interactor_style)
 
     # This guy is very important: it handles all the model selection in the 3D view
     self.__prop3d_picker = vtk.vtkPropPicker()
     self.interactor.SetPicker(self.__prop3d_picker)
     self.__perform_prop3d_picking = True
+    # Finds the picked cell of a prop (e.g., the picked connection of the actor which renders all connections)
+    self.__cell_picker = vtk.vtkCellPicker()
+    self.__cell_picker.SetTolerance(0.005)
+    self.__cell_picker.PickFromListOn()
+
+    # The rubber band for selecting everything in a rectangle (shift + left mouse button drag)
+    self.__rubber_band_start = None
+    self.__rubber_band_actor = self.__create_rubber_band_actor()
+    self.renderer.AddActor2D(self.__rubber_band_actor)
 
     # We want to see xyz axes in the lower left corner of the window
     lower_left_axes_actor = vtk.vtkAxesActor()
@@ -49,6 +76,32 @@ class VtkWidget(VTKQGLWidget):
     self.__observers.append(observer)
 
 
+  def __on_render_start(self, renderer, data):
+    self.__batches.update()
+    self.__connection_lod.update(renderer, self.__batches)
+
+
+  def __on_start_interaction(self, interactor_style, data):
+    """The user started rotating, panning or zooming. If the last (full quality) frame was too slow for
+    the desired frame rate, we switch to cheaper settings until the interaction stops. Note that the
+    interactor style sets the desired update rate of the render window (which makes the brain regions
+    switch to their coarse meshes if necessary)."""
+    if self.renderer.GetLastRenderTimeInSeconds() <= 1.0 / Settings.interactive_frame_rate:
+      return
+    self.__is_reduced_quality = True
+    self.renderer.SetMaximumNumberOfPeels(Settings.interactive_max_number_of_peels)
+    self.__connection_lod.set_arrowheads_enabled(False)
+
+
+  def __on_end_interaction(self, interactor_style, data):
+    """Back to full quality. The interactor style renders the final frame right after this call."""
+    if not self.__is_reduced_quality:
+      return
+    self.__is_reduced_quality = False
+    self.renderer.SetMaximumNumberOfPeels(self.__still_max_number_of_peels)
+    self.__connection_lod.set_arrowheads_enabled(True)
+
+
   def __on_key_released(self, interactor, data):
     if data == "KeyReleaseEvent":
       key = self.interactor.GetKeySym()
@@ -59,7 +112,74 @@ class VtkWidget(VTKQGLWidget):
           pass
 
 
+  def __create_rubber_band_actor(self):
+    # A closed line through the four corners of the rectangle (see __update_rubber_band())
+    points = vtk.vtkPoints()
+    points.SetNumberOfPoints(4)
+    lines = vtk.vtkCellArray()
+    lines.InsertNextCell(5)
+    for i in (0, 1, 2, 3, 0):
+      lines.InsertCellPoint(i)
+    poly_data = vtk.vtkPolyData()
+    poly_data.SetPoints(points)
+    poly_data.SetLines(lines)
+    mapper = vtk.vtkPolyDataMapper2D()
+    mapper.SetInputData(poly_data)
+    actor = vtk.vtkActor2D()
+    actor.SetMapper(mapper)
+    actor.GetProperty().SetColor(0.2, 0.4, 1.0)
+    actor.VisibilityOff()
+    return actor
+
+
+  def __update_rubber_band(self):
+    x0, y0 = self.__rubber_band_start
+    x1, y1 = self.interactor.GetEventPosition()
+    points = self.__rubber_band_actor.GetMapper().GetInput().GetPoints()
+    for i, (x, y) in enumerate(((x0, y0), (x1, y0), (x1, y1), (x0, y1))):
+      points.SetPoint(i, x, y, 0)
+    points.Modified()
+    self.request_render()
+
+
+  def __finish_rubber_band(self):
+    """Hides the rubber band and reports the rectangle (in view coordinates, see get_world_to_view_matrix()) to
+    the observers."""
+    x0, y0 = self.__rubber_band_start
+    x1, y1 = self.interactor.GetEventPosition()
+    self.__rubber_band_start = None
+    self.__rubber_band_actor.VisibilityOff()
+    self.request_render()
+
+    # Display (pixel) to view coordinates
+    width, height = self.renderer.GetSize()
+    origin_x, origin_y = self.renderer.GetOrigin()
+    to_view_x = lambda x: 2.0*(x - origin_x)/max(width, 1) - 1.0
+    to_view_y = lambda y: 2.0*(y - origin_y)/max(height, 1) - 1.0
+    rectangle = (to_view_x(min(x0, x1)), to_view_y(min(y0, y1)), to_view_x(max(x0, x1)), to_view_y(max(y0, y1)))
+
+    for observer in self.__observers:
+      try:
+        observer.on_area_selected(self, self.get_world_to_view_matrix(), rectangle)
+      except AttributeError:
+        pass
+
+
+  def get_world_to_view_matrix(self):
+    """Returns the 4x4 matrix (a NumPy array) which maps homogeneous world coordinates to the homogeneous view
+    coordinates of the current camera. After dividing by w, the visible points have x, y and z in [-1, 1]."""
+    vtk_matrix = self.renderer.GetActiveCamera().GetCompositeProjectionTransformMatrix(self.renderer.GetTiledAspectRatio(), -1, 1)
+    return np.array([[vtk_matrix.GetElement(i, j) for j in range(4)] for i in range(4)])
+
+
   def __on_left_button_pressed(self, interactor, data):
+    # Shift + left button starts the rubber band (instead of panning)
+    if self.is_shift_key_pressed():
+      self.__rubber_band_start = self.interactor.GetEventPosition()
+      self.__update_rubber_band()
+      self.__rubber_band_actor.VisibilityOn()
+      return
+
     for observer in self.__observers:
       try:
         observer.on_left_button_pressed(self)
@@ -70,6 +190,10 @@ class VtkWidget(VTKQGLWidget):
 
 
   def __on_left_button_released(self, interactor, data):
+    if self.__rubber_band_start:
+      self.__finish_rubber_band()
+      return
+
     # First, report the left button release event
     for observer in self.__observers:
       try:
@@ -102,6 +226,10 @@ class VtkWidget(VTKQGLWidget):
 
 
   def __on_mouse_moved(self, interactor, data):
+    if self.__rubber_band_start:
+      self.__update_rubber_band()
+      return
+
     for observer in self.__observers:
       try:
         observer.on_mouse_moved(self)
@@ -122,6 +250,18 @@ class VtkWidget(VTKQGLWidget):
     return self.__prop3d_picker.GetProp3D()
 
 
+  def pick_cell(self, prop3d):
+    """Returns the id of the cell of 'prop3d' at the position of the last pick() or -1 if there is none."""
+    renderer = self.interactor.GetRenderWindow().GetRenderers().GetFirstRenderer()
+    xy_pick_pos = self.interactor.GetEventPosition()
+    # Look at 'prop3d' only
+    self.__cell_picker.InitializePickList()
+    self.__cell_picker.AddPickList(prop3d)
+    if not self.__cell_picker.Pick(xy_pick_pos[0], xy_pick_pos[1], 0, renderer):
+      return -1
+    return self.__cell_picker.GetCellId()
+
+
   def is_ctrl_key_pressed(self):
     return self.interactor.GetControlKey() != 0
 
@@ -131,60 +271,85 @@ class VtkWidget(VTKQGLWidget):
 
 
   def add_models(self, models):
+    """Adds the models to the renderer. This is cheap (the VTK objects already exist), so large amounts of
+    models are added in chunks by the loaders which report the progress and let the GUI render in between."""
     if not models:
       return
 
-    # Tell the user we are busy
-    self.__progress_bar.init(1, len(models), "Adding models to 3D renderer: ")
-    counter = 0
-
-    # Add data to the renderer and to the internal dictionary
+    # Add data to the renderer
+    batch_items = list()
     for model in models:
-      counter += 1
-      # We need a data item with a prop3d
+      # We need a data item with a visual representation
       try:
-        prop3d = model.visual_representation.prop3d
+        vis_rep = model.visual_representation
       except AttributeError:
         pass
       else:
-        self.renderer.AddActor(prop3d)
-
-      # Update the progress bar
-      self.__progress_bar.set_progress(counter)
+        vis_rep.add_yourself(self.renderer, self.interactor)
+        if isinstance(vis_rep, VtkBatchItem):
+          batch_items.append(vis_rep)
+    self.__batches.add(batch_items)
 
     # Update the 3d view
     self.reset_clipping_range()
-    # We are done
-    self.__progress_bar.done()
 
 
   def delete_models(self, models):
+    batch_items = list()
     for model in models:
-      try: # we can handle only data items that are pickable, i.e., that have a visual representation with a prop3d
-        prop3d = model.visual_representation.prop3d
+      try: # we can handle only data items that have a visual representation
+        vis_rep = model.visual_representation
       except AttributeError:
         pass
       else:
-        self.renderer.RemoveActor(prop3d)
+        vis_rep.remove_yourself(self.renderer, self.interactor)
+        if isinstance(vis_rep, VtkBatchItem):
+          batch_items.append(vis_rep)
+    self.__batches.remove(batch_items)
     # Update the 3d view
     self.reset_clipping_range()
 
 
   def render(self):
-    """Renders the scene"""
-    self.render_window_interactor.Render()
+    """Renders the scene (at the end of the current event loop tick, see request_render())."""
+    self.request_render()
 
 
   def reset_clipping_range(self):
-    """Resets the clipping range of the camera and renders the scene"""
-    self.renderer.ResetCameraClippingRange()
-    self.render_window_interactor.Render()
+    """Resets the clipping range of the camera and renders the scene (at the end of the current event loop tick)."""
+    self.request_render(reset_clipping_range = True)
 
 
   def reset_view(self):
-    """Modifies the camera such that all (visible) data items are in the viewing frustum."""
-    self.renderer.ResetCamera()
-    self.renderer.ResetCameraClippingRange()
+    """Modifies the camera such that all (visible) data items are in the viewing frustum (at the end of the
+    current event loop tick)."""
+    self.request_render(reset_camera = True)
+
+
+  def request_render(self, reset_clipping_range = False, reset_camera = False):
+    """Schedules a render. All requests made before control returns to the Qt event loop are merged into a
+    single render, and the camera (clipping range) is reset at most once, no matter how many components
+    requested it."""
+    self.__is_reset_clipping_range_pending = self.__is_reset_clipping_range_pending or reset_clipping_range
+    self.__is_reset_camera_pending = self.__is_reset_camera_pending or reset_camera
+    if not self.__is_render_pending:
+      self.__is_render_pending = True
+      QtCore.QTimer.singleShot(0, self.__process_render_request)
+
+
+  def __process_render_request(self):
+    # Reset the state first (rendering may lead to new requests)
+    reset_camera = self.__is_reset_camera_pending
+    reset_clipping_range = reset_camera or self.__is_reset_clipping_range_pending
+    self.__is_render_pending = False
+    self.__is_reset_clipping_range_pending = False
+    self.__is_reset_camera_pending = False
+
+    # Each of these computes the bounds of all visible props
+    if reset_camera:
+      self.renderer.ResetCamera()
+    if reset_clipping_range:
+      self.renderer.ResetCameraClippingRange()
     self.render_window_interactor.Render()
 
 
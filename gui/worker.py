@@ -0,0 +1,96 @@
+import threading
+from core.progress import ProgressBar, OperationCancelled
+from PyQt5 import QtCore
+
+#==================================================================================================
+# WorkerProgressBar ===============================================================================
+#==================================================================================================
+class WorkerProgressBar(ProgressBar):
+  """This is the progress bar the task of a Worker gets. It runs in the worker thread and forwards the
+  progress to the GUI thread using the signals of the worker. Once the user cancelled the task, init()
+  and set_progress() raise OperationCancelled."""
+  def __init__(self, worker):
+    self.__worker = worker
+
+
+  def init(self, range_min, range_max, description = None):
+    """Inherited from parent class."""
+    self.__worker.raise_if_cancelled()
+    self.__worker.progress_initialized.emit(range_min, range_max, description if description else "")
+
+
+  def set_progress(self, k):
+    """Inherited from parent class."""
+    self.__worker.raise_if_cancelled()
+    self.__worker.progress_changed.emit(k)
+
+
+  def done(self):
+    """Inherited from parent class."""
+    self.__worker.progress_done.emit()
+
+
+#==================================================================================================
+# Worker ==========================================================================================
+#==================================================================================================
+class Worker(QtCore.QThread):
+  """Runs task(progress_bar) in its own thread, such that the GUI stays responsive. The task must not touch
+  the data container or any Qt widget (it should only build stuff, e.g., with Brain.build_neurons()). Its
+  result is delivered to the GUI thread with one of the signals 'succeeded' (with the result), 'failed'
+  (with the error message) or 'cancelled'. The progress of the task is shown by 'progress_bar' (a ProgressBar
+  living in the GUI thread)."""
+  progress_initialized = QtCore.pyqtSignal(int, int, str)
+  progress_changed = QtCore.pyqtSignal(int)
+  progress_done = QtCore.pyqtSignal()
+  succeeded = QtCore.pyqtSignal(object)
+  failed = QtCore.pyqtSignal(str)
+  cancelled = QtCore.pyqtSignal()
+
+  def __init__(self, task, progress_bar, parent = None):
+    super().__init__(parent)
+    self.__task = task
+    self.__progress_bar = progress_bar
+    self.__cancel_event = threading.Event()
+
+    # This object lives in the GUI thread, so these are queued connections (the signals are emitted in the worker thread)
+    self.progress_initialized.connect(self.__on_progress_initialized)
+    self.progress_changed.connect(self.__on_progress_changed)
+    self.progress_done.connect(self.__on_progress_done)
+
+
+  def cancel(self):
+    """Asks the task to stop. It does so the next time it reports its progress."""
+    self.__cancel_event.set()
+
+
+  def is_cancelled(self):
+    return self.__cancel_event.is_set()
+
+
+  def raise_if_cancelled(self):
+    if self.__cancel_event.is_set():
+      raise OperationCancelled()
+
+
+  def run(self):
+    """Inherited from QThread. Runs in the worker thread."""
+    try:
+      result = self.__task(WorkerProgressBar(self))
+    except OperationCancelled:
+      self.cancelled.emit()
+    except Exception as error:
+      self.failed.emit(str(error))
+    else:
+      self.succeeded.emit(result)
+
+
+  def __on_progress_initialized(self, range_min, range_max, description):
+    self.__progress_bar.init(range_min, range_max, description)
+
+
+  def __on_progress_changed(self, k):
+    self.__progress_bar.set_progress(k)
+
+
+  def __on_progress_done(self):
+    self.__progress_bar.done()
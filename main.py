@@ -3,10 +3,14 @@ from gui.mainwin import MainWindow
 from bio.brain import Brain
 from core.datacontainer import DataContainer
 from core.controller import Controller
+from core.observable import Observable
+from gui.dispatcher import MainThreadDispatcher
 from PyQt5 import QtCore, QtWidgets
 
 if __name__ == "__main__":
   app = QtWidgets.QApplication(sys.argv)
+  # Models may change in worker threads but the observers always get notified in this (the main) thread
+  Observable.set_notification_dispatcher(MainThreadDispatcher())
   data_container = DataContainer()
   brain = Brain(data_container)
   controller = Controller(data_container, brain)
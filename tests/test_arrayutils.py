@@ -0,0 +1,28 @@
+import unittest
+import numpy as np
+from core.arrayutils import concatenate_ranges
+
+class ConcatenateRangesTest(unittest.TestCase):
+  def test_matches_concatenated_aranges(self):
+    starts = np.array([3, 10, 0, 7])
+    ends = np.array([6, 12, 1, 7])
+    expected = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+    self.assertEqual(concatenate_ranges(starts, ends).tolist(), expected.tolist())
+
+
+  def test_empty_ranges(self):
+    self.assertEqual(concatenate_ranges(np.array([4, 4]), np.array([4, 4])).tolist(), [])
+    self.assertEqual(concatenate_ranges(np.array([2, 5, 5, 0]), np.array([2, 5, 7, 0])).tolist(), [5, 6])
+    self.assertEqual(concatenate_ranges(np.zeros(0, dtype = int), np.zeros(0, dtype = int)).size, 0)
+
+
+  def test_random_ranges(self):
+    rng = np.random.RandomState(0)
+    starts = rng.randint(0, 100, 200)
+    ends = starts + rng.randint(0, 5, 200)
+    expected = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+    self.assertEqual(concatenate_ranges(starts, ends).tolist(), expected.tolist())
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import numpy as np
+from core.datacontainer import DataContainer
+from bio.brainregion import BrainRegion
+from bio.networkstore import NeuronStore, ConnectionStore
+try:
+  from bio.brain import Brain
+  from vis.visneuron import VisNeurons
+  from vis.visneuralconnection import VisNeuralConnections
+except ImportError: # no VTK
+  Brain = None
+
+@unittest.skipIf(Brain is None, "VTK is not installed")
+class BrainTest(unittest.TestCase):
+  def setUp(self):
+    self.data_container = DataContainer()
+    self.brain = Brain(self.data_container)
+    self.data_container.add_data([BrainRegion("A", None), BrainRegion("B", None)])
+
+    neuron_store = NeuronStore()
+    neuron_store.set_visual_representation(VisNeurons(neuron_store))
+    # Two neurons in A, two in B and one without a brain region
+    self.neurons = [neuron_store.add("a0", (0, 0, 0), 0.5, "A"), neuron_store.add("a1", (0.5, 0.5, 0), 0.5, "A"),
+      neuron_store.add("b0", (2, 0, 0), 0.5, "B"), neuron_store.add("b1", (2, 2, 0), 0.5, "B"),
+      neuron_store.add("x", (-0.5, 0, 0), 0.5)]
+    self.brain.add_neurons([self.neurons])
+
+    connection_store = ConnectionStore(neuron_store)
+    connection_store.set_visual_representation(VisNeuralConnections(connection_store))
+    a0, a1, b0, b1, x = self.neurons
+    self.neural_connections = [connection_store.add(src, tar, weight) for src, tar, weight in
+      ((a0, b0, 1.0), (a1, b1, 2.0), (b0, a0, -3.0), (a0, a1, 4.0), (x, b0, 5.0))]
+    self.brain.add_neural_connections(self.neural_connections)
+
+
+  def get_region_connectivity_matrices(self):
+    return self.brain._Brain__get_region_connectivity_matrices()
+
+
+  def test_region_connectivity_matrices(self):
+    brain_regions, weight_sums, counts = self.get_region_connectivity_matrices()
+    self.assertEqual([brain_region.name for brain_region in brain_regions], ["A", "B"])
+    # The connection from the neuron without a brain region is ignored
+    np.testing.assert_array_equal(weight_sums, [[4.0, 3.0], [-3.0, 0.0]])
+    np.testing.assert_array_equal(counts, [[1, 2], [1, 0]])
+
+
+  def test_region_connectivity_matrices_follow_deletions(self):
+    self.get_region_connectivity_matrices()
+    self.data_container.delete_models([self.neural_connections[0]])
+    brain_regions, weight_sums, counts = self.get_region_connectivity_matrices()
+    np.testing.assert_array_equal(weight_sums, [[4.0, 2.0], [-3.0, 0.0]])
+    np.testing.assert_array_equal(counts, [[1, 1], [1, 0]])
+
+    self.data_container.delete_models([brain_regions[0]])
+    brain_regions, weight_sums, counts = self.get_region_connectivity_matrices()
+    self.assertEqual([brain_region.name for brain_region in brain_regions], ["B"])
+    np.testing.assert_array_equal(counts, [[0]])
+
+
+  def test_neighbours(self):
+    a0, a1, b0, b1, x = self.neurons
+    nc_a0_b0, nc_a1_b1, nc_b0_a0, nc_a0_a1, nc_x_b0 = self.neural_connections
+    neighbours, neural_connections = self.brain.get_neighbours([a0], direction = "out")
+    self.assertEqual(set(neighbours), {a1, b0})
+    self.assertEqual(set(neural_connections), {nc_a0_b0, nc_a0_a1})
+    neighbours, neural_connections = self.brain.get_neighbours([a0], direction = "in")
+    self.assertEqual(set(neighbours), {b0})
+    self.assertEqual(set(neural_connections), {nc_b0_a0})
+    neighbours, neural_connections = self.brain.get_neighbours([a0], num_hops = 2)
+    self.assertEqual(set(neighbours), {a1, b0, b1, x})
+    self.assertEqual(set(neural_connections), set(self.neural_connections))
+    with self.assertRaises(ValueError):
+      self.brain.get_neighbours([a0], direction = "up")
+
+
+  def test_neighbours_skip_deleted_neurons(self):
+    a0, a1, b0, b1, x = self.neurons
+    self.data_container.delete_models([b0])
+    neighbours, neural_connections = self.brain.get_neighbours([a0], num_hops = 3)
+    self.assertEqual(set(neighbours), {a1, b1})
+    self.assertEqual(set(neural_connections), {self.neural_connections[1], self.neural_connections[3]})
+
+
+  def test_models_in_view_rectangle(self):
+    a0, a1, b0, b1, x = self.neurons
+    nc_a0_a1 = self.neural_connections[3]
+    neurons, neural_connections = self.brain.get_models_in_view_rectangle(np.identity(4), (-1, -1, 1, 1))
+    self.assertEqual(set(neurons), {a0, a1, x})
+    self.assertEqual(neural_connections, [nc_a0_a1])
+    # Hidden and deleted models are skipped
+    a1.visual_representation.visibility_off()
+    nc_a0_a1.visual_representation.visibility_off()
+    self.data_container.delete_models([x])
+    neurons, neural_connections = self.brain.get_models_in_view_rectangle(np.identity(4), (-1, -1, 1, 1))
+    self.assertEqual(neurons, [a0])
+    self.assertEqual(neural_connections, [])
+
+
+  def test_models_behind_the_camera_are_not_in_view_rectangle(self):
+    neurons, neural_connections = self.brain.get_models_in_view_rectangle(np.diag([1.0, 1.0, 1.0, -1.0]), (-10, -10, 10, 10))
+    self.assertEqual((neurons, neural_connections), ([], []))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,80 @@
+import math
+import unittest
+import numpy as np
+from core.settings import Settings
+from vis.connectionlod import ConnectionLOD
+
+class FakeCamera:
+  def __init__(self, parallel_projection = False, parallel_scale = 1.0):
+    self.parallel_projection = parallel_projection
+    self.parallel_scale = parallel_scale
+
+  def GetParallelProjection(self):
+    return self.parallel_projection
+
+  def GetParallelScale(self):
+    return self.parallel_scale
+
+  def GetViewAngle(self):
+    return 30.0
+
+  def GetPosition(self):
+    return (0.0, 0.0, 0.0)
+
+
+class FakeRenderer:
+  def __init__(self, camera):
+    self.camera = camera
+
+  def GetActiveCamera(self):
+    return self.camera
+
+  def GetSize(self):
+    return (800, 500)
+
+
+class FakeConnectionBatch:
+  def __init__(self, positions):
+    self.arrowhead_positions = np.asarray(positions, dtype = float)
+    self.arrowhead_visibility = None
+
+  def set_arrowhead_visibility(self, show):
+    self.arrowhead_visibility = show.tolist()
+
+
+class ConnectionLODTest(unittest.TestCase):
+  def setUp(self):
+    self.lod = ConnectionLOD()
+    # The distance at which the arrowhead of the perspective camera gets too small
+    pixels_at_distance_one = Settings.neural_connection_cone_length*500/(2.0*math.tan(math.radians(15.0)))
+    self.max_dist = pixels_at_distance_one/Settings.neural_connection_arrowhead_min_pixels
+    self.batch = FakeConnectionBatch([(0.5*self.max_dist, 0, 0), (0, 0.99*self.max_dist, 0), (0, 0, 1.01*self.max_dist)])
+
+
+  def test_perspective_camera_shows_the_close_arrowheads(self):
+    self.lod.update(FakeRenderer(FakeCamera()), [self.batch])
+    self.assertEqual(self.batch.arrowhead_visibility, [True, True, False])
+
+
+  def test_parallel_camera_shows_all_or_no_arrowheads(self):
+    self.lod.update(FakeRenderer(FakeCamera(True, 10.0)), [self.batch])
+    self.assertEqual(self.batch.arrowhead_visibility, [True, True, True])
+    self.lod.update(FakeRenderer(FakeCamera(True, 1e6)), [self.batch])
+    self.assertEqual(self.batch.arrowhead_visibility, [False, False, False])
+
+
+  def test_disabled_arrowheads(self):
+    self.lod.set_arrowheads_enabled(False)
+    self.lod.update(FakeRenderer(FakeCamera()), [self.batch])
+    self.assertEqual(self.batch.arrowhead_visibility, [False, False, False])
+
+
+  def test_other_batches_are_skipped(self):
+    # A batch without arrowheads (e.g., the neurons) and an empty batch of connections
+    empty_batch = FakeConnectionBatch(np.zeros((0, 3)))
+    self.lod.update(FakeRenderer(FakeCamera()), [object(), empty_batch])
+    self.assertEqual(empty_batch.arrowhead_visibility, [])
+
+
+if __name__ == "__main__":
+  unittest.main()
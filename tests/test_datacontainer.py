@@ -0,0 +1,165 @@
+import unittest
+from core.datacontainer import DataContainer
+
+class Model:
+  def __init__(self, name):
+    self.name = name
+
+
+class Region(Model):
+  pass
+
+
+class SubRegion(Region):
+  pass
+
+
+class ChangeRecorder:
+  def __init__(self):
+    self.changes = list()
+
+  def observable_changed(self, change, data):
+    self.changes.append((change, data))
+
+
+class DataContainerBatchTest(unittest.TestCase):
+  def setUp(self):
+    self.data_container = DataContainer()
+    self.models = [Model(str(i)) for i in range(4)]
+    self.data_container.add_data(self.models[:2])
+    self.recorder = ChangeRecorder()
+    self.data_container.add_observer(self.recorder)
+
+
+  def test_changes_are_merged_at_the_end_of_the_outermost_batch(self):
+    with self.data_container.batch():
+      self.data_container.add_data(self.models[2:3])
+      with self.data_container.batch():
+        self.data_container.add_data(self.models[3:])
+        self.data_container.add_to_selection(self.models[3])
+      self.assertEqual(self.recorder.changes, [])
+      self.data_container.delete_models(self.models[:1])
+
+    self.assertEqual([change for change, data in self.recorder.changes],
+      [DataContainer.change_is_new_data, DataContainer.change_is_new_selection, DataContainer.change_is_deleted_models])
+    changes = dict(self.recorder.changes)
+    self.assertEqual(changes[DataContainer.change_is_new_data], self.models[2:])
+    self.assertEqual(changes[DataContainer.change_is_deleted_models], self.models[:1])
+
+
+  def test_batched_selection_is_the_net_change(self):
+    self.data_container.set_selection(self.models[:1])
+    del self.recorder.changes[:]
+    with self.data_container.batch():
+      self.data_container.add_to_selection(self.models[1])
+      self.data_container.remove_from_selection(self.models[0])
+      self.data_container.add_to_selection(self.models[0])
+      self.data_container.remove_from_selection(self.models[1])
+
+    self.assertEqual(len(self.recorder.changes), 1)
+    change, selection = self.recorder.changes[0]
+    self.assertEqual(change, DataContainer.change_is_new_selection)
+    self.assertEqual(selection, {self.models[0]})
+    self.assertEqual(selection.added, set())
+    self.assertEqual(selection.removed, set())
+
+
+  def test_batch_without_changes_notifies_nobody(self):
+    with self.data_container.batch():
+      pass
+    self.assertEqual(self.recorder.changes, [])
+
+
+class SelectionTest(unittest.TestCase):
+  def setUp(self):
+    self.data_container = DataContainer()
+    self.models = [Model(str(i)) for i in range(3)]
+    self.data_container.add_data(self.models)
+    self.selections = list()
+    self.data_container.subscribe(DataContainer.change_is_new_selection, self.selections.append)
+
+
+  def test_add_to_and_remove_from_selection(self):
+    a, b, c = self.models
+    self.data_container.add_to_selection(a)
+    self.data_container.add_to_selection(b)
+    self.data_container.add_to_selection(b)
+    self.data_container.remove_from_selection(a)
+    self.data_container.remove_from_selection(c)
+    # Selecting a selected model and deselecting a non-selected one change nothing
+    self.assertEqual(len(self.selections), 3)
+    self.assertEqual(self.selections[1], {a, b})
+    self.assertEqual(self.selections[1].added, {b})
+    self.assertEqual(self.selections[2], {b})
+    self.assertEqual(self.selections[2].added, set())
+    self.assertEqual(self.selections[2].removed, {a})
+
+
+  def test_set_and_invert_selection(self):
+    a, b, c = self.models
+    self.data_container.set_selection([a, b])
+    self.data_container.set_selection([b, c])
+    self.assertEqual(self.selections[-1].added, {c})
+    self.assertEqual(self.selections[-1].removed, {a})
+    self.data_container.invert_model_selection()
+    self.assertEqual(self.selections[-1], {a})
+    self.assertEqual(self.selections[-1].added, {a})
+    self.assertEqual(self.selections[-1].removed, {b, c})
+
+
+  def test_deleted_models_leave_the_selection(self):
+    a, b, c = self.models
+    self.data_container.set_selection([a, b])
+    self.data_container.delete_models([b, c])
+    self.assertEqual(self.selections[-1], {a})
+    self.assertEqual(self.selections[-1].removed, {b})
+    self.data_container.clear()
+    self.assertEqual(self.selections[-1], set())
+    self.assertEqual(self.selections[-1].removed, {a})
+
+
+class TypeIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.data_container = DataContainer()
+    self.model, self.region, self.sub_region = Model("m"), Region("r"), SubRegion("s")
+    self.data_container.add_data([self.model, self.region, self.sub_region])
+
+
+  def test_models_are_found_by_each_of_their_types(self):
+    self.assertEqual(set(self.data_container.get_models_of_type(Model)), {self.model, self.region, self.sub_region})
+    self.assertEqual(set(self.data_container.get_models_of_type(Region)), {self.region, self.sub_region})
+    self.assertEqual(self.data_container.get_models_of_type(SubRegion), [self.sub_region])
+    self.assertEqual(self.data_container.get_models_of_type(int), [])
+
+
+  def test_selected_models_by_type(self):
+    self.data_container.set_selection([self.model, self.sub_region])
+    self.assertEqual(self.data_container.get_selected_models_of_type(Region), [self.sub_region])
+    self.assertEqual(set(self.data_container.get_selected_model_types()), {Model, SubRegion})
+    self.data_container.add_to_selection(self.region)
+    self.data_container.remove_from_selection(self.sub_region)
+    self.assertEqual(self.data_container.get_selected_models_of_type(Region), [self.region])
+    self.assertEqual(set(self.data_container.get_selected_model_types()), {Model, Region})
+    self.data_container.invert_model_selection()
+    self.assertEqual(self.data_container.get_selected_model_types(), [SubRegion])
+
+
+  def test_deleted_models_leave_the_index(self):
+    self.data_container.set_selection([self.region, self.sub_region])
+    self.data_container.delete_models([self.sub_region])
+    self.assertEqual(self.data_container.get_models_of_type(Region), [self.region])
+    self.assertEqual(self.data_container.get_selected_models_of_type(SubRegion), [])
+    self.assertEqual(self.data_container.get_selected_model_types(), [Region])
+    self.data_container.clear()
+    self.assertEqual(self.data_container.get_models_of_type(Model), [])
+    self.assertEqual(self.data_container.get_selected_model_types(), [])
+
+
+  def test_queries_return_snapshots(self):
+    regions = self.data_container.get_models_of_type(Region)
+    self.data_container.delete_models(regions)
+    self.assertEqual(len(regions), 2)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from generators.insidemask import InsideMask
+
+class SphereShell:
+  """Stands in for a MeshGeometry: the space between two concentric spheres, intersected with the z rays
+  analytically."""
+  center = np.array([0.3, 0.7, 0.1])
+  outer_radius = 10.0
+  inner_radius = 4.0
+
+  def __init__(self):
+    c, r = self.center, self.outer_radius
+    self.bounding_box = (c[0] - r, c[0] + r, c[1] - r, c[1] + r, c[2] - r, c[2] + r)
+
+
+  def cast_z_rays(self, xy):
+    squared_distances = np.sum((np.asarray(xy) - self.center[:2])**2, axis = 1)
+    hits = list()
+    for ray_id, d2 in enumerate(squared_distances):
+      if d2 < self.outer_radius**2:
+        z = [-np.sqrt(self.outer_radius**2 - d2), np.sqrt(self.outer_radius**2 - d2)]
+        if d2 < self.inner_radius**2:
+          z[1:1] = [-np.sqrt(self.inner_radius**2 - d2), np.sqrt(self.inner_radius**2 - d2)]
+        hits.extend((ray_id, self.center[2] + dz) for dz in z)
+    ray_ids, z = zip(*hits)
+    return (np.array(ray_ids), np.array(z))
+
+
+  def contains(self, points):
+    distances = np.linalg.norm(points - self.center, axis = 1)
+    return (distances <= self.outer_radius) & (distances >= self.inner_radius)
+
+
+class InsideMaskTest(unittest.TestCase):
+  def setUp(self):
+    self.shell = SphereShell()
+    self.inside_mask = InsideMask.create(self.shell, 16)
+    self.temp_dir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+
+  def test_voxel_centers_inside_the_mesh_are_inside(self):
+    voxel_size = 2*self.shell.outer_radius/16
+    b = self.shell.bounding_box
+    x, y, z = np.meshgrid(*(b[2*i] + (np.arange(16) + 0.5)*voxel_size for i in range(3)), indexing = "ij")
+    centers = np.column_stack((x.ravel(), y.ravel(), z.ravel()))
+    is_inside = self.shell.contains(centers)
+    self.assertEqual(self.inside_mask.inside_voxel_ids.tolist(), np.flatnonzero(is_inside).tolist())
+    np.testing.assert_allclose(self.inside_mask.get_voxel_centers(self.inside_mask.inside_voxel_ids), centers[is_inside])
+    self.assertEqual(self.inside_mask.contains(centers).tolist(), is_inside.tolist())
+    # Points outside of the grid
+    self.assertFalse(self.inside_mask.contains([(100, 0, 0), (0, 0, -100)]).any())
+
+
+  def test_samples_are_inside(self):
+    points = self.inside_mask.sample_points(self.inside_mask.inside_voxel_ids, 1000)
+    self.assertEqual(points.shape, (1000, 3))
+    self.assertTrue(self.inside_mask.contains(points).all())
+
+
+  def create_mesh_file(self):
+    mesh_file_name = os.path.join(self.temp_dir, "mesh.obj")
+    with open(mesh_file_name, "w") as mesh_file:
+      mesh_file.write("# a mesh\n")
+    return mesh_file_name
+
+
+  def test_save_and_load(self):
+    mesh_file_name = self.create_mesh_file()
+    file_name = mesh_file_name + ".insidemask.npz"
+    self.inside_mask.save(file_name, mesh_file_name, self.shell.bounding_box, 16)
+    inside_mask = InsideMask.load(file_name, self.shell.bounding_box, 16)
+    self.assertEqual(inside_mask.inside_voxel_ids.tolist(), self.inside_mask.inside_voxel_ids.tolist())
+    voxel_ids = self.inside_mask.inside_voxel_ids
+    np.testing.assert_allclose(inside_mask.get_voxel_centers(voxel_ids), self.inside_mask.get_voxel_centers(voxel_ids))
+
+
+  def test_outdated_files_are_not_loaded(self):
+    mesh_file_name = self.create_mesh_file()
+    file_name = mesh_file_name + ".insidemask.npz"
+    self.assertIsNone(InsideMask.load(file_name, self.shell.bounding_box, 16))
+    self.inside_mask.save(file_name, mesh_file_name, self.shell.bounding_box, 16)
+    self.assertIsNone(InsideMask.load(file_name, self.shell.bounding_box, 32))
+    self.assertIsNone(InsideMask.load(file_name, (0, 1, 0, 1, 0, 1), 16))
+    # The mesh file changed after the mask was saved
+    mtime = os.path.getmtime(mesh_file_name)
+    os.utime(mesh_file_name, (mtime + 10, mtime + 10))
+    self.assertIsNone(InsideMask.load(file_name, self.shell.bounding_box, 16))
+
+
+  def test_broken_files_are_not_loaded(self):
+    file_name = os.path.join(self.temp_dir, "broken.insidemask.npz")
+    with open(file_name, "w") as mask_file:
+      mask_file.write("not a mask")
+    self.assertIsNone(InsideMask.load(file_name, self.shell.bounding_box, 16))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from core.nameindex import NameIndex
+
+class NameIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.index = NameIndex()
+    for name in ("Neuron_L", "Neuron_R", "Brain Region"):
+      self.index.add(name, name)
+
+
+  def test_regular_expression_escapes_keep_their_case(self):
+    self.assertEqual(self.index.search(r"re:^\S+$"), ["Neuron_L", "Neuron_R"])
+    self.assertEqual(self.index.search(r"re:\W"), ["Brain Region"])
+    self.assertEqual(self.index.search(r"re:_l\Z"), ["Neuron_L"])
+
+
+  def test_regular_expression_ignores_case(self):
+    self.assertEqual(self.index.search("re:^NEURON_r$"), ["Neuron_R"])
+
+
+  def test_substring_and_glob_ignore_case(self):
+    self.assertEqual(self.index.search("REGION"), ["Brain Region"])
+    self.assertEqual(self.index.search("neuron_?"), ["Neuron_L", "Neuron_R"])
+
+
+  def test_matcher_agrees_with_search(self):
+    for query in (r"re:\W", "re:_L$", "neuron_?", "*_r", "brain"):
+      is_match = NameIndex.get_matcher(query)
+      self.assertEqual([name for name in ("Neuron_L", "Neuron_R", "Brain Region") if is_match(name)], self.index.search(query))
+    self.assertIsNone(NameIndex.get_matcher(""))
+
+
+  def test_invalid_regular_expression(self):
+    with self.assertRaises(ValueError):
+      self.index.search("re:(")
+
+
+if __name__ == "__main__":
+  unittest.main()
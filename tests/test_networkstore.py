@@ -0,0 +1,134 @@
+import unittest
+import numpy as np
+from bio.networkstore import NeuronStore, ConnectionStore
+
+class StoreIdentityTest(unittest.TestCase):
+  def setUp(self):
+    self.neuron_store = NeuronStore()
+    self.a = self.neuron_store.add("a", (0, 0, 0), 0.5, "region")
+    self.b = self.neuron_store.add("b", (1, 0, 0), 0.25)
+    self.connection_store = ConnectionStore(self.neuron_store)
+    self.nc = self.connection_store.add(self.a, self.b, 2.0)
+
+
+  def test_handles_are_equal_if_they_refer_to_the_same_row(self):
+    self.assertEqual(self.neuron_store.find("a"), self.a)
+    self.assertEqual(self.neuron_store.get_neuron(np.int64(1)), self.b)
+    self.assertNotEqual(self.a, self.b)
+    self.assertEqual(len({self.a, self.neuron_store.get_neuron(0), self.b}), 2)
+    self.assertEqual(self.connection_store.find(self.a.id, self.b.id), self.nc)
+    self.assertEqual(self.connection_store.get_neural_connections(), [self.nc])
+    # The same row in another store is another neuron
+    other_store = NeuronStore()
+    self.assertNotEqual(other_store.add("a", (0, 0, 0), 0.5), self.a)
+
+
+  def test_handles_read_the_store(self):
+    self.assertEqual((self.a.id, self.b.id), (0, 1))
+    self.assertEqual(self.b.position, (1.0, 0.0, 0.0))
+    self.assertEqual(self.a.brain_region_name, "region")
+    self.assertIsNone(self.b.brain_region_name)
+    self.b.set_threshold(0.75)
+    self.assertEqual(self.neuron_store.find("b").threshold, 0.75)
+    self.assertEqual(self.connection_store.get_name(self.nc.id), "a -> b")
+    self.assertEqual(self.connection_store.get_weight(self.nc.id), 2.0)
+
+
+  def test_a_pair_of_neurons_has_one_connection(self):
+    with self.assertRaises(ValueError):
+      self.connection_store.add(self.a, self.b, 1.0)
+    self.assertIsNone(self.connection_store.find(self.b.id, self.a.id))
+
+
+  def test_removed_models_are_not_found(self):
+    self.assertTrue(self.connection_store.remove(self.nc))
+    self.assertFalse(self.connection_store.remove(self.nc))
+    self.assertIsNone(self.connection_store.find(self.a.id, self.b.id))
+    self.assertTrue(self.neuron_store.remove(self.a))
+    self.assertIsNone(self.neuron_store.find("a"))
+    self.assertEqual(self.neuron_store.get_neurons(), [self.b])
+    # The rows do not change
+    self.assertEqual(len(self.neuron_store), 2)
+    self.assertEqual(self.neuron_store.find("b").id, 1)
+
+
+class ConnectionStoreVisibilityTest(unittest.TestCase):
+  def setUp(self):
+    self.neuron_store = NeuronStore()
+    neurons = [self.neuron_store.add("n" + str(i), (i, 0, 0), 0.5) for i in range(4)]
+    self.store = ConnectionStore(self.neuron_store)
+    for i in range(3):
+      self.store.add(neurons[i], neurons[i + 1], i + 1.0)
+
+
+  def test_new_connections_are_shown(self):
+    self.assertTrue(self.store.is_shown.all())
+    self.assertEqual(self.store.is_shown.size, 3)
+
+
+  def test_set_shown_takes_rows_arrays_and_slices(self):
+    self.store.set_shown(1, False)
+    self.assertEqual(self.store.is_shown.tolist(), [True, False, True])
+    self.store.set_shown(np.array([0, 1]), np.array([False, True]))
+    self.assertEqual(self.store.is_shown.tolist(), [False, True, True])
+    self.store.set_shown(slice(None, len(self.store)), self.store.weights >= 3.0)
+    self.assertEqual(self.store.is_shown.tolist(), [False, False, True])
+
+
+  def test_version_changes(self):
+    version = self.store.version
+    self.store.set_shown(0, False)
+    self.assertGreater(self.store.version, version)
+    version = self.store.version
+    self.store.add(self.neuron_store.find("n3"), self.neuron_store.find("n0"), 1.0)
+    self.assertGreater(self.store.version, version)
+    version = self.store.version
+    self.store.remove(self.store.get_neural_connection(3))
+    self.assertGreater(self.store.version, version)
+    self.assertFalse(self.store.is_shown[3])
+
+
+  def test_visual_representation_is_optional(self):
+    self.assertIsNone(self.store.get_visual_representation(0))
+
+
+class AdjacencyIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.neuron_store = NeuronStore()
+    self.neurons = [self.neuron_store.add("n" + str(i), (i, 0, 0), 0.5) for i in range(20)]
+    self.store = ConnectionStore(self.neuron_store)
+    rng = np.random.RandomState(0)
+    for src_id, tar_id in set(zip(rng.randint(0, 20, 100), rng.randint(0, 20, 100))):
+      self.store.add(self.neurons[src_id], self.neurons[tar_id], 1.0)
+
+
+  def check_against_brute_force(self, neuron_ids):
+    is_alive = self.store.is_alive
+    outgoing = np.flatnonzero(is_alive & np.isin(self.store.src_ids, neuron_ids))
+    incoming = np.flatnonzero(is_alive & np.isin(self.store.tar_ids, neuron_ids))
+    self.assertEqual(sorted(self.store.get_outgoing_connection_ids(neuron_ids).tolist()), outgoing.tolist())
+    self.assertEqual(sorted(self.store.get_incoming_connection_ids(neuron_ids).tolist()), incoming.tolist())
+
+
+  def test_queries_match_brute_force(self):
+    for neuron_ids in ([0], [3, 7, 19], list(range(20)), []):
+      self.check_against_brute_force(np.array(neuron_ids, dtype = int))
+
+
+  def test_indices_follow_new_neurons_and_connections(self):
+    self.check_against_brute_force(np.array([1, 2]))
+    new_neuron = self.neuron_store.add("new", (0, 1, 0), 0.5)
+    self.store.add(new_neuron, self.neurons[1], 1.0)
+    self.store.add(self.neurons[2], new_neuron, 1.0)
+    self.check_against_brute_force(np.array([1, 2, new_neuron.id]))
+
+
+  def test_dead_connections_are_skipped(self):
+    self.check_against_brute_force(np.arange(20))
+    for row in range(0, len(self.store), 3):
+      self.store.remove(self.store.get_neural_connection(row))
+    self.check_against_brute_force(np.arange(20))
+
+
+if __name__ == "__main__":
+  unittest.main()
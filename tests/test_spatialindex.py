@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from bio.networkstore import NeuronStore
+from bio.spatialindex import SpatialIndex
+
+class SpatialIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.rng = np.random.RandomState(0)
+    self.store = NeuronStore()
+    self.add_neurons(self.rng.uniform(-100, 100, (2000, 3)))
+    self.index = SpatialIndex(self.store)
+
+
+  def add_neurons(self, positions):
+    for p in positions:
+      self.store.add("n" + str(len(self.store)), p, 0.5)
+
+
+  def check_against_brute_force(self):
+    positions = self.store.positions
+    is_alive = self.store.is_alive
+    for min_corner, max_corner in (((-20, -30, -40), (10, 20, 30)), ((-200, -200, -200), (200, 200, 200)), ((150, 0, 0), (160, 10, 10))):
+      is_inside = is_alive & np.all((positions >= min_corner) & (positions <= max_corner), axis = 1)
+      self.assertEqual(sorted(self.index.get_ids_in_box(min_corner, max_corner).tolist()), np.flatnonzero(is_inside).tolist())
+    for center, radius in (((0, 0, 0), 25.0), ((90, -90, 90), 40.0), ((0, 0, 0), 1000.0), ((500, 0, 0), 1.0)):
+      is_inside = is_alive & (np.linalg.norm(positions - center, axis = 1) <= radius)
+      self.assertEqual(sorted(self.index.get_ids_in_sphere(center, radius).tolist()), np.flatnonzero(is_inside).tolist())
+    for point, k in (((0, 0, 0), 1), ((50, 50, -50), 10), ((300, 300, 300), 5)):
+      distances = np.where(is_alive, np.linalg.norm(positions - point, axis = 1), np.inf)
+      self.assertEqual(self.index.get_nearest_ids(point, k).tolist(), np.argsort(distances, kind = "stable")[:k].tolist())
+
+
+  def test_queries_match_brute_force(self):
+    self.check_against_brute_force()
+
+
+  def test_pending_neurons_are_found(self):
+    self.check_against_brute_force()
+    # A few neurons inside and outside the grid stay pending, many new ones make the index rebuild the grid
+    self.add_neurons(self.rng.uniform(-300, 300, (100, 3)))
+    self.check_against_brute_force()
+    self.add_neurons(self.rng.uniform(-100, 100, (3000, 3)))
+    self.check_against_brute_force()
+
+
+  def test_dead_neurons_are_skipped(self):
+    for row in range(0, len(self.store), 2):
+      self.store.remove(self.store.get_neuron(row))
+    self.check_against_brute_force()
+    self.assertEqual(self.index.get_nearest_ids((0, 0, 0), 5000).size, 1000)
+
+
+  def test_flat_and_empty_stores(self):
+    self.store = NeuronStore()
+    self.index = SpatialIndex(self.store)
+    self.assertEqual(self.index.get_ids_in_sphere((0, 0, 0), 10.0).size, 0)
+    self.assertEqual(self.index.get_nearest_ids((0, 0, 0), 3).size, 0)
+    # All neurons in the plane z = 0
+    self.add_neurons(np.column_stack((self.rng.uniform(-100, 100, (500, 2)), np.zeros(500))))
+    self.check_against_brute_force()
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import numpy as np
+try:
+  import vtk
+  from generators.symmetricpoints import MeshGeometry
+except ImportError: # no VTK
+  vtk = None
+
+def create_box():
+  """Returns the box [0, 2] x [0, 4] x [0, 6] as vtkPolyData."""
+  cube_source = vtk.vtkCubeSource()
+  cube_source.SetCenter(1, 2, 3)
+  cube_source.SetXLength(2)
+  cube_source.SetYLength(4)
+  cube_source.SetZLength(6)
+  cube_source.Update()
+  return cube_source.GetOutput()
+
+
+class VisualRepresentation:
+  def __init__(self, vtk_poly_data):
+    self.vtk_poly_data = vtk_poly_data
+
+
+class BrainRegion:
+  def __init__(self, vtk_poly_data):
+    self.visual_representation = VisualRepresentation(vtk_poly_data)
+
+
+@unittest.skipIf(vtk is None, "VTK is not installed")
+class MeshGeometryTest(unittest.TestCase):
+  def test_is_up_to_date(self):
+    box = create_box()
+    mesh_geometry = MeshGeometry(box, 0)
+    self.assertTrue(mesh_geometry.is_up_to_date(box, 0))
+    self.assertFalse(mesh_geometry.is_up_to_date(box, 1))
+    self.assertFalse(mesh_geometry.is_up_to_date(create_box(), 0))
+    box.Modified()
+    self.assertFalse(mesh_geometry.is_up_to_date(box, 0))
+
+
+  def test_takes_the_mesh_of_a_brain_region(self):
+    brain_region = BrainRegion(create_box())
+    mesh_geometry = MeshGeometry(brain_region, 2)
+    self.assertIs(mesh_geometry.vtk_mesh, brain_region.visual_representation.vtk_poly_data)
+    self.assertTrue(mesh_geometry.is_up_to_date(brain_region, 2))
+    np.testing.assert_allclose(mesh_geometry.bounding_box, (0, 2, 0, 4, 0, 6))
+
+
+  def test_point_partitioning(self):
+    sphere_source = vtk.vtkSphereSource()
+    sphere_source.SetCenter(1, -2, 3)
+    sphere_source.SetThetaResolution(16)
+    sphere_source.SetPhiResolution(16)
+    sphere_source.Update()
+    for mesh in (create_box(), sphere_source.GetOutput()):
+      for axis in range(3):
+        mesh_geometry = MeshGeometry(mesh, axis)
+        b = mesh_geometry.bounding_box
+        middle = 0.5*(b[2*axis] + b[2*axis + 1])
+        # Split the points one by one
+        points = [mesh.GetPoint(i) for i in range(mesh.GetNumberOfPoints())]
+        left_point_ids = [i for i, p in enumerate(points) if p[axis] > middle]
+        right_point_ids = [i for i, p in enumerate(points) if p[axis] <= middle]
+        self.assertEqual(mesh_geometry.left_point_ids.tolist(), left_point_ids)
+        self.assertEqual(mesh_geometry.right_point_ids.tolist(), right_point_ids)
+        self.assertEqual(mesh_geometry.all_point_ids.tolist(), list(range(len(points))))
+        np.testing.assert_allclose(mesh_geometry.left_target, np.mean([points[i] for i in left_point_ids], axis = 0))
+        np.testing.assert_allclose(mesh_geometry.right_target, np.mean([points[i] for i in right_point_ids], axis = 0))
+        np.testing.assert_allclose(mesh_geometry.central_target, np.mean(points, axis = 0))
+
+
+  def test_z_rays(self):
+    mesh_geometry = MeshGeometry(create_box(), 0)
+    # The last ray goes through the diagonals of the (triangulated) top and bottom faces
+    ray_ids, z = mesh_geometry.cast_z_rays([(1, 1), (0.5, 3), (5, 5), (1.5, 0.5), (1, 2)])
+    self.assertEqual(ray_ids.tolist(), [0, 0, 1, 1, 3, 3, 4, 4])
+    np.testing.assert_allclose(z, [0, 6]*4, atol = 1e-9)
+
+
+  def test_z_rays_through_a_sphere(self):
+    sphere_source = vtk.vtkSphereSource()
+    sphere_source.SetRadius(1)
+    sphere_source.SetThetaResolution(64)
+    sphere_source.SetPhiResolution(64)
+    sphere_source.Update()
+    mesh_geometry = MeshGeometry(sphere_source.GetOutput(), 0)
+    xy = np.random.RandomState(0).uniform(-0.6, 0.6, (100, 2))
+    ray_ids, z = mesh_geometry.cast_z_rays(xy)
+    # Two hits per ray, sorted by z, close to the sphere
+    self.assertEqual(ray_ids.tolist(), np.repeat(np.arange(100), 2).tolist())
+    h = np.sqrt(1 - np.sum(xy**2, axis = 1))
+    np.testing.assert_allclose(z.reshape(-1, 2), np.column_stack((-h, h)), atol = 0.01)
+
+
+  def test_mesh_without_triangles(self):
+    with self.assertRaises(ValueError):
+      MeshGeometry(vtk.vtkPolyData(), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
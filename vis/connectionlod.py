@@ -0,0 +1,46 @@
+import math
+import numpy as np
+from core.settings import Settings
+
+class ConnectionLOD:
+  """Camera-distance based level of detail for neural connections. Connections whose arrowhead would be
+  smaller than Settings.neural_connection_arrowhead_min_pixels on the screen are rendered as plain lines and
+  the closer ones as arrows. The connections are drawn in batches (see VisNeuralConnections) and the level of
+  detail of all connections of a batch is computed at once."""
+  def __init__(self):
+    # If False, all arrowheads are hidden, no matter how close they are
+    self.__arrowheads_enabled = True
+
+
+  def set_arrowheads_enabled(self, value):
+    self.__arrowheads_enabled = value
+
+
+  def update(self, renderer, batches):
+    """Shows or hides the arrowheads of the connection batches among 'batches' (see VtkBatchSet) depending on
+    the current camera of 'renderer'. Call it after updating the batches."""
+    for batch in batches:
+      try:
+        positions = batch.arrowhead_positions
+      except AttributeError: # not a batch of connections
+        continue
+      batch.set_arrowhead_visibility(self.__compute_arrowhead_visibility(renderer, positions))
+
+
+  def __compute_arrowhead_visibility(self, renderer, positions):
+    if not self.__arrowheads_enabled:
+      return np.zeros(len(positions), dtype = bool)
+
+    camera = renderer.GetActiveCamera()
+    viewport_height = max(renderer.GetSize()[1], 1)
+
+    # How many pixels long is the arrowhead (at distance 1 for the perspective camera)?
+    if camera.GetParallelProjection():
+      pixels = Settings.neural_connection_cone_length*viewport_height/(2.0*camera.GetParallelScale())
+      return np.full(len(positions), pixels >= Settings.neural_connection_arrowhead_min_pixels)
+    pixels = Settings.neural_connection_cone_length*viewport_height/(2.0*math.tan(math.radians(0.5*camera.GetViewAngle())))
+
+    # Compare the squared distances to the camera with the largest distance at which the arrowhead is big enough
+    max_dist = pixels/Settings.neural_connection_arrowhead_min_pixels
+    diff = positions - np.array(camera.GetPosition())
+    return np.einsum("ij,ij->i", diff, diff) <= max_dist*max_dist
@@ -0,0 +1,130 @@
+import vtk
+from vis.connectionlod import ConnectionLOD
+from vis.vtkbatch import VtkBatchItem, VtkBatchSet
+
+class OffscreenViewer:
+  """A 3D viewer which renders into an offscreen VTK render window, i.e., it needs neither Qt nor a display.
+  It provides the methods the Controller and the ProjectIO call on the VtkWidget of the GUI and can save the
+  rendered image as a PNG file. It is used for batch rendering (see batch.py)."""
+  def __init__(self, width = 1920, height = 1080):
+    self.__renderer = vtk.vtkRenderer()
+    self.__renderer.SetBackground(1.0, 1.0, 1.0)
+    self.__render_window = vtk.vtkRenderWindow()
+    self.__render_window.SetOffScreenRendering(1)
+    self.__render_window.SetSize(width, height)
+    self.__render_window.AddRenderer(self.__renderer)
+    # Same transparency handling as in the GUI
+    self.__render_window.SetAlphaBitPlanes(True)
+    self.__render_window.SetMultiSamples(0)
+    self.__renderer.SetUseDepthPeeling(True)
+    self.__renderer.SetMaximumNumberOfPeels(4)
+    self.__renderer.SetOcclusionRatio(0.0)
+    # Update the neurons and connections before each frame, arrowheads for the close connections only
+    self.__batches = VtkBatchSet()
+    self.__connection_lod = ConnectionLOD()
+    self.__renderer.AddObserver("StartEvent", self.__on_render_start)
+
+
+  def add_observer(self, observer):
+    """There is no user interaction => nothing to observe."""
+    pass
+
+
+  def __on_render_start(self, renderer, data):
+    self.__batches.update()
+    self.__connection_lod.update(renderer, self.__batches)
+
+
+  def add_models(self, models):
+    batch_items = list()
+    for model in models:
+      try:
+        vis_rep = model.visual_representation
+        prop3d = vis_rep.prop3d
+      except AttributeError:
+        pass
+      else:
+        if isinstance(vis_rep, VtkBatchItem):
+          # All neurons (connections) of a store share one actor (see VtkBatchModel)
+          vis_rep.add_yourself(self.__renderer, None)
+          batch_items.append(vis_rep)
+        else:
+          self.__renderer.AddActor(prop3d)
+    self.__batches.add(batch_items)
+
+
+  def delete_models(self, models):
+    batch_items = list()
+    for model in models:
+      try:
+        vis_rep = model.visual_representation
+        prop3d = vis_rep.prop3d
+      except AttributeError:
+        pass
+      else:
+        if isinstance(vis_rep, VtkBatchItem):
+          # All neurons (connections) of a store share one actor (see VtkBatchModel)
+          vis_rep.remove_yourself(self.__renderer, None)
+          batch_items.append(vis_rep)
+        else:
+          self.__renderer.RemoveActor(prop3d)
+    self.__batches.remove(batch_items)
+
+
+  def render(self):
+    """Nothing is shown, so rendering is postponed until save_screenshot() is called."""
+    pass
+
+
+  def reset_clipping_range(self):
+    self.__renderer.ResetCameraClippingRange()
+
+
+  def reset_view(self):
+    """Modifies the camera such that all (visible) data items are in the viewing frustum."""
+    self.__renderer.ResetCamera()
+    self.__renderer.ResetCameraClippingRange()
+
+
+  def save_screenshot(self, file_name):
+    """Renders the scene and saves the image to 'file_name' (PNG)."""
+    self.__renderer.ResetCameraClippingRange()
+    self.__render_window.Render()
+    window_to_image = vtk.vtkWindowToImageFilter()
+    window_to_image.SetInput(self.__render_window)
+    window_to_image.SetInputBufferTypeToRGB()
+    window_to_image.ReadFrontBufferOff()
+    window_to_image.Update()
+    png_writer = vtk.vtkPNGWriter()
+    png_writer.SetFileName(file_name)
+    png_writer.SetInputConnection(window_to_image.GetOutputPort())
+    png_writer.Write()
+
+
+  def get_camera_position(self):
+    return self.__renderer.GetActiveCamera().GetPosition()
+
+
+  def set_camera_position(self, position):
+    return self.__renderer.GetActiveCamera().SetPosition(position)
+
+
+  def get_camera_look_at(self):
+    return self.__renderer.GetActiveCamera().GetFocalPoint()
+
+
+  def set_camera_look_at(self, look_at):
+    return self.__renderer.GetActiveCamera().SetFocalPoint(look_at)
+
+
+  def get_camera_view_up(self):
+    return self.__renderer.GetActiveCamera().GetViewUp()
+
+
+  def set_camera_view_up(self, view_up):
+    return self.__renderer.GetActiveCamera().SetViewUp(view_up)
+
+
+  @property
+  def renderer(self):
+    return self.__renderer
@@ -1,8 +1,25 @@
+import vtk
 from vis.vtkpoly import VtkPolyModel
 from core.filemodel import FileModel
+from core.settings import Settings
 
 class VisBrainRegion(VtkPolyModel, FileModel):
   def __init__(self, name, vtk_poly_data, file_name):
     # Init the base classes
-    VtkPolyModel.__init__(self, vtk_poly_data, name)
+    VtkPolyModel.__init__(self, vtk_poly_data, name, self.__create_low_res_mesh(vtk_poly_data))
     FileModel.__init__(self, file_name)
+
+
+  def __create_low_res_mesh(self, vtk_poly_data):
+    """Returns a coarse version of 'vtk_poly_data' for interactive rendering or None if the mesh is small."""
+    if vtk_poly_data.GetNumberOfPolys() < Settings.brain_region_lod_min_num_triangles:
+      return None
+    n = Settings.brain_region_lod_num_divisions
+    clustering = vtk.vtkQuadricClustering()
+    clustering.SetInputData(vtk_poly_data)
+    clustering.SetNumberOfDivisions(n, n, n)
+    clustering.AutoAdjustNumberOfDivisionsOn()
+    normals_filter = vtk.vtkPolyDataNormals()
+    normals_filter.SetInputConnection(clustering.GetOutputPort())
+    normals_filter.Update()
+    return normals_filter.GetOutput()
@@ -1,93 +1,180 @@
 import vtk
 import math
-import vis.visutils
 import numpy as np
-from vis.vtkpoly import VtkPolyModel
+from vtk.util import numpy_support
+from vis.vtkbatch import VtkBatchItem, VtkBatchModel
 from core.settings import Settings
 
-class VisNeuralConnection(VtkPolyModel):
-  """This class handles the visual representation of a synaptic connection between two neurons or
-  between a neuron and itself (a loop). A connection between two neurons is represented by an arrow (a line
-  with a cone at the end) while a loop is represented by a circle. 'p1' is the starting and 'p2' the end point
-  of the connection. 'p2' is ignored in the case of a loop."""
-  def __init__(self, name, p1, p2, is_loop):
-    # First, create the visual representation
-    if is_loop:
-      vtk_rep = self.__create_vtk_loop_rep(p1)
-    else:
-      vtk_rep = self.__create_vtk_rep(p1, p2)
-
-    # Init the rest
-    VtkPolyModel.__init__(self, vtk_rep, name)
+class VisNeuralConnection(VtkBatchItem):
+  """The visual representation of a single neural connection (see VisNeuralConnections)."""
+  def __init__(self, batch, row):
+    VtkBatchItem.__init__(self, batch, row, "neural connection")
+
+
+#============================================================================================================
+# VisNeuralConnections ======================================================================================
+#============================================================================================================
+class VisNeuralConnections(VtkBatchModel):
+  """Draws all neural connections of a ConnectionStore with a single actor (see VtkBatchModel). A connection
+  between two neurons is a line from the source to the target neuron and a loop (a connection from a neuron
+  to itself) is a circle through the neuron. The lines close enough to the camera get an arrowhead (a cone in
+  front of the target neuron, see ConnectionLOD). The cones are glyphs rendered by a helper actor. Whether a
+  connection is shown is saved in the store (see ConnectionStore.set_shown())."""
+  # The number of line segments of a loop
+  __num_loop_sides = 40
+  # The colors of the connections and of the highlighted ones
+  __rgb = (0, 0, 26)
+  __highlighted_rgb = (77, 77, 255)
+
+  def __init__(self, connection_store):
+    VtkBatchModel.__init__(self, connection_store, "neural connections")
     self.actor.GetProperty().SetLineWidth(2)
+    # The connections have their own (per-cell) colors
+    mapper = self.actor.GetMapper()
+    mapper.SetScalarModeToUseCellFieldData()
+    mapper.SelectColorArray("colors")
+    mapper.SetColorModeToDirectScalars()
+
+    # The rows of the drawn connections: the i-th cell of the poly data is the connection in the row
+    # self.__cell_rows[i]. The lines come first (self.__line_rows), then the loops.
+    self.__cell_rows = np.zeros(0, dtype = np.int64)
+    self.__line_rows = np.zeros(0, dtype = np.int64)
+    # The arrowhead positions (the target neurons) of the lines and the rows of the lines which have an arrowhead
+    self.__arrowhead_positions = np.zeros((0, 3))
+    self.__arrowhead_rows = np.zeros(0, dtype = np.int64)
+
+    # The arrowheads: one cone per point of self.__arrowhead_points, pointing in the direction of the point vector
+    cone_source = vtk.vtkConeSource()
+    cone_source.SetResolution(24)
+    cone_source.SetHeight(Settings.neural_connection_cone_length)
+    cone_source.SetRadius(Settings.neural_connection_cone_radius)
+    self.__arrowhead_points = vtk.vtkPolyData()
+    glyph_filter = vtk.vtkGlyph3D()
+    glyph_filter.SetSourceConnection(cone_source.GetOutputPort())
+    glyph_filter.SetInputData(self.__arrowhead_points)
+    glyph_filter.SetVectorModeToUseVector()
+    glyph_filter.ScalingOff()
+    glyph_filter.SetColorModeToColorByScalar()
+    arrowhead_mapper = vtk.vtkPolyDataMapper()
+    arrowhead_mapper.SetInputConnection(glyph_filter.GetOutputPort())
+    arrowhead_mapper.SetColorModeToDirectScalars()
+    arrowhead_actor = vtk.vtkActor()
+    arrowhead_actor.SetMapper(arrowhead_mapper)
+    # Picking the line is enough
+    arrowhead_actor.PickableOff()
+    self.add_helper_actor(arrowhead_actor)
+
+
+  def get_visual_representation(self, row):
+    return VisNeuralConnection(self, row)
+
+
+  def get_model(self, cell_id):
+    if 0 <= cell_id < self.__cell_rows.size:
+      return self.store.get_neural_connection(self.__cell_rows[cell_id])
+    return None
+
+
+  def is_shown(self, row):
+    return bool(self.store.is_shown[row])
+
+
+  def set_shown(self, row, value):
+    self.store.set_shown(row, value)
+
+
+  def rebuild(self):
+    store = self.store
+    # The drawn connections
+    rows = np.flatnonzero(store.is_alive & store.is_shown & self.is_in_scene)
+    src_ids, tar_ids = store.src_ids[rows], store.tar_ids[rows]
+    is_loop = src_ids == tar_ids
+    self.__line_rows, loop_rows = rows[~is_loop], rows[is_loop]
+    self.__cell_rows = np.concatenate((self.__line_rows, loop_rows))
+    neuron_positions = store.neuron_store.positions
+    self.__arrowhead_positions = neuron_positions[tar_ids[~is_loop]]
+
+    # The points are the neuron positions followed by the points of the loops
+    points = np.concatenate((neuron_positions, self.__create_loop_points(neuron_positions[src_ids[is_loop]])))
+    # The cells in the legacy layout of vtkCellArray: (2, source, target) for each line and (number of point
+    # ids, point ids) for each loop, which is a closed polyline (its first point id is repeated at the end)
+    line_cells = np.column_stack((np.full(self.__line_rows.size, 2), src_ids[~is_loop], tar_ids[~is_loop]))
+    k = self.__num_loop_sides
+    loop_point_ids = neuron_positions.shape[0] + np.arange(loop_rows.size*k).reshape(-1, k)
+    loop_cells = np.column_stack((np.full(loop_rows.size, k + 1), loop_point_ids, loop_point_ids[:, 0]))
+    cells = np.concatenate((line_cells.ravel(), loop_cells.ravel())).astype(np.int64)
 
+    vtk_points = vtk.vtkPoints()
+    vtk_points.SetData(numpy_support.numpy_to_vtk(points, deep = True))
+    vtk_lines = vtk.vtkCellArray()
+    vtk_lines.SetCells(self.__cell_rows.size, numpy_support.numpy_to_vtkIdTypeArray(cells, deep = True))
+    vtk_colors = numpy_support.numpy_to_vtk(self.__get_colors(self.__cell_rows), deep = True, array_type = vtk.VTK_UNSIGNED_CHAR)
+    vtk_colors.SetName("colors")
+    vtk_poly_data = vtk.vtkPolyData()
+    vtk_poly_data.SetPoints(vtk_points)
+    vtk_poly_data.SetLines(vtk_lines)
+    vtk_poly_data.GetCellData().AddArray(vtk_colors)
+    self.actor.GetMapper().SetInputData(vtk_poly_data)
 
-  def on_weight_changed(self, neural_connection):
-    #rgb = vis.visutils.map_to_blue_red_rgb(neural_connection.weight)
-    #self.set_color(rgb[0], rgb[1], rgb[2])
-    self.set_color(0, 0, 0.1)
-
-
-  def __create_vtk_loop_rep(self, p):
-    n = (0, -1/math.sqrt(2), 1/math.sqrt(2))
-    r = Settings.loop_radius
-    vtk_circle_src = vtk.vtkRegularPolygonSource()
-    vtk_circle_src.SetCenter(p[0] + r*n[0], p[1] - r*n[1], p[2] + r*n[2])
-    vtk_circle_src.SetNormal(n)
-    vtk_circle_src.SetRadius(r)
-    vtk_circle_src.GeneratePolygonOff()
-    vtk_circle_src.SetNumberOfSides(40)
-    vtk_circle_src.Update()
-    return vtk_circle_src.GetOutput()
-
+    # Drop the arrowheads of the connections which are not drawn anymore and update the colors of the others
+    self.__set_arrowhead_rows(self.__arrowhead_rows[np.isin(self.__arrowhead_rows, self.__line_rows)])
 
-  def __create_vtk_rep(self, p1, p2):
-    cone = self.__create_cone(p1, p2)
-    line = self.__create_connecting_line(p1, p2)
 
-    append_filter = vtk.vtkAppendPolyData()
-    append_filter.AddInputData(cone);
-    append_filter.AddInputData(line);
-    append_filter.Update()
-    return append_filter.GetOutput()
+  @property
+  def arrowhead_positions(self):
+    """The arrowhead positions (the target neurons) of the drawn lines as an (n, 3) array, see
+    set_arrowhead_visibility()."""
+    return self.__arrowhead_positions
 
 
-  def __create_connecting_line(self, p1, p2):
-    # The positions of the two neurons
-    vtk_points = vtk.vtkPoints()
-    vtk_points.InsertNextPoint(p1[0], p1[1], p1[2])
-    vtk_points.InsertNextPoint(p2[0], p2[1], p2[2])
-    # The VTK ids of the two positions
-    vtk_point_ids = (0, 1)
-    # The connecting line
-    vtk_line = vtk.vtkCellArray()
-    vtk_line.InsertNextCell(2, vtk_point_ids)
-    # Add everything together to a vtkPolyData object
-    vtk_poly_data = vtk.vtkPolyData()
-    vtk_poly_data.SetPoints(vtk_points)
-    vtk_poly_data.SetLines(vtk_line)
-    # Return the connecing line
-    return vtk_poly_data
+  def set_arrowhead_visibility(self, show):
+    """'show' is a bool array which tells for each position in 'arrowhead_positions' whether the line gets an
+    arrowhead. Without the arrowhead, the connection is rendered as a plain line."""
+    rows = self.__line_rows[show]
+    if not np.array_equal(rows, self.__arrowhead_rows):
+      self.__set_arrowhead_rows(rows)
 
 
-  def __create_cone(self, p1, p2):
-    a = np.array([p1[0], p1[1], p1[2]])
-    b = np.array([p2[0], p2[1], p2[2]])
-    d = b - a
-    neuron_dist = np.linalg.norm(d)
+  def __set_arrowhead_rows(self, rows):
+    self.__arrowhead_rows = rows
+    store = self.store
+    neuron_positions = store.neuron_store.positions
+    a = neuron_positions[store.src_ids[rows]]
+    d = neuron_positions[store.tar_ids[rows]] - a
+    neuron_dist = np.linalg.norm(d, axis = 1)
 
-    # The distance from 'a' to the base (start) of the cone
-    dist_to_cone_mid = neuron_dist - 0.95*Settings.neuron_sphere_radius - 0.5*Settings.neural_connection_cone_length
-    dist_to_cone_mid = max(0, dist_to_cone_mid)
+    # The distance from 'a' to the middle of the cone, such that it ends at the sphere of the target neuron
+    dist_to_cone_mid = np.maximum(neuron_dist - 0.95*Settings.neuron_sphere_radius - 0.5*Settings.neural_connection_cone_length, 0)
+    d /= np.maximum(neuron_dist, 1e-12)[:, np.newaxis]
 
-    d /= neuron_dist
-    
-    cone_source = vtk.vtkConeSource()
-    cone_source.SetCenter(a + dist_to_cone_mid*d)
-    cone_source.SetResolution(24)
-    cone_source.SetHeight(Settings.neural_connection_cone_length)
-    cone_source.SetDirection(d)
-    cone_source.SetRadius(Settings.neural_connection_cone_radius)
-    cone_source.Update()
+    vtk_points = vtk.vtkPoints()
+    vtk_points.SetData(numpy_support.numpy_to_vtk(a + dist_to_cone_mid[:, np.newaxis]*d, deep = True))
+    vtk_directions = numpy_support.numpy_to_vtk(d, deep = True)
+    vtk_directions.SetName("directions")
+    vtk_colors = numpy_support.numpy_to_vtk(self.__get_colors(rows), deep = True, array_type = vtk.VTK_UNSIGNED_CHAR)
+    vtk_colors.SetName("colors")
+    self.__arrowhead_points.SetPoints(vtk_points)
+    self.__arrowhead_points.GetPointData().SetVectors(vtk_directions)
+    self.__arrowhead_points.GetPointData().SetScalars(vtk_colors)
+    self.__arrowhead_points.Modified()
+
+
+  def __get_colors(self, rows):
+    """Returns the colors of the connections in the provided rows as an (n, 3) array of bytes."""
+    return np.where(self.is_highlighted[rows, np.newaxis], self.__highlighted_rgb, self.__rgb).astype(np.uint8)
+
+
+  @staticmethod
+  def __create_loop_points(positions):
+    """Returns the points of the loops at the provided neuron positions (an (n, 3) array). Each loop is a circle
+    with radius Settings.loop_radius which passes through its neuron and is perpendicular to (0, -1, 1)."""
+    k = VisNeuralConnections.__num_loop_sides
+    r = Settings.loop_radius
+    a = 1/math.sqrt(2)
+    # Two orthogonal unit vectors in the plane of the circle, the center is at neuron + r*v
+    u = np.array([1.0, 0.0, 0.0])
+    v = np.array([0.0, a, a])
+    angles = 2*math.pi*np.arange(k)/k
+    offsets = r*(np.outer(np.cos(angles), u) + np.outer(1.0 + np.sin(angles), v))
+    return (positions[:, np.newaxis, :] + offsets).reshape(-1, 3)
 
-    return cone_source.GetOutput()
@@ -1,31 +1,91 @@
 import vtk
+import numpy as np
 import vis.visutils
-from vis.vtkpoly import VtkPolyModel
+from vtk.util import numpy_support
+from vis.vtkbatch import VtkBatchItem, VtkBatchModel
+from core.settings import Settings
 
-class VisNeuron(VtkPolyModel):
-  def __init__(self, name, position, sphere_radius):
-    VtkPolyModel.__init__(self, self.__create_vtk_rep(position, sphere_radius), name)
-    self.__sphere_radius = sphere_radius
+class VisNeuron(VtkBatchItem):
+  """The visual representation of a single neuron (see VisNeurons)."""
+  def __init__(self, batch, row):
+    VtkBatchItem.__init__(self, batch, row, "neuron")
 
 
-  def on_threshold_changed(self, neuron):
-    rgb = vis.visutils.map_to_blue_red_rgb(neuron.threshold)
-    self.set_color(rgb[0], rgb[1], rgb[2])
+#============================================================================================================
+# VisNeurons ================================================================================================
+#============================================================================================================
+class VisNeurons(VtkBatchModel):
+  """Draws all neurons of a NeuronStore with a single actor (see VtkBatchModel). Each neuron is a sphere with
+  radius Settings.neuron_sphere_radius whose color depends on the threshold of the neuron. The spheres are
+  glyphs, i.e., the sphere is computed once and copied to the neuron positions. The highlighted neurons get a
+  yellowish color."""
+  __highlight_rgb = np.array([1.0, 0.85, 0.0])
 
+  def __init__(self, neuron_store):
+    VtkBatchModel.__init__(self, neuron_store, "neurons")
+    # The neurons the user has hidden (grows with the store)
+    self.__is_hidden = np.zeros(0, dtype = bool)
+    # The rows of the drawn neurons: the i-th sphere is the neuron in the row self.__point_rows[i]
+    self.__point_rows = np.zeros(0, dtype = np.int64)
 
-  @property
-  def sphere_radius(self):
-    return self.__sphere_radius
-
-
-  def __create_vtk_rep(self, p, sphere_radius):
     vtk_sphere_source = vtk.vtkSphereSource()
     vtk_sphere_source.SetThetaResolution(12)
     vtk_sphere_source.SetPhiResolution(12)
-    vtk_sphere_source.SetRadius(sphere_radius)
-    vtk_sphere_source.SetCenter(p[0], p[1], p[2])
+    vtk_sphere_source.SetRadius(Settings.neuron_sphere_radius)
     vtk_sphere_source.Update()
-    normals_filter = vtk.vtkPolyDataNormals()
-    normals_filter.SetInputData(vtk_sphere_source.GetOutput())
-    normals_filter.Update()
-    return normals_filter.GetOutput()
+    # Each sphere has that many cells in the output of the glyph filter (see get_model())
+    self.__num_cells_per_sphere = vtk_sphere_source.GetOutput().GetNumberOfCells()
+    # One sphere per point of self.__points with the color of the point
+    self.__points = vtk.vtkPolyData()
+    glyph_filter = vtk.vtkGlyph3D()
+    glyph_filter.SetSourceConnection(vtk_sphere_source.GetOutputPort())
+    glyph_filter.SetInputData(self.__points)
+    glyph_filter.OrientOff()
+    glyph_filter.ScalingOff()
+    glyph_filter.SetColorModeToColorByScalar()
+    mapper = self.actor.GetMapper()
+    mapper.SetInputConnection(glyph_filter.GetOutputPort())
+    mapper.SetColorModeToDirectScalars()
+
+
+  def get_visual_representation(self, row):
+    return VisNeuron(self, row)
+
+
+  def get_model(self, cell_id):
+    point_id = cell_id // self.__num_cells_per_sphere
+    if 0 <= point_id < self.__point_rows.size:
+      return self.store.get_neuron(self.__point_rows[point_id])
+    return None
+
+
+  def is_shown(self, row):
+    return not (row < self.__is_hidden.size and self.__is_hidden[row])
+
+
+  def set_shown(self, row, value):
+    if row >= self.__is_hidden.size:
+      self.__is_hidden = np.concatenate((self.__is_hidden, np.zeros(max(row + 1, 2*self.__is_hidden.size, 16) - self.__is_hidden.size, dtype = bool)))
+    self.__is_hidden[row] = not value
+    self.mark_out_of_date()
+
+
+  def rebuild(self):
+    store = self.store
+    n = len(store)
+    is_hidden = np.zeros(n, dtype = bool)
+    is_hidden[:min(n, self.__is_hidden.size)] = self.__is_hidden[:n]
+    self.__point_rows = rows = np.flatnonzero(store.is_alive & ~is_hidden & self.is_in_scene)
+
+    # The color depends on the threshold, the highlighted neurons are mixed with the highlight color
+    rgb = vis.visutils.map_to_blue_red_rgbs(store.thresholds[rows])
+    is_highlighted = self.is_highlighted[rows]
+    rgb[is_highlighted] = 0.5*(rgb[is_highlighted] + self.__highlight_rgb)
+
+    vtk_points = vtk.vtkPoints()
+    vtk_points.SetData(numpy_support.numpy_to_vtk(store.positions[rows], deep = True))
+    vtk_colors = numpy_support.numpy_to_vtk(np.round(255*rgb).astype(np.uint8), deep = True, array_type = vtk.VTK_UNSIGNED_CHAR)
+    vtk_colors.SetName("colors")
+    self.__points.SetPoints(vtk_points)
+    self.__points.GetPointData().SetScalars(vtk_colors)
+    self.__points.Modified()
@@ -0,0 +1,79 @@
+import vtk
+import numpy as np
+import vis.visutils
+from vis.vtkpoly import VtkPolyModel
+from core.settings import Settings
+
+class VisRegionConnectivity(VtkPolyModel):
+  """This class shows the bundles which connect brain regions. Each bundle is a tube from the center of the
+  source to the center of the target region. Its radius depends on the absolute weight of the bundle and its
+  color on the sign of the weight. All bundles are in a single vtkPolyData, i.e., they are rendered by a single
+  actor."""
+  def __init__(self, name):
+    VtkPolyModel.__init__(self, vtk.vtkPolyData(), name)
+    # The bundles have their own (per-cell) colors
+    mapper = self.actor.GetMapper()
+    mapper.SetScalarModeToUseCellFieldData()
+    mapper.SelectColorArray("colors")
+    mapper.SetColorModeToDirectScalars()
+
+
+  def set_bundles(self, start_points, end_points, weights):
+    """Replaces the current bundles by new ones. The i-th bundle goes from start_points[i] to end_points[i]
+    and has the weight weights[i]. All three arguments are NumPy arrays of the same length."""
+    vtk_points = vtk.vtkPoints()
+    vtk_lines = vtk.vtkCellArray()
+    # The tube radius at each point
+    vtk_radii = vtk.vtkDoubleArray()
+    vtk_radii.SetName("radii")
+    # The color of each tube
+    vtk_colors = vtk.vtkUnsignedCharArray()
+    vtk_colors.SetName("colors")
+    vtk_colors.SetNumberOfComponents(3)
+
+    abs_weights = np.abs(weights)
+    max_abs_weight = abs_weights.max() if abs_weights.size else 0.0
+    min_r = Settings.region_bundle_min_radius
+    max_r = Settings.region_bundle_max_radius
+
+    for p1, p2, weight, abs_weight in zip(start_points, end_points, weights, abs_weights):
+      # Shift the tube sideways such that the bundles A -> B and B -> A do not overlap
+      p1, p2 = self.__shift_sideways(p1, p2, max_r)
+      # Scale the radius linearly to [min_r, max_r]
+      radius = min_r + (max_r - min_r)*abs_weight/max_abs_weight if max_abs_weight > 0 else min_r
+      # Add the line
+      vtk_lines.InsertNextCell(2)
+      vtk_lines.InsertCellPoint(vtk_points.InsertNextPoint(p1))
+      vtk_lines.InsertCellPoint(vtk_points.InsertNextPoint(p2))
+      vtk_radii.InsertNextValue(radius)
+      vtk_radii.InsertNextValue(radius)
+      rgb = vis.visutils.map_to_blue_red_rgb(weight)
+      vtk_colors.InsertNextTuple3(255*rgb[0], 255*rgb[1], 255*rgb[2])
+
+    lines = vtk.vtkPolyData()
+    lines.SetPoints(vtk_points)
+    lines.SetLines(vtk_lines)
+    lines.GetPointData().SetScalars(vtk_radii)
+    lines.GetCellData().AddArray(vtk_colors)
+
+    # Turn the lines into tubes
+    tube_filter = vtk.vtkTubeFilter()
+    tube_filter.SetInputData(lines)
+    tube_filter.SetNumberOfSides(12)
+    tube_filter.SetVaryRadiusToVaryRadiusByAbsoluteScalar()
+    tube_filter.CappingOn()
+    tube_filter.Update()
+    self.actor.GetMapper().SetInputData(tube_filter.GetOutput())
+
+
+  def __shift_sideways(self, p1, p2, dist):
+    d = p2 - p1
+    # A direction perpendicular to 'd' which depends on the direction of 'd'
+    side = np.cross(d, (0.0, 0.0, 1.0))
+    if np.linalg.norm(side) < 1e-6*np.linalg.norm(d):
+      side = np.cross(d, (1.0, 0.0, 0.0))
+    norm = np.linalg.norm(side)
+    if norm <= 0.0:
+      return p1, p2
+    side *= dist/norm
+    return p1 + side, p2 + side
@@ -1,5 +1,6 @@
 import vtk
 import math
+import numpy as np
 
 def map_to_blue_red_rgb(value):
   tanh_value = math.tanh(value)
@@ -14,3 +15,13 @@ def map_to_blue_red_rgb(value):
 
   # Convert to RGB
   return vtk.vtkMath.HSVToRGB((hue, sat, 1.0))
+
+
+def map_to_blue_red_rgbs(values):
+  """Same as map_to_blue_red_rgb() for a NumPy array of values. Returns an (n, 3) array. With full value, the
+  HSV to RGB conversion boils down to (1, 1 - sat, 1 - sat) for red and (1 - sat, 1 - 0.6*sat, 1) for blue."""
+  tanh_values = np.tanh(np.asarray(values, dtype = float))
+  sat = np.abs(tanh_values)[:, np.newaxis]
+  red = 1.0 - sat*np.array([0.0, 1.0, 1.0])
+  blue = 1.0 - sat*np.array([1.0, 0.6, 0.0])
+  return np.where(tanh_values[:, np.newaxis] > 0.0, red, blue)
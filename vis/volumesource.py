@@ -0,0 +1,144 @@
+import queue
+import threading
+import collections
+import numpy as np
+from core.settings import Settings
+
+class MemoryMappedVolume:
+  """A 3D image which stays on disk. It is memory mapped and read slice by slice (perpendicular to the z axis),
+  so it can be much larger than the main memory. The most recently used slices are kept in a cache and the
+  neighbours of the requested slices are loaded in a background thread.
+
+  The file is either a NumPy file (.npy) with a 3D array or a raw file. In the latter case, the 'shape' and
+  'dtype' have to be provided. In both cases, the array has to be in z, y, x order (x varies fastest)."""
+  def __init__(self, file_name, shape = None, dtype = None, spacing = (1.0, 1.0, 1.0), origin = (0.0, 0.0, 0.0)):
+    if file_name.lower().endswith(".npy"):
+      self.__array = np.load(file_name, mmap_mode = "r")
+    else:
+      if shape is None or dtype is None:
+        raise ValueError("the shape and the dtype of the raw volume '" + file_name + "' are needed")
+      self.__array = np.memmap(file_name, dtype = dtype, mode = "r", shape = tuple(shape))
+
+    if self.__array.ndim != 3:
+      raise ValueError("'" + file_name + "' does not contain a 3D volume")
+
+    self.__file_name = file_name
+    self.__spacing = tuple(spacing)
+    self.__origin = tuple(origin)
+
+    # The slice cache: a (slice index, 2D array) dictionary which is ordered from least to most recently used
+    self.__cache = collections.OrderedDict()
+    self.__cache_lock = threading.Lock()
+    # The cache has to hold the requested slice and all of its prefetched neighbours, otherwise prefetching
+    # evicts the slices which are needed
+    if Settings.volume_slice_cache_size <= 2*Settings.volume_prefetch_radius:
+      raise ValueError("the slice cache size (" + str(Settings.volume_slice_cache_size) + ") has to be larger than "
+        "twice the prefetch radius (" + str(Settings.volume_prefetch_radius) + ")")
+    # The slice indices the background thread should load
+    self.__prefetch_queue = queue.Queue()
+    self.__prefetch_thread = None
+
+
+  @property
+  def file_name(self):
+    return self.__file_name
+
+
+  @property
+  def dimensions(self):
+    """The number of voxels along x, y and z."""
+    return (self.__array.shape[2], self.__array.shape[1], self.__array.shape[0])
+
+
+  @property
+  def spacing(self):
+    return self.__spacing
+
+
+  @property
+  def origin(self):
+    return self.__origin
+
+
+  @property
+  def dtype(self):
+    return self.__array.dtype
+
+
+  def get_slice(self, index):
+    """Returns the slice with the provided index as a 2D array (y, x). Only this slice is read from disk
+    (unless it is in the cache). Its neighbours are loaded in the background."""
+    slice_data = self.__get_cached_slice(index)
+    if slice_data is None:
+      slice_data = self.__read_slice(index)
+    self.__prefetch_neighbours(index)
+    return slice_data
+
+
+  def close(self):
+    """Stops the background thread and waits for it. Call it once the volume is not shown anymore. It is fine
+    to request slices afterwards (the thread is started again)."""
+    prefetch_thread = self.__prefetch_thread
+    if not prefetch_thread:
+      return
+    self.__prefetch_thread = None
+    self.__drop_pending_prefetches()
+    # This tells the thread to stop
+    self.__prefetch_queue.put(None)
+    prefetch_thread.join()
+
+
+  def __get_cached_slice(self, index):
+    with self.__cache_lock:
+      slice_data = self.__cache.get(index)
+      if slice_data is not None:
+        self.__cache.move_to_end(index)
+      return slice_data
+
+
+  def __read_slice(self, index):
+    # Copy the slice from the memory mapped file to main memory
+    slice_data = np.array(self.__array[index])
+    with self.__cache_lock:
+      self.__cache[index] = slice_data
+      self.__cache.move_to_end(index)
+      # Drop the least recently used slices
+      while len(self.__cache) > Settings.volume_slice_cache_size:
+        self.__cache.popitem(last = False)
+    return slice_data
+
+
+  def __prefetch_neighbours(self, index):
+    # The neighbours of the previously requested slices are not needed anymore (e.g., the user scrolls fast
+    # through the slices), so drop the pending ones instead of reading stale slices
+    self.__drop_pending_prefetches()
+
+    num_slices = self.__array.shape[0]
+    for offset in range(1, Settings.volume_prefetch_radius + 1):
+      for neighbour in (index + offset, index - offset):
+        if 0 <= neighbour < num_slices:
+          self.__prefetch_queue.put(neighbour)
+
+    # Start the background thread the first time we need it
+    if not self.__prefetch_thread:
+      self.__prefetch_thread = threading.Thread(target = self.__prefetch_loop, daemon = True)
+      self.__prefetch_thread.start()
+
+
+  def __drop_pending_prefetches(self):
+    try:
+      while True:
+        self.__prefetch_queue.get_nowait()
+    except queue.Empty:
+      pass
+
+
+  def __prefetch_loop(self):
+    while True:
+      index = self.__prefetch_queue.get()
+      if index is None: # see close()
+        return
+      with self.__cache_lock:
+        is_cached = index in self.__cache
+      if not is_cached:
+        self.__read_slice(index)
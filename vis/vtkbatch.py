@@ -0,0 +1,232 @@
+import abc
+import vtk
+import numpy as np
+from vis.vtkmodel import VtkModel
+from vis.vtkpoly import VtkPolyModel
+
+class VtkBatchItem(VtkModel):
+  """The visual representation of a single item (e.g., a neuron) which is drawn by a VtkBatchModel. This guy is
+  a lightweight handle which knows the batch and the row of the item only (like Neuron and NeuralConnection do
+  with their stores), so it is created on demand and costs no memory as long as nobody asks for it."""
+  def __init__(self, batch, row, name):
+    VtkModel.__init__(self, name)
+    self.__batch = batch
+    self.__row = row
+
+
+  def add_yourself(self, renderer, interactor):
+    self.__batch.add_to_scene(self.__row, renderer)
+
+
+  def remove_yourself(self, renderer, interactor):
+    self.__batch.remove_from_scene(self.__row, renderer)
+
+
+  def is_visible(self):
+    return self.__batch.is_shown(self.__row)
+
+
+  def set_visibility(self, bool_value):
+    self.__batch.set_shown(self.__row, bool(bool_value))
+
+
+  def visibility_on(self):
+    self.set_visibility(True)
+
+
+  def visibility_off(self):
+    self.set_visibility(False)
+
+
+  def toggle_visibility(self):
+    self.set_visibility(not self.is_visible())
+
+
+  def highlight_on(self):
+    self.__batch.set_highlighted(self.__row, True)
+
+
+  def highlight_off(self):
+    self.__batch.set_highlighted(self.__row, False)
+
+
+  @property
+  def batch(self):
+    """The VtkBatchModel which draws this item."""
+    return self.__batch
+
+
+  @property
+  def prop3d(self):
+    """The actor of the batch, i.e., the one which renders all items of the store."""
+    return self.__batch.prop3d
+
+
+#============================================================================================================
+# VtkBatchModel =============================================================================================
+#============================================================================================================
+class VtkBatchModel(VtkPolyModel):
+  """Draws all items of a store (a NeuronStore or a ConnectionStore, see bio/networkstore.py) with a single
+  actor plus the helper actors added with add_helper_actor(). An item is drawn if it is alive, shown (see
+  is_shown()) and in the scene (see VtkBatchItem.add_yourself()). Changing any of these (or highlighting an
+  item) does not touch VTK but marks the geometry as out of date. update() rebuilds it (see rebuild()) with a
+  few NumPy operations over the whole store, so changing any number of items at once costs a single rebuild.
+  The viewers call update() before each frame (see VtkBatchSet)."""
+  def __init__(self, store, name):
+    VtkPolyModel.__init__(self, vtk.vtkPolyData(), name)
+    self.__store = store
+    self.__helper_actors = list()
+    # Which rows are in the scene and which ones are highlighted (the arrays grow with the store)
+    self.__is_in_scene = np.zeros(0, dtype = bool)
+    self.__is_highlighted = np.zeros(0, dtype = bool)
+    self.__num_rows_in_scene = 0
+    # The renderers which have our actors
+    self.__renderers = list()
+    # The version of the store (see NeuronStore.version) the geometry was built for, None if out of date
+    self.__store_version = None
+
+
+  @property
+  def store(self):
+    return self.__store
+
+
+  def add_helper_actor(self, actor):
+    """Adds an actor which gets added to and removed from the renderers together with the main one."""
+    self.__helper_actors.append(actor)
+
+
+  @abc.abstractmethod
+  def get_visual_representation(self, row):
+    """Returns a new VtkBatchItem for the item in 'row'."""
+    pass
+
+
+  @abc.abstractmethod
+  def get_model(self, cell_id):
+    """Returns the model drawn by the cell with the provided id (e.g., a picked cell) or None if there is no
+    such cell."""
+    pass
+
+
+  @abc.abstractmethod
+  def is_shown(self, row):
+    pass
+
+
+  @abc.abstractmethod
+  def set_shown(self, row, value):
+    pass
+
+
+  @abc.abstractmethod
+  def rebuild(self):
+    """Builds the geometry from the store, 'is_in_scene' and 'is_highlighted'. Called by update()."""
+    pass
+
+
+  def add_to_scene(self, row, renderer):
+    self.__reserve(row + 1)
+    if not self.__is_in_scene[row]:
+      self.__is_in_scene[row] = True
+      self.__num_rows_in_scene += 1
+      self.mark_out_of_date()
+    if renderer not in self.__renderers:
+      for actor in [self.actor] + self.__helper_actors:
+        renderer.AddActor(actor)
+      self.__renderers.append(renderer)
+
+
+  def remove_from_scene(self, row, renderer):
+    if row < self.__is_in_scene.size and self.__is_in_scene[row]:
+      self.__is_in_scene[row] = False
+      self.__num_rows_in_scene -= 1
+      self.mark_out_of_date()
+    # The actors stay in the renderer as long as some item is in the scene
+    if self.__num_rows_in_scene == 0 and renderer in self.__renderers:
+      for actor in [self.actor] + self.__helper_actors:
+        renderer.RemoveActor(actor)
+      self.__renderers.remove(renderer)
+
+
+  def has_items_in_scene(self):
+    return self.__num_rows_in_scene > 0
+
+
+  def set_highlighted(self, row, value):
+    self.__reserve(row + 1)
+    if self.__is_highlighted[row] != bool(value):
+      self.__is_highlighted[row] = bool(value)
+      self.mark_out_of_date()
+
+
+  def mark_out_of_date(self):
+    """Makes the next update() rebuild the geometry."""
+    self.__store_version = None
+
+
+  @property
+  def is_in_scene(self):
+    """A bool array with one entry per row of the store."""
+    self.__reserve(len(self.__store))
+    return self.__is_in_scene[:len(self.__store)]
+
+
+  @property
+  def is_highlighted(self):
+    """A bool array with one entry per row of the store."""
+    self.__reserve(len(self.__store))
+    return self.__is_highlighted[:len(self.__store)]
+
+
+  def update(self):
+    """Rebuilds the geometry if something changed since the last call."""
+    if self.__store_version == self.__store.version:
+      return
+    self.__store_version = self.__store.version
+    self.rebuild()
+
+
+  def __reserve(self, capacity):
+    if capacity <= self.__is_in_scene.size:
+      return
+    capacity = max(capacity, 2*self.__is_in_scene.size, 16)
+    self.__is_in_scene = np.concatenate((self.__is_in_scene, np.zeros(capacity - self.__is_in_scene.size, dtype = bool)))
+    self.__is_highlighted = np.concatenate((self.__is_highlighted, np.zeros(capacity - self.__is_highlighted.size, dtype = bool)))
+
+
+#============================================================================================================
+# VtkBatchSet ===============================================================================================
+#============================================================================================================
+class VtkBatchSet:
+  """The batches in the scene of a viewer. The viewer tells it which batch items it adds and removes and calls
+  update() before each frame."""
+  def __init__(self):
+    # The batches (the keys, a dictionary keeps their order)
+    self.__batches = dict()
+
+
+  def __iter__(self):
+    return iter(self.__batches)
+
+
+  def add(self, batch_items):
+    """Call this one after adding 'batch_items' (VtkBatchItem objects) to the scene."""
+    for batch in dict.fromkeys(batch_item.batch for batch_item in batch_items):
+      # Build the geometry right away, such that the bounds of the batch (e.g., for the camera clipping range)
+      # include the new items
+      batch.update()
+      self.__batches[batch] = None
+
+
+  def remove(self, batch_items):
+    """Call this one after removing 'batch_items' from the scene."""
+    for batch in dict.fromkeys(batch_item.batch for batch_item in batch_items):
+      batch.update()
+      if not batch.has_items_in_scene():
+        self.__batches.pop(batch, None)
+
+
+  def update(self):
+    for batch in self.__batches:
+      batch.update()
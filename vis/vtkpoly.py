@@ -3,7 +3,9 @@ import random
 from .vtkmodel import VtkModel
 
 class VtkPolyModel(VtkModel):
-  def __init__(self, vtk_poly_data, name = "VtkPolyModel"):
+  def __init__(self, vtk_poly_data, name = "VtkPolyModel", low_res_vtk_poly_data = None):
+    """If 'low_res_vtk_poly_data' is provided, it is rendered instead of 'vtk_poly_data' if the renderer
+    cannot achieve the desired frame rate otherwise (e.g., while the user rotates the camera)."""
     if not isinstance(vtk_poly_data, vtk.vtkPolyData):
       raise TypeError("vtk_poly_data has to be vtkPolyData")
 
@@ -14,7 +16,13 @@ class VtkPolyModel(VtkModel):
 
     self.__mapper = vtk.vtkPolyDataMapper()
     self.__mapper.SetInputData(vtk_poly_data)
-    self.__actor = vtk.vtkActor()
+    if low_res_vtk_poly_data:
+      self.__actor = vtk.vtkLODActor()
+      low_res_mapper = vtk.vtkPolyDataMapper()
+      low_res_mapper.SetInputData(low_res_vtk_poly_data)
+      self.__actor.AddLODMapper(low_res_mapper)
+    else:
+      self.__actor = vtk.vtkActor()
     self.__actor.SetMapper(self.__mapper)
     self.__actor.GetProperty().SetAmbient(self.__off_ambient)
     self.__actor.GetProperty().BackfaceCullingOff()
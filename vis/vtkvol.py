@@ -1,11 +1,21 @@
 import vtk
+from vtk.util import numpy_support
 from .vtkmodel import VtkModel
+from .volumesource import MemoryMappedVolume
 
 class VtkVolumeModel(VtkModel):
-  """This one is not used right now."""
-  def __init__(self, vtk_image_data, name = "VtkVolumeModel"):
-    if not isinstance(vtk_image_data, vtk.vtkImageData):
-      raise TypeError("input has to be vtkImageData")
+  """Shows a slice of a volume. The volume is either a vtkImageData object (completely in memory) or a
+  MemoryMappedVolume (on disk). In the latter case, only the slice which is currently shown is in the
+  vtkImageData object which is passed to the slicer."""
+  def __init__(self, volume, name = "VtkVolumeModel"):
+    if isinstance(volume, MemoryMappedVolume):
+      self.__volume_source = volume
+      vtk_image_data = self.__create_single_slice_image_data(volume)
+    elif isinstance(volume, vtk.vtkImageData):
+      self.__volume_source = None
+      vtk_image_data = volume
+    else:
+      raise TypeError("input has to be vtkImageData or MemoryMappedVolume")
 
     VtkModel.__init__(self, name)
 
@@ -17,6 +27,32 @@ class VtkVolumeModel(VtkModel):
     self.__image_slicer.SetInputData(vtk_image_data)
     self.__image_slicer.SetPlaneOrientationToZAxes()
 
+    # Start with the middle slice of a volume on disk
+    if self.__volume_source:
+      self.set_slice_index(self.get_number_of_slices() // 2)
+
+
+  def __create_single_slice_image_data(self, volume):
+    """Creates an image which has the geometry of the whole volume but contains a single slice (see
+    __load_slice())."""
+    nx, ny, nz = volume.dimensions
+    vtk_image_data = vtk.vtkImageData()
+    vtk_image_data.SetSpacing(volume.spacing)
+    vtk_image_data.SetOrigin(volume.origin)
+    vtk_image_data.SetExtent(0, nx - 1, 0, ny - 1, 0, 0)
+    return vtk_image_data
+
+
+  def __load_slice(self, index):
+    """Puts the slice with the provided index into the image data, i.e., the image data has the same extent
+    as the slice (at its position in the whole volume)."""
+    nx, ny, nz = self.__volume_source.dimensions
+    slice_data = self.__volume_source.get_slice(index)
+    self.__vtk_image_data.SetExtent(0, nx - 1, 0, ny - 1, index, index)
+    self.__vtk_image_data.GetPointData().SetScalars(numpy_support.numpy_to_vtk(slice_data.ravel(), deep = True))
+    self.__vtk_image_data.Modified()
+    self.__image_slicer.UpdatePlacement()
+
 
   def add_yourself(self, renderer, interactor):
     self.__image_slicer.SetInteractor(interactor)
@@ -26,9 +62,14 @@ class VtkVolumeModel(VtkModel):
 
   def remove_yourself(self, renderer, interactor):
     self.__image_slicer.Off()
+    # Stop prefetching the slices of a volume on disk
+    if self.__volume_source:
+      self.__volume_source.close()
 
 
   def get_number_of_slices(self):
+    if self.__volume_source:
+      return self.__volume_source.dimensions[2]
     return 1 + self.__vtk_image_data.GetExtent()[5]
 
 
@@ -37,11 +78,13 @@ class VtkVolumeModel(VtkModel):
 
 
   def set_slice_index(self, index):
+    if self.__volume_source:
+      self.__load_slice(index)
     return self.__image_slicer.SetSliceIndex(index)
 
 
   def set_visibility(self, bool_value):
-    self.actor.SetEnabled(bool_value)
+    self.__image_slicer.SetEnabled(bool_value)
 
 
   def visibility_on(self):
@@ -71,3 +114,9 @@ class VtkVolumeModel(VtkModel):
   @property
   def vtk_property(self):
     return self.__image_slicer.GetTexturePlaneProperty()
+
+
+  @property
+  def prop3d(self):
+    """The slicer is a widget and not a prop, i.e., it is not pickable."""
+    return None